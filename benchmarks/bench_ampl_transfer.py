@@ -0,0 +1,55 @@
+"""
+Benchmark of the transfer of the parameters from the Problem to AMPL.
+The test_problem_main data are scaled up as in bench_parse_parameters.py, and the column-by-column conversion of
+AmplProblem.to_ampl_dataframe is compared with the generic conversion of the pandas DataFrames done by amplpy.
+If an AMPL installation is available, the full transfer (conversion and assignment to the AMPL parameters) is timed as well.
+
+Usage: python benchmarks/bench_ampl_transfer.py [--units 50] [--repeat 3]
+"""
+import argparse, shutil
+import amplpy
+from OptiENEA.classes.problem import Problem
+from OptiENEA.classes.amplpy import AmplProblem
+from bench_parse_parameters import create_scaled_problem_folder, best_time
+
+
+def indexed_parameters(problem: Problem) -> dict:
+    return {name: parameter.content for name, parameter in problem.parameters.items()
+            if not parameter.is_empty() and not isinstance(parameter.content, float | int)}
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--units', type = int, default = 50, help = 'Number of WindFarm processes')
+    parser.add_argument('--repeat', type = int, default = 3, help = 'Number of repetitions (the best time is reported)')
+    args = parser.parse_args()
+    problem_folder = create_scaled_problem_folder(args.units)
+    try:
+        problem = Problem('bench_ampl_transfer', problem_folder = problem_folder)
+        problem.create_folders()
+        problem.create_pipeline().run(until = 'parameters', verbose = False)
+        parameters = indexed_parameters(problem)
+        print(f'Units: {args.units}, rows: {sum(len(content) for content in parameters.values())}')
+        print(f'{"Parameter":<36}{"Rows":>10}{"MB":>10}{"pandas [ms]":>14}{"columns [ms]":>14}{"Speedup":>10}')
+        legacy_total, bulk_total = 0.0, 0.0
+        for name, content in parameters.items():
+            legacy_time = best_time(lambda: amplpy.DataFrame.from_pandas(content), args.repeat)
+            bulk_time = best_time(lambda: AmplProblem.to_ampl_dataframe(name, content), args.repeat)
+            _, n_bytes = AmplProblem.to_ampl_dataframe(name, content)
+            legacy_total, bulk_total = legacy_total + legacy_time, bulk_total + bulk_time
+            print(f'{name:<36}{len(content):>10}{n_bytes / 1e6:>10.2f}{legacy_time * 1000:>14.1f}{bulk_time * 1000:>14.1f}{legacy_time / bulk_time:>9.1f}x')
+        print(f'{"Total conversion":<56}{legacy_total * 1000:>14.1f}{bulk_total * 1000:>14.1f}{legacy_total / bulk_total:>9.1f}x')
+        try:
+            problem.create_ampl_model(run_name = 'bench')
+        except Exception as error:
+            print(f'Full transfer not timed, AMPL is not available ({error})')
+            return
+        ampl_problem = problem.ampl_problem
+        legacy_time = best_time(lambda: [ampl_problem.param.__setitem__(name, content) for name, content in parameters.items()], args.repeat)
+        bulk_time = best_time(lambda: [ampl_problem.write_parameter(name, content) for name, content in parameters.items()], args.repeat)
+        print(f'{"Total transfer to AMPL":<56}{legacy_time * 1000:>14.1f}{bulk_time * 1000:>14.1f}{legacy_time / bulk_time:>9.1f}x')
+    finally:
+        shutil.rmtree(problem_folder, ignore_errors = True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""
+Benchmark of the cold-start import time of the OptiENEA modules, as seen by a new worker process or by the CLI.
+Each module is imported in a fresh interpreter, and the heavy optional libraries loaded as a side effect are reported.
+
+Usage: python benchmarks/bench_import_time.py [--repeat 5]
+"""
+import argparse, json, subprocess, sys
+
+MODULES = [
+    'OptiENEA.classes.problem',
+    'OptiENEA.classes.parametric_runs',
+    'OptiENEA.classes.typical_periods',
+]
+HEAVY_LIBRARIES = ['amplpy', 'matplotlib', 'seaborn', 'scipy', 'sklearn']
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'time': elapsed, 'loaded': [name for name in {heavy} if name in sys.modules]}}))
+"""
+
+
+def import_time(module: str) -> dict:
+    # Imports the module in a fresh interpreter and returns the import time and the heavy libraries it loaded
+    script = SCRIPT.format(module = module, heavy = HEAVY_LIBRARIES)
+    result = subprocess.run([sys.executable, '-c', script], capture_output = True, text = True, check = True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type = int, default = 5, help = 'Number of fresh interpreters per module (the best time is reported)')
+    args = parser.parse_args()
+    for module in MODULES:
+        results = [import_time(module) for _ in range(args.repeat)]
+        best = min(result['time'] for result in results)
+        loaded = ', '.join(results[0]['loaded']) or '-'
+        print(f'{module:<40} {best * 1000:8.1f} ms    heavy libraries loaded: {loaded}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+Benchmark of the construction of the optimization model, with the native interpreter (sparse matrix assembled from the
+problem sets and parameters) and, if an AMPL installation is available, with the AMPL interpreter (model text, transfer
+of sets and parameters). The test_problem_main data are scaled up as in bench_parse_parameters.py.
+With --solve, the native model is also solved with HiGHS.
+
+Usage: python benchmarks/bench_native_model.py [--units 50] [--repeat 3] [--solve]
+"""
+import argparse, shutil
+from OptiENEA.classes.problem import Problem
+from OptiENEA.classes.native_model import NativeProblem
+from bench_parse_parameters import create_scaled_problem_folder, best_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--units', type = int, default = 50, help = 'Number of WindFarm processes')
+    parser.add_argument('--repeat', type = int, default = 3, help = 'Number of repetitions (the best time is reported)')
+    parser.add_argument('--solve', action = 'store_true', help = 'Also solve the native model')
+    args = parser.parse_args()
+    problem_folder = create_scaled_problem_folder(args.units)
+    try:
+        problem = Problem('bench_native_model', problem_folder = problem_folder)
+        problem.create_folders()
+        problem.create_pipeline().run(until = 'parameters', verbose = False)
+        native_time = best_time(lambda: NativeProblem(problem).build(), args.repeat)
+        native_problem = NativeProblem(problem)
+        native_problem.build()
+        report = native_problem.build_report
+        print(f'Units: {args.units}, variables: {report["variables"]}, constraints: {report["constraints"]}, non-zeros: {report["nonzeros"]}')
+        print(f'{"Native model build [ms]":<36}{native_time * 1000:>10.1f}')
+        if args.solve:
+            native_problem.solve()
+            print(f'{"Native model solve [ms]":<36}{native_problem.build_report["solve seconds"] * 1000:>10.1f}  ({native_problem.solve_result})')
+        problem.model_export = 'off'
+        run_names = iter(range(args.repeat))
+        try:
+            ampl_time = best_time(lambda: problem.create_ampl_model(run_name = f'bench {next(run_names)}'), args.repeat)
+        except Exception as error:
+            print(f'AMPL model build not timed, AMPL is not available ({error})')
+            return
+        print(f'{"AMPL model build [ms]":<36}{ampl_time * 1000:>10.1f}{ampl_time / native_time:>9.1f}x')
+    finally:
+        shutil.rmtree(problem_folder, ignore_errors = True)
+
+
+if __name__ == '__main__':
+    main()
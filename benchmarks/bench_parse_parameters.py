@@ -0,0 +1,97 @@
+"""
+Benchmark of the assembly of the time-dependent parameters in Problem.parse_parameters.
+The test_problem_main data are scaled up by replicating the WindFarm process (and its time series)
+a given number of times, and the bulk assembly is compared with the previous per-unit DataFrame approach.
+
+Usage: python benchmarks/bench_parse_parameters.py [--units 500] [--repeat 3]
+"""
+import argparse, os, shutil, tempfile, time
+import pandas as pd
+import yaml
+from OptiENEA.classes.problem import Problem
+from OptiENEA.classes.unit import Process
+
+__HERE__ = os.path.dirname(os.path.realpath(__file__))
+DATA_FOLDER = os.path.join(os.path.dirname(__HERE__), 'test', 'DATA', 'test_problem', 'test_problem_main')
+
+
+def create_scaled_problem_folder(n_units: int) -> str:
+    # Creates a problem folder where the WindFarm process is replicated n_units times
+    problem_folder = tempfile.mkdtemp(prefix = 'bench_parse_parameters_')
+    os.makedirs(os.path.join(problem_folder, 'Input'))
+    shutil.copy2(os.path.join(DATA_FOLDER, 'general.yml'), os.path.join(problem_folder, 'Input', 'general.yml'))
+    with open(os.path.join(DATA_FOLDER, 'units.yml'), 'r') as stream:
+        units = yaml.safe_load(stream)
+    timeseries_data = Problem.read_timeseries_file(os.path.join(DATA_FOLDER, 'timeseries_data.csv'))
+    wind_farm = units.pop('WindFarm')
+    wind_farm_data = timeseries_data['WindFarm']
+    scaled_units, scaled_columns = {}, {}
+    for idx in range(n_units):
+        scaled_units[f'WindFarm{idx}'] = wind_farm
+        for (variable, layer), values in wind_farm_data.items():
+            scaled_columns[(f'WindFarm{idx}', variable, layer)] = values.to_numpy() * (1 + idx / n_units)
+    scaled_units.update(units)
+    with open(os.path.join(problem_folder, 'Input', 'units.yml'), 'w') as stream:
+        yaml.safe_dump(scaled_units, stream, sort_keys = False)
+    scaled_data = pd.DataFrame(scaled_columns, index = timeseries_data.index)
+    scaled_data.columns.names = timeseries_data.columns.names
+    scaled_data.to_csv(os.path.join(problem_folder, 'Input', 'timeseries_data.csv'), sep = ';')
+    return problem_folder
+
+def legacy_power_parameter(problem: Problem) -> pd.DataFrame:
+    # Reference implementation: one DataFrame per unit and layer, concatenated at the end
+    list_content = []
+    time_steps = range(len(problem.raw_timeseries_data.index))
+    for unit_name, unit in problem.units.items():
+        if isinstance(unit, Process):
+            for layer in unit.layers:
+                temp = pd.DataFrame(index = unit.power[layer].index)
+                temp.loc[:, 'processes'] = unit_name
+                temp.loc[:, 'layersOfUnit'] = layer
+                temp.loc[:, 'timeSteps'] = time_steps
+                temp.loc[:, 'POWER'] = unit.power[layer]
+                list_content.append(temp)
+    content = pd.concat(list_content)
+    content = content.assign(POWER = content['POWER'].astype(float))
+    return content.set_index(['processes', 'layersOfUnit', 'timeSteps'])
+
+def best_time(function, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--units', type = int, default = 500, help = 'Number of WindFarm processes')
+    parser.add_argument('--repeat', type = int, default = 3, help = 'Number of repetitions (the best time is reported)')
+    args = parser.parse_args()
+    problem_folder = create_scaled_problem_folder(args.units)
+    try:
+        problem = Problem('bench_parse_parameters', problem_folder = problem_folder)
+        problem.create_folders()
+        problem.read_problem_data()
+        problem.read_problem_parameters()
+        problem.generate_typical_periods()
+        problem.set_occurrance()
+        problem.read_units_data()
+        legacy_time = best_time(lambda: legacy_power_parameter(problem), args.repeat)
+        def bulk():
+            for parameter in problem.parameters.values():
+                parameter.list_content = []
+            problem.parse_parameters()
+        bulk_time = best_time(bulk, args.repeat)
+        reference = legacy_power_parameter(problem)
+        pd.testing.assert_frame_equal(problem.parameters['POWER'].content, reference)
+        print(f'Units: {args.units}, time steps: {len(problem.raw_timeseries_data.index)}, POWER rows: {len(reference)}')
+        print(f'Legacy (POWER only):        {legacy_time * 1000:10.1f} ms')
+        print(f'Bulk (all parameters):      {bulk_time * 1000:10.1f} ms')
+        print(f'Speedup:                    {legacy_time / bulk_time:10.1f}x')
+    finally:
+        shutil.rmtree(problem_folder, ignore_errors = True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Benchmark of the writing and reading of the results of a run, as Parquet files (one per table) and as an Excel workbook.
+The test_problem_main data are scaled up as in bench_parse_parameters.py, and the problem is solved with the native interpreter.
+
+Usage: python benchmarks/bench_results_io.py [--units 50] [--repeat 3]
+"""
+import argparse, os, shutil
+from OptiENEA.classes.problem import Problem
+from OptiENEA.classes.output import OptimizationOutput
+from bench_parse_parameters import create_scaled_problem_folder, best_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--units', type = int, default = 50, help = 'Number of WindFarm processes')
+    parser.add_argument('--repeat', type = int, default = 3, help = 'Number of repetitions (the best time is reported)')
+    args = parser.parse_args()
+    problem_folder = create_scaled_problem_folder(args.units)
+    try:
+        problem = Problem('bench_results_io', problem_folder = problem_folder)
+        problem.create_folders()
+        problem.create_pipeline().run(until = 'parameters', verbose = False)
+        problem.interpreter, problem.model_export = 'native', 'off'
+        problem.create_ampl_model(run_name = 'bench')
+        problem.solve_ampl_problem()
+        output = OptimizationOutput(problem.ampl_problem, problem.output_variables, problem.results_folder, problem.typical_periods,
+                                    problem.time_step_aggregation, solver_settings = problem.solver_settings)
+        output.generate_output_structures()
+        print(f'Units: {args.units}, time series: {output.output_timeseries_full.shape}')
+        times = {'Parquet write': best_time(lambda: output.save_output_to_parquet('bench'), args.repeat),
+                 'Parquet read': best_time(lambda: read_all_tables(problem.results_folder, 'bench'), args.repeat)}
+        shutil.rmtree(os.path.join(problem.results_folder, 'Results_bench'))  # Without the Parquet files, the results are read from Excel
+        times |= {'Excel write': best_time(lambda: output.save_output_to_excel('bench'), args.repeat),
+                  'Excel read': best_time(lambda: read_all_tables(problem.results_folder, 'bench'), args.repeat)}
+        for name, seconds in times.items():
+            print(f'{name + " [ms]":<36}{seconds * 1000:>10.1f}')
+        print(f'{"Speed-up (write, read)":<36}{times["Excel write"] / times["Parquet write"]:>9.1f}x{times["Excel read"] / times["Parquet read"]:>9.1f}x')
+    finally:
+        shutil.rmtree(problem_folder, ignore_errors = True)
+
+
+def read_all_tables(results_folder: str, run_name: str) -> list:
+    # The tables of a saved output are only read when they are accessed
+    output = OptimizationOutput.from_results(results_folder, run_name)
+    return [output.kpis, output.units, output.timeseries_full, output.extra]
+
+
+if __name__ == '__main__':
+    main()
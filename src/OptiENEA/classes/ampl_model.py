@@ -0,0 +1,279 @@
+"""
+Declarative description of the AMPL model of OptiENEA.
+Each declaration (set, param, var or constraint) carries its index domain, written with placeholders for the time
+dimension (e.g. ${T} for the time domain, ${tp} for the typical period index), which are replaced when the model is
+rendered for the time representation of the problem: full year, typical periods, and/or segments of variable duration.
+"""
+from dataclasses import dataclass
+from string import Template
+import pandas as pd
+from OptiENEA.helpers.helpers import fingerprint
+
+
+@dataclass(frozen=True)
+class ModelFeatures:
+    """
+    The features of a problem that affect the text of the model (and only those)
+    """
+    has_storage: bool = False
+    has_capex: bool = False
+    has_minimum_installed_power: bool = False
+    has_units_with_minimum_size_if_installed: bool = False
+    has_units_operated_only_on_off: bool = False
+    has_units_eligible_for_tax_deduction: bool = False
+    has_typical_periods: bool = False
+    has_variable_time_step_durations: bool = False
+
+    @classmethod
+    def from_problem(cls, problem) -> 'ModelFeatures':
+        # Reads the features from the sets and parameters of a parsed problem
+        return cls(
+            has_storage = not problem.parameters['ENERGY_MAX'].content.empty,
+            has_capex = not problem.parameters['SPECIFIC_INVESTMENT_COST_ANNUALIZED'].content.empty,
+            has_minimum_installed_power = not problem.parameters['POWER_MIN'].content.empty,
+            has_units_with_minimum_size_if_installed = len(problem.sets['unitsWithMinimumSizeIfInstalled'].content) > 0,
+            has_units_operated_only_on_off = len(problem.sets['unitsOnOff'].content) > 0,
+            has_units_eligible_for_tax_deduction = len(problem.sets['unitsEligibleForTaxDeduction'].content) > 0,
+            has_typical_periods = bool(problem.has_typical_periods),
+            has_variable_time_step_durations = isinstance(problem.parameters['TIME_STEP_DURATION'].content, pd.Series))
+
+
+@dataclass(frozen=True)
+class TimeDimension:
+    """
+    The time representation of the model:
+      - full year: the time steps are indexed by t in timeSteps
+      - typical periods: the time steps are indexed by (tp, t), with tp in typicalPeriods and t in timeStepsOfPeriod[tp]
+    With variable time step durations (e.g. segments), the duration of each time step is indexed like the time steps
+    """
+    typical_periods: bool = False
+    variable_durations: bool = False
+
+    def substitutions(self) -> dict:
+        # Values of the time placeholders used in the model declarations
+        tp = 'tp,' if self.typical_periods else ''
+        return {
+            'T': 'tp in typicalPeriods, t in timeStepsOfPeriod[tp]' if self.typical_periods else 't in timeSteps',  # Time domain
+            'tp': tp,  # Typical period, in front of the time step index
+            '_tp': ',tp' if self.typical_periods else '',  # Typical period, as last index of entities that are not time-dependent
+            'TP': ', tp in typicalPeriods' if self.typical_periods else '',  # Typical period, as last index of a domain
+            'timeSteps': 'timeStepsOfPeriod[tp]' if self.typical_periods else 'timeSteps',
+            'OCCURRANCE': 'OCCURRANCE[tp]' if self.typical_periods else 'OCCURRANCE',
+            'DURATION': f'TIME_STEP_DURATION[{tp}t]' if self.variable_durations else 'TIME_STEP_DURATION'}
+
+
+@dataclass(frozen=True)
+class ModelEntity:
+    """
+    A declaration of the model:
+      - kind: one of "set", "param", "var" or "s.t."
+      - domain: the index domain, without braces (empty for scalar entities)
+      - attributes: the rest of the declaration (e.g. "default 0", ":= a union b"), or the expression of a constraint
+    """
+    kind: str
+    name: str
+    domain: str = ''
+    attributes: str = ''
+
+    def render(self, substitutions: dict) -> str:
+        domain = f'{{{self.domain}}}' if self.domain else ''
+        if self.kind == 's.t.':
+            text = f's.t. {self.name}{domain}: {self.attributes};'
+        else:
+            text = f'{self.kind} {self.name}{domain}' + (f' {self.attributes}' if self.attributes else '') + ';'
+        return Template(text).substitute(substitutions)
+
+
+def model_sets(features: ModelFeatures) -> list[ModelEntity]:
+    utilities = 'standardUtilities union markets' + (' union storageUnits' if features.has_storage else '')
+    entities = [ModelEntity('set', 'typicalPeriods'), ModelEntity('set', 'timeStepsOfPeriod', 'tp in typicalPeriods')] \
+        if features.has_typical_periods else [ModelEntity('set', 'timeSteps')]
+    entities += [
+        ModelEntity('set', 'processes'),
+        ModelEntity('set', 'markets')]
+    if features.has_storage:
+        entities.append(ModelEntity('set', 'storageUnits'))
+    entities += [
+        ModelEntity('set', 'standardUtilities'),
+        ModelEntity('set', 'utilities', attributes = f':= {utilities}'),
+        ModelEntity('set', 'units', attributes = ':= utilities union processes'),
+        ModelEntity('set', 'layers'),
+        ModelEntity('set', 'layersOfUnit', 'u in units'),
+        ModelEntity('set', 'mainLayerOfUnit', 'u in units'),
+        ModelEntity('set', 'unitsOfLayer', 'l in layers', ':= setof{u in units : l in layersOfUnit[u]} u'),
+        ModelEntity('set', 'outputMarketLayers', attributes = ':= setof{u in markets, l in layersOfUnit[u]} (u, l)'),
+        ModelEntity('set', 'nonmarketUtilities', attributes = ':= utilities diff markets')]
+    if features.has_storage:
+        entities += [
+            ModelEntity('set', 'chargingUtilitiesOfStorageUnit', 'u in storageUnits', 'within utilities'),
+            ModelEntity('set', 'dischargingUtilitiesOfStorageUnit', 'u in storageUnits', 'within utilities'),
+            ModelEntity('set', 'nonStorageUtilities', attributes = 'within utilities := utilities diff storageUnits')]
+    if features.has_units_with_minimum_size_if_installed:
+        entities.append(ModelEntity('set', 'unitsWithMinimumSizeIfInstalled', attributes = 'within nonmarketUtilities'))
+    if features.has_units_eligible_for_tax_deduction:
+        entities.append(ModelEntity('set', 'unitsEligibleForTaxDeduction', attributes = 'within nonmarketUtilities'))
+    if features.has_units_operated_only_on_off:
+        entities.append(ModelEntity('set', 'unitsOnOff', attributes = 'within nonmarketUtilities'))
+    return entities
+
+def model_parameters(features: ModelFeatures) -> list[ModelEntity]:
+    # With storage units, the maximum power of the storage units is defined by their size
+    utilities = 'nonStorageUtilities' if features.has_storage else 'utilities'
+    entities = [
+        ModelEntity('param', 'POWER_MAX', f'u in {utilities}, l in layersOfUnit[u]', 'default 0'),
+        ModelEntity('param', 'POWER', 'p in processes, l in layersOfUnit[p], ${T}'),
+        ModelEntity('param', 'TIME_STEP_DURATION', '${T}' if features.has_variable_time_step_durations else ''),
+        ModelEntity('param', 'OCCURRANCE', 'tp in typicalPeriods' if features.has_typical_periods else ''),
+        ModelEntity('param', 'SPECIFIC_INVESTMENT_COST_ANNUALIZED', 'u in utilities', 'default 0'),
+        ModelEntity('param', 'SPECIFIC_INVESTMENT_COST', 'u in utilities', 'default 0'),
+        ModelEntity('param', 'ENERGY_AVERAGE_PRICE', 'm in markets, l in layersOfUnit[m]', 'default 0'),
+        ModelEntity('param', 'POWER_MAX_REL', f'u in {utilities}, l in layersOfUnit[u], ${{T}}', 'default 1'),
+        ModelEntity('param', 'ENERGY_PRICE_VARIATION', 'm in markets, l in layersOfUnit[m], ${T}', 'default 1'),
+        ModelEntity('param', 'BIG_M', attributes = 'default 100')]
+    if features.has_minimum_installed_power:
+        entities.append(ModelEntity('param', 'POWER_MIN', 'u in nonmarketUtilities', 'default 0'))
+    if features.has_storage:
+        entities += [
+            ModelEntity('param', 'ENERGY_MAX', 'u in storageUnits', 'default 0'),
+            ModelEntity('param', 'CRATE', 'u in storageUnits', 'default 1'),
+            ModelEntity('param', 'ERATE', 'u in storageUnits', 'default 1'),
+            ModelEntity('param', 'ERROR_MARGIN_ON_CYCLIC_SOC', attributes = 'default 0.1'),
+            ModelEntity('param', 'STORAGE_LOSSES', 'u in storageUnits', 'default 0')]
+    if features.has_units_with_minimum_size_if_installed:
+        entities.append(ModelEntity('param', 'SIZE_MIN_IF_INSTALLED', 'u in unitsWithMinimumSizeIfInstalled', 'default 0'))
+    if features.has_units_eligible_for_tax_deduction:
+        entities += [
+            ModelEntity('param', 'TAX_DEDUCTION', attributes = 'default 0 <= 1'),
+            ModelEntity('param', 'YEARS_FOR_TAX_DEDUCTION', attributes = 'default 1')]
+    return entities
+
+def model_variables(features: ModelFeatures) -> list[ModelEntity]:
+    entities = [
+        ModelEntity('var', 'power', 'u in units, l in layersOfUnit[u], ${T}'),
+        ModelEntity('var', 'layer_operating_cost', '(u,l) in outputMarketLayers'),
+        ModelEntity('var', 'ics', 'u in nonmarketUtilities, ${T}', '>= 0, <= 1'),
+        ModelEntity('var', 'OPEX')]
+    if features.has_storage:
+        entities += [
+            ModelEntity('var', 'energyStorageLevel', 'u in storageUnits, l in layersOfUnit[u], ${T}', '>=0'),
+            ModelEntity('var', 'energyStorageLevel0', 'u in storageUnits, l in layersOfUnit[u]${TP}', '>=0')]
+    if features.has_capex:
+        entities += [
+            ModelEntity('var', 'unitAnnualizedInvestmentCost', 'u in nonmarketUtilities', '>= 0'),
+            ModelEntity('var', 'size', 'u in nonmarketUtilities', '>= 0'),
+            ModelEntity('var', 'CAPEX'),
+            ModelEntity('var', 'TOTEX')]
+    if features.has_units_with_minimum_size_if_installed:
+        entities.append(ModelEntity('var', 'ips', 'u in unitsWithMinimumSizeIfInstalled', 'binary'))
+    if features.has_units_operated_only_on_off:
+        entities.append(ModelEntity('var', 'ips_t', 'u in unitsOnOff, ${T}', 'binary'))
+    return entities
+
+def model_constraints(features: ModelFeatures) -> list[ModelEntity]:
+    if features.has_units_eligible_for_tax_deduction:
+        entities = [ModelEntity('s.t.', 'calculate_opex', '', 'OPEX = sum{(u,l) in outputMarketLayers} layer_operating_cost[u,l] - sum{u in unitsEligibleForTaxDeduction} size[u] * SPECIFIC_INVESTMENT_COST[u] * TAX_DEDUCTION / YEARS_FOR_TAX_DEDUCTION')]
+    else:
+        entities = [ModelEntity('s.t.', 'calculate_opex', '', 'OPEX = sum{(u,l) in outputMarketLayers} layer_operating_cost[u,l]')]
+    entities += [
+        ModelEntity('s.t.', 'layer_balance', 'l in layers, ${T}', 'sum{u in unitsOfLayer[l]} (power[u,l,${tp}t]) = 0'),
+        ModelEntity('s.t.', 'process_power', 'p in processes, l in layersOfUnit[p], ${T}', 'power[p,l,${tp}t] = -POWER[p,l,${tp}t]')]
+    # Constraints to be added depending on whether we are calculating the cost of the investment or not
+    if features.has_capex:
+        entities += [
+            ModelEntity('s.t.', 'component_sizing', 'u in standardUtilities, l in mainLayerOfUnit[u], ${T}', 'size[u] >= ics[u,${tp}t] * abs(POWER_MAX[u,l])'),
+            ModelEntity('s.t.', 'calculate_capex', '', 'CAPEX = sum{u in nonmarketUtilities} unitAnnualizedInvestmentCost[u]'),
+            ModelEntity('s.t.', 'calculate_investment_cost', 'u in nonmarketUtilities', 'unitAnnualizedInvestmentCost[u] = size[u] * SPECIFIC_INVESTMENT_COST_ANNUALIZED[u]'),
+            ModelEntity('s.t.', 'calculate_totex', '', 'TOTEX = CAPEX + OPEX')]
+    # Constraints added only if the problem has units with a minimum installed size
+    if features.has_minimum_installed_power:
+        entities.append(ModelEntity('s.t.', 'minimum_installed_power', 'u in nonmarketUtilities', 'size[u] >= POWER_MIN[u]'))
+    entities += [
+        ModelEntity('s.t.', 'calculate_operating_cost_time_dependent', 'u in markets, l in layersOfUnit[u]',
+                    'layer_operating_cost[u,l] = sum{${T}} (power[u,l,${tp}t] * ENERGY_AVERAGE_PRICE[u,l] * ENERGY_PRICE_VARIATION[u,l,${tp}t]) * ${DURATION} * ${OCCURRANCE}'),
+        ModelEntity('s.t.', 'component_load', 'u in standardUtilities, l in layersOfUnit[u], ${T}', 'power[u,l,${tp}t] = ics[u,${tp}t] * POWER_MAX[u,l] * POWER_MAX_REL[u,l,${tp}t]'),
+        ModelEntity('s.t.', 'purchase_market_limits', 'u in markets, l in layersOfUnit[u], ${T}: POWER_MAX[u,l] >= 0', '0 <= power[u,l,${tp}t] <= POWER_MAX[u,l] * POWER_MAX_REL[u,l,${tp}t]'),
+        ModelEntity('s.t.', 'selling_market_limits', 'u in markets, l in layersOfUnit[u], ${T}: POWER_MAX[u,l] <= 0', 'POWER_MAX[u,l] * POWER_MAX_REL[u,l,${tp}t] <= power[u,l,${tp}t] <= 0')]
+    # Constraints to be added if problem has units with a minimum size if installed
+    if features.has_units_with_minimum_size_if_installed:
+        entities += [
+            ModelEntity('s.t.', 'component_sizing_with_minimum_size_if_installed', 'u in unitsWithMinimumSizeIfInstalled, l in mainLayerOfUnit[u]', 'size[u] >= SIZE_MIN_IF_INSTALLED[u] * ips[u]'),
+            ModelEntity('s.t.', 'constraint_on_ips', 'u in unitsWithMinimumSizeIfInstalled, ${T}', 'ics[u,${tp}t] <= ips[u]')]
+    if features.has_units_operated_only_on_off:
+        entities.append(ModelEntity('s.t.', 'component_load_onoff', 'u in unitsOnOff, ${T}', 'ics[u,${tp}t] == ips_t[u,${tp}t]'))
+    # Constraints to be added depending on whether there are storage units in the problem
+    if features.has_storage:
+        entities += [
+            ModelEntity('s.t.', 'storage_balance', 'u in storageUnits, l in layersOfUnit[u], ${T}',
+                        '\n\tenergyStorageLevel[u,l,${tp}t] = (if t == 0\n\t\tthen\n'
+                        '\t\t\tenergyStorageLevel0[u,l${_tp}] - power[u,l,${tp}t]*${DURATION} - energyStorageLevel0[u,l${_tp}] * STORAGE_LOSSES[u]\n'
+                        '\t\telse\n\t\t\tenergyStorageLevel[u,l,${tp}t-1] - power[u,l,${tp}t]*${DURATION}\n\t)'),
+            ModelEntity('s.t.', 'storage_cyclic_constraint_high', 'u in storageUnits, l in layersOfUnit[u]${TP}',
+                        '\n\tenergyStorageLevel[u,l,${tp}card(${timeSteps})-1] - energyStorageLevel0[u,l${_tp}] >= 0'),
+            ModelEntity('s.t.', 'storage_cyclic_constraint_low', 'u in storageUnits, l in layersOfUnit[u]${TP}',
+                        '\n\tenergyStorageLevel[u,l,${tp}card(${timeSteps})-1] - energyStorageLevel0[u,l${_tp}] <= ERROR_MARGIN_ON_CYCLIC_SOC * ENERGY_MAX[u]'),
+            ModelEntity('s.t.', 'storage_max_energy', 'u in storageUnits, l in layersOfUnit[u], ${T}', '\n\tenergyStorageLevel[u,l,${tp}t] <= size[u]'),
+            ModelEntity('s.t.', 'storage_max_energy2', 'u in storageUnits', '\n\tsize[u] <= ENERGY_MAX[u]'),
+            ModelEntity('s.t.', 'storage_max_ch_power', 'u in storageUnits, l in layersOfUnit[u], ${T}', '\n\tpower[u,l,${tp}t] >= -size[u] * CRATE[u]'),
+            ModelEntity('s.t.', 'storage_max_dis_power', 'u in storageUnits, l in layersOfUnit[u], ${T}', '\n\tpower[u,l,${tp}t] <= size[u] * ERATE[u]'),
+            ModelEntity('s.t.', 'storage_ch_power_cost', 'u in storageUnits, l in layersOfUnit[u], ch in chargingUtilitiesOfStorageUnit[u], ${T}', '\n\tpower[ch,l,${tp}t] <= size[u] * CRATE[u]'),
+            ModelEntity('s.t.', 'storage_dis_power_cost', 'u in storageUnits, l in layersOfUnit[u], dis in dischargingUtilitiesOfStorageUnit[u], ${T}', '\n\tpower[dis,l,${tp}t] >= -size[u] * ERATE[u]'),
+            ModelEntity('s.t.', 'charging_power_only_positive', 'u in storageUnits, l in layersOfUnit[u], ch in chargingUtilitiesOfStorageUnit[u], ${T}', '\n\tpower[ch,l,${tp}t] >= 0'),
+            ModelEntity('s.t.', 'discharging_power_only_negative', 'u in storageUnits, l in layersOfUnit[u], dis in dischargingUtilitiesOfStorageUnit[u], ${T}', '\n\tpower[dis,l,${tp}t] <= 0')]
+    return entities
+
+def additional_constraints(additional_constraints_data: dict) -> list[ModelEntity]:
+    entities = []
+    for constraint_type, constraint in additional_constraints_data.items():
+        if constraint_type == "MaximumYearlyFlowConstraint":
+            entities += [
+                ModelEntity('param', constraint['parameter name']),
+                ModelEntity('var', constraint['variable name']),
+                ModelEntity('s.t.', f"{constraint['name']}_calculation",
+                            f"u in units, l in layersOfUnit[u]: u == '{constraint['unit name']}' && l == '{constraint['layer name']}'",
+                            f"\n\tabs(sum{{${{T}}}} power[u,l,${{tp}}t] * ${{DURATION}} * ${{OCCURRANCE}}) = {constraint['variable name']}"),
+                ModelEntity('s.t.', f"{constraint['name']}_leq", '', f"{constraint['variable name']} <= {constraint['parameter name']}")]
+    return entities
+
+def typical_periods_transformation(text: str) -> str:
+    """
+    Adapts free AMPL text written for the full year (e.g. the constraints of a custom objective) to typical periods,
+    by indexing the time steps by typical period. Declarations generated by this module do not need it
+    """
+    text = text.replace("* OCCURRANCE;", "* OCCURRANCE[tp];")
+    text = text.replace("* OCCURRANCE)", "* OCCURRANCE[tp])")
+    text = text.replace('t in timeSteps', 'tp in typicalPeriods, t in timeStepsOfPeriod[tp]')
+    text = text.replace('t]', 'tp,t]')
+    text = text.replace('l,t-1]', 'l,tp,t-1]')
+    text = text.replace("energyStorageLevel[u,l,", "energyStorageLevel[u,l,tp,")
+    text = text.replace("{u in storageUnits, l in layersOfUnit[u]}", "{u in storageUnits, l in layersOfUnit[u], tp in typicalPeriods}")
+    text = text.replace("energyStorageLevel0[u,l]", "energyStorageLevel0[u,l,tp]")
+    text = text.replace("tp,tp,", 'tp,')
+    text = text.replace("(timeSteps)", "(timeStepsOfPeriod[tp])")
+    return text
+
+
+# Rendered models, by fingerprint of everything they depend on
+_rendered_models = {}
+
+def render_model(features: ModelFeatures, objective: str, objective_constraints: list, additional_constraints_data: dict) -> str:
+    """
+    Returns the text of the model (without header) for the given features, objective and additional constraints.
+    The text is rendered once for each combination: problems with the same structure (e.g. scenarios) get it from the cache
+    """
+    key = fingerprint(features, objective, list(objective_constraints), additional_constraints_data)
+    if key not in _rendered_models:
+        substitutions = TimeDimension(features.has_typical_periods, features.has_variable_time_step_durations).substitutions()
+        def section(title: str | None, entities: list[ModelEntity]) -> str:
+            lines = ([f'/* {title} */\n'] if title else []) + [entity.render(substitutions) for entity in entities]
+            return '\n'.join(lines) + '\n\n\n'
+        objective_text = objective + ''.join(objective_constraints)
+        if features.has_typical_periods:
+            objective_text = typical_periods_transformation(objective_text)
+        _rendered_models[key] = ''.join([
+            section('PROBLEM SETS', model_sets(features)),
+            section('PROBLEM PARAMETERS', model_parameters(features)),
+            section('PROBLEM VARIABLES', model_variables(features)),
+            '/* OBJECTIVE FUNCTION */\n\n' + objective_text + '\n\n',
+            section('CONSTRAINTS', model_constraints(features)),
+            section(None, additional_constraints(additional_constraints_data))])
+    return _rendered_models[key]
@@ -1,6 +1,10 @@
 import OptiENEA.classes.unit as ut
+from OptiENEA.classes.ampl_model import ModelFeatures, render_model
+from OptiENEA.classes.warm_start import WarmStart
+from OptiENEA.helpers.helpers import fingerprint
 import pandas as pd
-import amplpy
+import numpy as np
+import amplpy, csv, gzip, os, threading, time
 
 class AmplProblem(amplpy.AMPL):
     has_storage: bool
@@ -13,8 +17,21 @@ class AmplProblem(amplpy.AMPL):
     has_minimum_installed_power: bool
     has_units_with_minimum_size_if_installed: bool
 
+    # AMPL built-in parameters with the size of the model, before (_sn...) and after (_n...) the presolve
+    MODEL_STATISTICS = {'variables': '_snvars', 'constraints': '_sncons', 'binaries': '_snbvars',
+                        'presolved variables': '_nvars', 'presolved constraints': '_ncons', 'presolved binaries': '_nbvars'}
+
     def __init__(self, problem):
         super().__init__()
+        self.model_fingerprint = None  # Fingerprint of the model currently loaded in the AMPL session
+        self.base_snapshot = None  # Snapshot whose data the session holds, apart from the modified parameters (see write_parameters_to_amplpy)
+        self.modified_parameters = {}  # Positions of the rows that differ from the snapshot, by parameter (None if the whole parameter differs)
+        self.holds_base_data = False  # True if the data of the snapshot the current problem was cloned from were kept by load_model
+        self.export_thread = None
+        self.set_problem(problem)
+
+    def set_problem(self, problem):
+        # Binds the AMPL session to a problem, resetting the model settings (the model loaded in AMPL is not affected)
         self.has_storage = False
         self.has_capex = False
         self.has_time_dependent_power = False
@@ -29,6 +46,7 @@ class AmplProblem(amplpy.AMPL):
         self.has_units_eligible_for_tax_deduction = False
         self.layers_with_time_dependent_price = []
         self.problem = problem
+        self.transfer_report = {}  # Rows, bytes and seconds needed to send each parameter to AMPL
         self.mod_string = f'/* MOD FILE */\n\n/* Problem name: {problem.name} */\n\n'
 
     def get_mod_file(self):
@@ -50,253 +68,349 @@ class AmplProblem(amplpy.AMPL):
                 self.has_time_dependent_power = True
             if self.has_time_dependent_power:
                 break
-        # Check if problem has capex
-        if not self.problem.parameters['SPECIFIC_INVESTMENT_COST_ANNUALIZED'].content.empty:
-            self.has_capex = True
-        # Check if problem has minimum installed power
-        if not self.problem.parameters['POWER_MIN'].content.empty:
-            self.has_minimum_installed_power = True
-        # Check if problem has time-dependent max power
+        # Check if problem has time-dependent max power or energy prices
         if not self.problem.parameters['POWER_MAX_REL'].content.empty:
             self.has_time_dependent_max_power = True
-        # Check if problem has storage units
-        if not self.problem.parameters['ENERGY_MAX'].content.empty:
-            self.has_storage = True
-        # Check if problem has time-dependent energy prices
         if not self.problem.parameters['ENERGY_PRICE_VARIATION'].content.empty:
             self.has_time_dependent_energy_prices = True
-        # Check if problem has units that can only be installed with a minmium size:
-        if len(self.problem.sets['unitsWithMinimumSizeIfInstalled'].content) > 0:
-            self.has_units_with_minimum_size_if_installed = True
-        # Check if the problem has units that can only be operated on an on/off basis
-        if len(self.problem.sets['unitsOnOff'].content) > 0:
-            self.has_units_operated_only_on_off = True
-        # Check if the problem has units that are eligible for tax deduction
-        if len(self.problem.sets['unitsEligibleForTaxDeduction'].content) > 0:
-            self.has_units_eligible_for_tax_deduction = True
-        # Check if problem has typical periods
-        if self.problem.has_typical_periods:
-            self.has_typical_periods = True
-        # Check if problem has variable time step durations
-        if isinstance(self.problem.parameters['TIME_STEP_DURATION'].content, pd.Series):
-            self.has_variable_time_step_durations = True
+        # The features that affect the text of the model (storage, capex, typical periods, etc.)
+        for name, value in vars(ModelFeatures.from_problem(self.problem)).items():
+            setattr(self, name, value)
 
     def write_mod_file(self):
-        self.write_sets()
-        self.write_parameters()
-        self.write_variables()
-        self.write_objective()
-        self.write_base_constraints()
-        self.write_additional_constraints()
-        if self.has_typical_periods:
-            self.typical_periods_transformation()
-        self.eval(self.mod_string)
+        self.build_mod_string()
+        self.load_model()
 
-    def write_sets(self):
-        temp_sets = []
-        # Adds the problem sets to the mod file string
-        temp_sets.append("/* PROBLEM SETS */\n")
-        temp_sets.append("set timeSteps;")
-        temp_sets.append("set processes;")
-        temp_sets.append("set markets;")
-        temp_sets.append("set standardUtilities;")
-        temp_sets.append("set utilities := standardUtilities union markets;")
-        temp_sets.append("set units := utilities union processes;")
-        temp_sets.append("set layers;")
-        temp_sets.append("set layersOfUnit{u in units};")
-        temp_sets.append("set mainLayerOfUnit{u in units};")
-        temp_sets.append("set unitsOfLayer{l in layers} := setof{u in units : l in layersOfUnit[u]} u;")
-        temp_sets.append("set outputMarketLayers := setof{u in markets, l in layersOfUnit[u]} (u, l);")
-        temp_sets.append("set nonmarketUtilities := utilities diff markets;")
-        if self.has_storage:
-            temp_sets.append("set chargingUtilitiesOfStorageUnit{u in storageUnits} within utilities;")
-            temp_sets.append("set dischargingUtilitiesOfStorageUnit{u in storageUnits} within utilities;")
-            temp_sets.append("set nonStorageUtilities within utilities := utilities diff storageUnits;")
-            idx = temp_sets.index("set utilities := standardUtilities union markets;")
-            temp_sets[idx] = "set utilities := standardUtilities union markets union storageUnits;"
-            temp_sets.insert(idx-1, "set storageUnits;")
-        if self.has_units_with_minimum_size_if_installed:
-            temp_sets.append("set unitsWithMinimumSizeIfInstalled within nonmarketUtilities;")
-        if self.has_units_eligible_for_tax_deduction:
-            temp_sets.append("set unitsEligibleForTaxDeduction within nonmarketUtilities;")
-        if self.has_units_operated_only_on_off:
-            temp_sets.append("set unitsOnOff within nonmarketUtilities;")
-        self.mod_string += "\n".join(temp_sets) + "\n\n\n"
-
-    def write_parameters(self):
-        temp_params = []
-        # Adds the problem parameters to the mod file string
-        temp_params.append("/* PROBLEM PARAMETERS */\n")
-        temp_params.append("param POWER_MAX{u in utilities, l in layersOfUnit[u]} default 0;")
-        temp_params.append("param POWER{p in processes, l in layersOfUnit[p], t in timeSteps};")
-        if self.has_variable_time_step_durations:
-            temp_params.append("param TIME_STEP_DURATION{t in timeSteps};")
-        else:
-            temp_params.append("param TIME_STEP_DURATION;")
-        temp_params.append("param OCCURRANCE;")
-        temp_params.append("param SPECIFIC_INVESTMENT_COST_ANNUALIZED{u in utilities} default 0;")
-        temp_params.append("param SPECIFIC_INVESTMENT_COST{u in utilities} default 0;")
-        temp_params.append("param ENERGY_AVERAGE_PRICE{m in markets, l in layersOfUnit[m]} default 0;")
-        temp_params.append("param POWER_MAX_REL{u in utilities, l in layersOfUnit[u], t in timeSteps} default 1;")
-        temp_params.append("param ENERGY_PRICE_VARIATION{m in markets, l in layersOfUnit[m], t in timeSteps} default 1;")
-        temp_params.append("param BIG_M default 100;")
-        if self.has_minimum_installed_power:
-            temp_params.append("param POWER_MIN{u in nonmarketUtilities} default 0;")
-        if self.has_storage:
-            temp_params.append("param ENERGY_MAX{u in storageUnits} default 0;")
-            temp_params.append("param CRATE{u in storageUnits} default 1;")
-            temp_params.append("param ERATE{u in storageUnits} default 1;")
-            temp_params.append("param ERROR_MARGIN_ON_CYCLIC_SOC default 0.1;")
-            temp_params.append("param STORAGE_LOSSES{u in storageUnits} default 0;")
-            idx = temp_params.index("param POWER_MAX{u in utilities, l in layersOfUnit[u]} default 0;")
-            temp_params[idx] = "param POWER_MAX{u in nonStorageUtilities, l in layersOfUnit[u]} default 0;"
-            idy = temp_params.index("param POWER_MAX_REL{u in utilities, l in layersOfUnit[u], t in timeSteps} default 1;")
-            temp_params[idy] = "param POWER_MAX_REL{u in nonStorageUtilities, l in layersOfUnit[u], t in timeSteps} default 1;"
-        if self.has_units_with_minimum_size_if_installed:
-            temp_params.append("param SIZE_MIN_IF_INSTALLED{u in unitsWithMinimumSizeIfInstalled} default 0;")
-        if self.has_units_eligible_for_tax_deduction:
-            temp_params.append("param TAX_DEDUCTION default 0 <= 1;")
-            temp_params.append("param YEARS_FOR_TAX_DEDUCTION default 1;")
-        self.mod_string += "\n".join(temp_params) + "\n\n\n"
-        
-    def write_variables(self):
-        # Adds the problem sets to the mod file string
-        temp_vars = []
-        temp_vars.append("/* PROBLEM VARIABLES */\n")
-        temp_vars.append("var power{u in units, l in layersOfUnit[u], t in timeSteps};")
-        temp_vars.append("var layer_operating_cost{(u,l) in outputMarketLayers};")
-        temp_vars.append("var ics{u in nonmarketUtilities, t in timeSteps} >= 0, <= 1;")
-        temp_vars.append("var OPEX;")
-        if self.has_storage:
-            temp_vars.append("var energyStorageLevel{u in storageUnits, l in layersOfUnit[u], t in timeSteps} >=0;")
-            temp_vars.append("var energyStorageLevel0{u in storageUnits, l in layersOfUnit[u]} >=0;")
-        if self.has_capex:
-            temp_vars.append("var unitAnnualizedInvestmentCost{u in nonmarketUtilities} >= 0;")
-            temp_vars.append("var size{u in nonmarketUtilities} >= 0;")
-            temp_vars.append("var CAPEX;")
-            temp_vars.append("var TOTEX;")
-        if self.has_units_with_minimum_size_if_installed:
-            temp_vars.append("var ips{u in unitsWithMinimumSizeIfInstalled} binary;")
-        if self.has_units_operated_only_on_off:
-            temp_vars.append("var ips_t{u in unitsOnOff, t in timeSteps} binary;")
-        self.mod_string += "\n".join(temp_vars) + "\n\n\n"
-
-    def write_objective(self):
-        # Adds the problem objective to the mod file string
-        self.mod_string += "/* OBJECTIVE FUNCTION */\n\n"
-        self.mod_string += self.problem.objective.objective
-        for constraint in self.problem.objective.constraints:
-            self.mod_string += constraint
-        self.mod_string += "\n\n"
-
-    def write_base_constraints(self):
-        # Adds the problem constraints to the mod file string
-        temp_constraints = []
-        temp_constraints.append("/* CONSTRAINTS */\n")
-        if self.has_units_eligible_for_tax_deduction:
-            temp_constraints.append("s.t. calculate_opex: OPEX = sum{(u,l) in outputMarketLayers} layer_operating_cost[u,l] - sum{u in unitsEligibleForTaxDeduction} size[u] * SPECIFIC_INVESTMENT_COST[u] * TAX_DEDUCTION / YEARS_FOR_TAX_DEDUCTION;")
-        else:
-            temp_constraints.append("s.t. calculate_opex: OPEX = sum{(u,l) in outputMarketLayers} layer_operating_cost[u,l];")
-        temp_constraints.append("s.t. layer_balance{l in layers, t in timeSteps}: sum{u in unitsOfLayer[l]} (power[u,l,t]) = 0;")
-        temp_constraints.append("s.t. process_power{p in processes, l in layersOfUnit[p], t in timeSteps}: power[p,l,t] = -POWER[p,l,t];")
-        # Constraints to be added depending on whether we are calculating the cost of the investment or not
-        if self.has_capex:
-            temp_constraints.append("s.t. component_sizing{u in standardUtilities, l in mainLayerOfUnit[u], t in timeSteps}: size[u] >= ics[u,t] * abs(POWER_MAX[u,l]);")
-            temp_constraints.append("s.t. calculate_capex: CAPEX = sum{u in nonmarketUtilities} unitAnnualizedInvestmentCost[u];")
-            temp_constraints.append("s.t. calculate_investment_cost{u in nonmarketUtilities}: unitAnnualizedInvestmentCost[u] = size[u] * SPECIFIC_INVESTMENT_COST_ANNUALIZED[u];")
-            temp_constraints.append("s.t. calculate_totex: TOTEX = CAPEX + OPEX;")
-        # Constraints added only if the problem has units with a minimum installed size
-        if self.has_minimum_installed_power:
-            temp_constraints.append("s.t. minimum_installed_power{u in nonmarketUtilities}: size[u] >= POWER_MIN[u];")
-        # Constraints to be added depending on whether energy prices depend on the time step or not
-        temp_constraints.append("s.t. calculate_operating_cost_time_dependent{u in markets, l in layersOfUnit[u]}: layer_operating_cost[u,l] = sum{t in timeSteps} (power[u,l,t] * ENERGY_AVERAGE_PRICE[u,l] * ENERGY_PRICE_VARIATION[u,l,t]) * TIME_STEP_DURATION * OCCURRANCE;")        
-        # Constraints to be added depending on whether the maximum power output of the utilities depends on the time step or not
-        temp_constraints.append("s.t. component_load{u in standardUtilities, l in layersOfUnit[u], t in timeSteps}: power[u,l,t] = ics[u,t] * POWER_MAX[u,l] * POWER_MAX_REL[u,l,t];")
-        # temp_constraints.append("s.t. market_limits{u in markets, l in layersOfUnit[u], t in timeSteps}: POWER_MAX[u,l] * POWER_MAX_REL[u,l,t] <= power[u,l,t] <= 0;")
-        temp_constraints.append("s.t. purchase_market_limits{u in markets, l in layersOfUnit[u], t in timeSteps: POWER_MAX[u,l] >= 0}: 0 <= power[u,l,t] <= POWER_MAX[u,l] * POWER_MAX_REL[u,l,t];")
-        temp_constraints.append("s.t. selling_market_limits{u in markets, l in layersOfUnit[u], t in timeSteps: POWER_MAX[u,l] <= 0}: POWER_MAX[u,l] * POWER_MAX_REL[u,l,t] <= power[u,l,t] <= 0;")
-        # Constraints to be added if problem has units with a minimum size if installed
-        if self.has_units_with_minimum_size_if_installed:
-            temp_constraints.append("s.t. component_sizing_with_minimum_size_if_installed{u in unitsWithMinimumSizeIfInstalled, l in mainLayerOfUnit[u]} : size[u] >= SIZE_MIN_IF_INSTALLED[u] * ips[u];")
-            temp_constraints.append("s.t. constraint_on_ips{u in unitsWithMinimumSizeIfInstalled, t in timeSteps}: ics[u,t] <= ips[u];")
-        if self.has_units_operated_only_on_off:
-            temp_constraints.append("s.t. component_load_onoff{u in unitsOnOff, t in timeSteps}: ics[u,t] == ips_t[u,t];")
-        # Constraints to be added depending on whether there are storage units in the problem
-        if self.has_storage:
-            temp_constraints.append("s.t. storage_balance{u in storageUnits, l in layersOfUnit[u], t in timeSteps}:")
-            temp_constraints.append("\tenergyStorageLevel[u,l,t] = (if t == 0")
-            temp_constraints.append("\t\tthen")
-            temp_constraints.append("\t\t\tenergyStorageLevel0[u,l] - power[u,l,t]*TIME_STEP_DURATION - energyStorageLevel0[u,l] * STORAGE_LOSSES[u]")
-            temp_constraints.append("\t\telse")
-            temp_constraints.append("\t\t\tenergyStorageLevel[u,l,t-1] - power[u,l,t]*TIME_STEP_DURATION")
-            temp_constraints.append("\t);")
-            temp_constraints.append("s.t. storage_cyclic_constraint_high{u in storageUnits, l in layersOfUnit[u]}:")
-            temp_constraints.append("\tenergyStorageLevel[u,l,card(timeSteps)-1] - energyStorageLevel0[u,l] >= 0;")
-            temp_constraints.append("s.t. storage_cyclic_constraint_low{u in storageUnits, l in layersOfUnit[u]}:")
-            temp_constraints.append("\tenergyStorageLevel[u,l,card(timeSteps)-1] - energyStorageLevel0[u,l] <= ERROR_MARGIN_ON_CYCLIC_SOC * ENERGY_MAX[u];")
-            temp_constraints.append("s.t. storage_max_energy{u in storageUnits, l in layersOfUnit[u], t in timeSteps}:")
-            temp_constraints.append("\tenergyStorageLevel[u,l,t] <= size[u];")
-            temp_constraints.append("s.t. storage_max_energy2{u in storageUnits}:")
-            temp_constraints.append("\tsize[u] <= ENERGY_MAX[u];")
-            temp_constraints.append("s.t. storage_max_ch_power{u in storageUnits, l in layersOfUnit[u], t in timeSteps}: ")
-            temp_constraints.append("\tpower[u,l,t] >= -size[u] * CRATE[u];")
-            temp_constraints.append("s.t. storage_max_dis_power{u in storageUnits, l in layersOfUnit[u], t in timeSteps}:")
-            temp_constraints.append("\tpower[u,l,t] <= size[u] * ERATE[u];")
-            temp_constraints.append("s.t. storage_ch_power_cost{u in storageUnits, l in layersOfUnit[u], ch in chargingUtilitiesOfStorageUnit[u], t in timeSteps}:")
-            temp_constraints.append("\tpower[ch,l,t] <= size[u] * CRATE[u];")
-            temp_constraints.append("s.t. storage_dis_power_cost{u in storageUnits, l in layersOfUnit[u], dis in dischargingUtilitiesOfStorageUnit[u], t in timeSteps}:")
-            temp_constraints.append("\tpower[dis,l,t] >= -size[u] * ERATE[u];")
-            temp_constraints.append("s.t. charging_power_only_positive{u in storageUnits, l in layersOfUnit[u], ch in chargingUtilitiesOfStorageUnit[u], t in timeSteps}:")
-            temp_constraints.append("\tpower[ch,l,t] >= 0;")
-            temp_constraints.append("s.t. discharging_power_only_negative{u in storageUnits, l in layersOfUnit[u], dis in dischargingUtilitiesOfStorageUnit[u], t in timeSteps}:")
-            temp_constraints.append("\tpower[dis,l,t] <= 0;")
-        temp_mod_string = "\n".join(temp_constraints)
-        # We modify all at once if the TIME_STEP_DURATION parameter has variable length
-        if self.has_variable_time_step_durations:
-            temp_mod_string = temp_mod_string.replace('TIME_STEP_DURATION', 'TIME_STEP_DURATION[t]')
-        self.mod_string += temp_mod_string + "\n\n\n"
-    
-        
-
-    def write_additional_constraints(self):
-        additional_constraints = []
-        for constraint_type, constraint in self.problem.additional_constraints_data.items():
-            if constraint_type == "MaximumYearlyFlowConstraint":
-                additional_constraints.append(f"param {constraint['parameter name']};")
-                additional_constraints.append(f"var {constraint['variable name']};")
-                additional_constraints.append(f"s.t. {constraint['name']}_calculation")
-                additional_constraints.append(f"{{u in units, l in layersOfUnit[u]: u == '{constraint['unit name']}' && l == '{constraint['layer name']}'}}:")
-                additional_constraints.append(f"\tabs(sum{{t in timeSteps}} power[u,l,t] * TIME_STEP_DURATION * OCCURRANCE) = {constraint['variable name']};")
-                additional_constraints.append(f"s.t. {constraint['name']}_leq: {constraint['variable name']} <= {constraint['parameter name']};")
-        temp_mod_string = "\n".join(additional_constraints)
-        # We modify all at once if the TIME_STEP_DURATION parameter has variable length
-        if self.has_variable_time_step_durations:
-            temp_mod_string = temp_mod_string.replace('TIME_STEP_DURATION', 'TIME_STEP_DURATION[t]')
-        self.mod_string += temp_mod_string + "\n\n\n"
-
-    def typical_periods_transformation(self):
-        self.mod_string = self.mod_string.replace("set timeSteps;", "set typicalPeriods;\nset timeStepsOfPeriod{tp in typicalPeriods};")
-        self.mod_string = self.mod_string.replace("param OCCURRANCE;", "param OCCURRANCE{tp in typicalPeriods};")
-        self.mod_string = self.mod_string.replace("* OCCURRANCE;", "* OCCURRANCE[tp];")
-        self.mod_string = self.mod_string.replace("* OCCURRANCE)", "* OCCURRANCE[tp])")
-        self.mod_string = self.mod_string.replace('t in timeSteps', 'tp in typicalPeriods, t in timeStepsOfPeriod[tp]')
-        self.mod_string = self.mod_string.replace('t]','tp,t]')
-        self.mod_string = self.mod_string.replace('l,t-1]','l,tp,t-1]')
-        self.mod_string = self.mod_string.replace("energyStorageLevel[u,l,", "energyStorageLevel[u,l,tp,")        
-        self.mod_string = self.mod_string.replace("{u in storageUnits, l in layersOfUnit[u]}",
-                                                  "{u in storageUnits, l in layersOfUnit[u], tp in typicalPeriods}")
-        self.mod_string = self.mod_string.replace("energyStorageLevel0[u,l]", "energyStorageLevel0[u,l,tp]")
-        self.mod_string = self.mod_string.replace("tp,tp,", 'tp,')
-        self.mod_string = self.mod_string.replace("(timeSteps)", "(timeStepsOfPeriod[tp])")
+    def build_mod_string(self):
+        # Writes the text of the model, based on the model settings, without loading it in AMPL
+        model = render_model(self.model_features(), self.problem.objective.objective, self.problem.objective.constraints,
+                             self.problem.additional_constraints_data)
+        self.mod_string = f'/* MOD FILE */\n\n/* Problem name: {self.problem.name} */\n\n' + model
+
+    def model_features(self) -> ModelFeatures:
+        # The model settings that affect the text of the model
+        return ModelFeatures(
+            has_storage = self.has_storage,
+            has_capex = self.has_capex,
+            has_minimum_installed_power = self.has_minimum_installed_power,
+            has_units_with_minimum_size_if_installed = self.has_units_with_minimum_size_if_installed,
+            has_units_operated_only_on_off = self.has_units_operated_only_on_off,
+            has_units_eligible_for_tax_deduction = self.has_units_eligible_for_tax_deduction,
+            has_typical_periods = self.has_typical_periods,
+            has_variable_time_step_durations = self.has_variable_time_step_durations)
+
+    def set_solver_options(self, solver: str, options) -> dict:
+        """
+        Passes the solver options (a SolverOptions) to the AMPL solver driver, and returns the effective settings.
+        The option is always set, so that a session reused from an AmplSessionPool does not keep the options of the previous run
+        """
+        ampl_options = options.to_ampl()
+        self.set_option(f'{solver}_options', ampl_options)
+        return {f'{solver}_options': ampl_options}
+
+    def solve_statistics(self) -> dict:
+        """
+        Size of the model before and after the AMPL presolve, and statistics of the last solve (see RunTelemetry).
+        The MIP gap is only available if the solver driver returns it (e.g. with the mip:return_gap option)
+        """
+        statistics = {name: self.get_statistic(parameter) for name, parameter in self.MODEL_STATISTICS.items()}
+        objective = next(iter(self.get_objectives()), None)
+        if objective is not None:
+            statistics |= {'objective': self.get_statistic(objective[0]), 'mip gap': self.get_statistic(f'{objective[0]}.relmipgap')}
+        return statistics
+
+    def get_statistic(self, expression: str) -> float | None:
+        # The value of an AMPL expression, or None if it is not defined (e.g. a suffix not returned by the solver)
+        try:
+            return self.get_value(expression)
+        except (amplpy.AMPLException, RuntimeError, TypeError):
+            return None
+
+    def get_variable_values(self, names: list) -> dict:
+        """
+        The values of several variables, by name, as Series indexed like the variables. The variables must have the same
+        indexing sets: their values are fetched from the AMPL session with a single display-like call (get_data)
+        """
+        values = self.get_data(*names).to_pandas()
+        return {name: values[name] for name in names}
+
+    def get_warm_start(self) -> WarmStart:
+        # The solution to be used as starting point for a similar problem
+        names = {name for name, _ in self.get_variables()}
+        return WarmStart({name: self.get_variable(name).get_values().to_pandas().iloc[:, 0] for name in WarmStart.VARIABLES if name in names})
+
+    def set_warm_start(self, warm_start: WarmStart | None):
+        """
+        Sets the values of the warm start as initial values of the variables. AMPL sends them to the solver with the problem,
+        which can use them as starting point (e.g. as first incumbent of a MIP, depending on the options of the solver driver).
+        The simplex basis of a previous solve is only reused by the native interpreter
+        """
+        if warm_start is None:
+            return
+        names = {name for name, _ in self.get_variables()}
+        for name in warm_start.values:
+            if name in names:
+                variable = self.get_variable(name)
+                values = warm_start.matched_values(name, variable.get_values().to_pandas().index)
+                if not values.empty:
+                    variable.set_values(values.to_dict())
+
+    def load_model(self):
+        """
+        Loads the model (mod_string) in the AMPL session. If the session already has the same model loaded
+        (e.g. a session reused from an AmplSessionPool), only its data are reset
+        """
+        model_fingerprint = fingerprint(self.mod_string)
+        if model_fingerprint == self.model_fingerprint:
+            # The data are kept if they are those of the snapshot the problem was cloned from: only its modifications are then sent
+            base_snapshot = self.problem.base_data()
+            self.holds_base_data = base_snapshot is not None and base_snapshot is self.base_snapshot
+            if not self.holds_base_data:
+                self.eval('reset data;')
+            return
+        if self.model_fingerprint is not None:
+            self.reset()
+        self.eval(self.mod_string)
+        self.model_fingerprint = model_fingerprint
+        self.holds_base_data = False
 
     def write_sets_to_amplpy(self):
-        # Writes problem data about sets to amplpy
+        """
+        Writes problem data about sets to amplpy, with one call per set.
+        Sets of contiguous integers (ranges) are assigned as AMPL ranges (e.g. 0..8759), while the content of
+        all other sets, or of all the subsets of an indexed set, is converted to lists and sent at once
+        """
         for name, problem_set in self.problem.sets.items():
-            if all([problem_set.content != set(), problem_set.content != dict()]):
-                self.set[name] = problem_set.content
+            if problem_set.is_empty():
+                continue
+            if not problem_set.indexing:
+                if isinstance(problem_set.content, range):
+                    self.eval(f'let {name} := {AmplProblem.range_to_ampl(problem_set.content)};')
+                else:
+                    self.set[name] = AmplProblem.set_content_to_list(problem_set.content)
+            elif all(isinstance(subset_content, range) for subset_content in problem_set.content.values()):
+                self.eval(' '.join(f'let {name}[{AmplProblem.value_to_ampl(subset)}] := {AmplProblem.range_to_ampl(subset_content)};'
+                                   for subset, subset_content in problem_set.content.items()))
+            else:
+                self.set[name] = {subset: AmplProblem.set_content_to_list(subset_content) for subset, subset_content in problem_set.content.items()}
 
-    def write_parameters_to_amplpy(self):
-        # Writes the problem data to amplpy
+    @staticmethod
+    def range_to_ampl(content: range) -> str:
+        # Converts a range to the AMPL syntax for sets of equally spaced numbers (e.g. "0..23" or "0..8758 by 2")
+        if len(content) == 0:
+            return '{}'
+        return f'{content[0]}..{content[-1]}' + (f' by {content.step}' if content.step != 1 else '')
+
+    @staticmethod
+    def value_to_ampl(value) -> str:
+        # Converts a set member to AMPL syntax: strings are quoted, numbers are written as they are
+        return "'" + value.replace("'", "''") + "'" if isinstance(value, str) else str(value)
+
+    @staticmethod
+    def set_content_to_list(content) -> list:
+        # Returns the content of a set (Python set, range or NumPy array) as a list of Python values
+        return content.tolist() if isinstance(content, np.ndarray) else list(content)
+
+    def write_parameters_to_amplpy(self, only_modified: bool = False):
+        """
+        Writes the problem data to amplpy. The rows that differ from the snapshot the problem was cloned from are recorded,
+        so that the next problem cloned from the same snapshot only sends its own modifications and reverts these ones
+        :param: only_modified   If True, the session holds the data of the snapshot (see load_model): only the parameters, or the rows
+                                of a parameter, modified by this problem or by the previous one solved in the session are sent to AMPL
+        """
+        modified_parameters = {}
         for parameter_name, parameter in self.problem.parameters.items():
-            if not parameter.is_empty(): 
-                self.param[parameter_name] = parameter.content    
+            previous = self.modified_parameters.get(parameter_name, set())
+            if not only_modified:
+                if not parameter.is_empty():
+                    self.write_parameter(parameter_name, parameter.content)
+            elif parameter.dirty or previous is None:
+                # The whole parameter is sent again, as rows may have been added to it (or to the one of the previous problem)
+                self.eval(f'reset data {parameter_name};')
+                if not parameter.is_empty():
+                    self.write_parameter(parameter_name, parameter.content)
+            elif previous or parameter.dirty_positions:
+                self.write_parameter(parameter_name, parameter.content.iloc[sorted(previous | parameter.dirty_positions)])
+            if parameter.dirty or parameter.dirty_positions:
+                modified_parameters[parameter_name] = None if parameter.dirty else set(parameter.dirty_positions)
+        self.modified_parameters = modified_parameters
+        self.base_snapshot = self.problem.base_data()
+
+    def write_parameter(self, name: str, content):
+        """
+        Sends the whole content of a parameter to AMPL. Indexed parameters are converted column by column
+        (see AmplProblem.to_ampl_dataframe), instead of letting amplpy convert the pandas DataFrame row by row.
+        The number of rows, the size of the data and the time needed are saved in the transfer report
+        """
+        start = time.perf_counter()
+        if isinstance(content, pd.DataFrame | pd.Series):
+            ampl_data, n_bytes = AmplProblem.to_ampl_dataframe(name, content)
+            self.param[name].set_values(ampl_data)
+            n_rows = len(content)
+        else:
+            self.param[name] = content
+            n_rows, n_bytes = 1, 8
+        self.transfer_report[name] = {'rows': n_rows, 'bytes': n_bytes, 'seconds': time.perf_counter() - start}
+
+    @staticmethod
+    def to_ampl_dataframe(name: str, content: pd.DataFrame | pd.Series) -> tuple[amplpy.DataFrame, int]:
+        """
+        Converts the content of a parameter to an amplpy DataFrame, passing each index level and each value column
+        as a whole (one list per column). Returns the amplpy DataFrame and the size of the data sent, in bytes
+        :param: name      The name of the parameter (used as column name if the content is a Series)
+        :param: content   The content of the parameter, indexed over its indexing sets
+        """
+        if isinstance(content, pd.Series):
+            content = content.to_frame(name)
+        index = content.index if isinstance(content.index, pd.MultiIndex) else pd.MultiIndex.from_arrays([content.index])
+        index_headers = tuple(level_name if level_name else f'index{level}' for level, level_name in enumerate(index.names))
+        ampl_data = amplpy.DataFrame(index = index_headers, columns = tuple(content.columns))
+        n_bytes = 0
+        # Index levels are rebuilt from their (few) unique values and their codes, which also gives the size of string labels cheaply
+        for header, level_values, codes in zip(index_headers, index.levels, index.codes):
+            level_values = level_values.to_numpy()
+            ampl_data._set_column(header, level_values[codes].tolist())
+            if level_values.dtype == object:
+                n_bytes += int(np.bincount(codes, minlength = len(level_values)) @ np.array([len(str(x)) for x in level_values], dtype = int))
+            else:
+                n_bytes += level_values.itemsize * len(codes)
+        for column in content.columns:
+            values = content[column].to_numpy()
+            ampl_data._set_column(column, values.tolist())
+            n_bytes += values.nbytes
+        return ampl_data, n_bytes
+
+    def export_files(self, mode: str = 'background'):
+        """
+        Exports the model and data files to the temporary folder of the run. Depending on the mode:
+          - off:         no file is written
+          - on:          modfile.mod and datfile.dat are exported by AMPL, before the solve
+          - compressed:  modfile.mod and datfile.dat.gz are written by a background thread, while the problem is solved
+          - background:  modfile.mod and datfile.dat are written by a background thread, while the problem is solved
+        Background files are written from the problem data (AMPL itself is busy solving), so they do not delay the solve
+        """
+        match mode:
+            case 'off':
+                pass
+            case 'on':
+                self.export_model(os.path.join(self.temp_folder, 'modfile.mod'))
+                self.export_data(os.path.join(self.temp_folder, 'datfile.dat'))
+            case 'compressed' | 'background':
+                self.export_thread = threading.Thread(target = self.write_model_files, args = (self.temp_folder, mode == 'compressed'),
+                                                      name = f'Export of {self.temp_folder}')
+                self.export_thread.start()
+            case _:
+                raise ValueError(f'Unknown model export mode "{mode}". It should be one of "off", "on", "compressed" or "background"')
+
+    def wait_for_export(self):
+        # Waits until the model and data files written in background are complete
+        if self.export_thread is not None:
+            self.export_thread.join()
+            self.export_thread = None
+
+    def write_model_files(self, folder: str, compressed: bool = False):
+        # Writes the mod file and the data file (gzip-compressed if required) to the given folder
+        with open(os.path.join(folder, 'modfile.mod'), 'w') as stream:
+            stream.write(self.mod_string)
+        if compressed:
+            with gzip.open(os.path.join(folder, 'datfile.dat.gz'), 'wt', compresslevel = 1) as stream:
+                AmplProblem.write_data_file(self.problem, stream)
+        else:
+            with open(os.path.join(folder, 'datfile.dat'), 'w') as stream:
+                AmplProblem.write_data_file(self.problem, stream)
+
+    @staticmethod
+    def write_data_file(problem, stream):
+        """
+        Writes the sets and parameters of a problem to a text stream, in AMPL data format.
+        The same data as in write_sets_to_amplpy and write_parameters_to_amplpy are written. Indexed parameters are written
+        one row per index (with missing values as the AMPL default "."), using the pandas CSV writer
+        """
+        stream.write('data;\n\n')
+        for name, problem_set in problem.sets.items():
+            if problem_set.is_empty():
+                continue
+            if not problem_set.indexing:
+                stream.write(f'set {name} := {AmplProblem.set_content_to_data(problem_set.content)};\n')
+            else:
+                for subset, subset_content in problem_set.content.items():
+                    stream.write(f'set {name}[{AmplProblem.value_to_ampl(subset)}] := {AmplProblem.set_content_to_data(subset_content)};\n')
+        stream.write('\n')
+        for name, parameter in problem.parameters.items():
+            if parameter.is_empty():
+                continue
+            content = parameter.content
+            if not isinstance(content, pd.DataFrame | pd.Series):
+                stream.write(f'param {name} := {content};\n\n')
+                continue
+            values = content if isinstance(content, pd.Series) else content[name]
+            index = values.index if isinstance(values.index, pd.MultiIndex) else pd.MultiIndex.from_arrays([values.index])
+            columns = {}
+            for level, (level_values, codes) in enumerate(zip(index.levels, index.codes)):
+                level_values = level_values.to_numpy()
+                if level_values.dtype == object:
+                    level_values = np.array([AmplProblem.value_to_ampl(value) for value in level_values], dtype = object)
+                columns[level] = level_values[codes]
+            columns[len(columns)] = values.to_numpy()
+            stream.write(f'param {name} :=\n')
+            pd.DataFrame(columns).to_csv(stream, sep = '\t', header = False, index = False, na_rep = '.',
+                                         quoting = csv.QUOTE_NONE, escapechar = '\\', lineterminator = '\n')
+            stream.write(';\n\n')
+
+    @staticmethod
+    def set_content_to_data(content) -> str:
+        # Returns the members of a set as a space-separated string, in AMPL data format
+        return ' '.join(AmplProblem.value_to_ampl(value) for value in AmplProblem.set_content_to_list(content))
+
+
+class AmplSessionPool:
+    """
+    Pool of long-lived AMPL sessions, to be shared by problems that are solved one after the other (e.g. scenarios).
+    Idle sessions are kept with the fingerprint of the model they have loaded: a problem with the same model text gets a
+    session where only the data are reset, so that neither a new AMPL process is started nor the model is parsed again
+    """
+
+    def __init__(self, max_idle_sessions: int = 2):
+        self.max_idle_sessions = max_idle_sessions
+        self.idle = []  # Idle sessions, the most recently released last
+        self.report = {'started': 0, 'model reused': 0, 'model reloaded': 0}
+
+    def acquire(self, problem) -> AmplProblem:
+        # Returns an AMPL session bound to the problem, with its model loaded and no data
+        if not self.idle:
+            session = AmplProblem(problem)
+            self.report['started'] += 1
+        else:
+            session = self.idle.pop()
+            session.set_problem(problem)
+        session.parse_problem_settings()
+        session.build_mod_string()
+        model_fingerprint = fingerprint(session.mod_string)
+        if session.model_fingerprint is not None and session.model_fingerprint != model_fingerprint:
+            # Another idle session may already have this model loaded
+            matching = next((other for other in self.idle if other.model_fingerprint == model_fingerprint), None)
+            if matching is not None:
+                self.idle.remove(matching)
+                self.idle.append(session)
+                matching.set_problem(problem)
+                matching.parse_problem_settings()
+                matching.build_mod_string()
+                session = matching
+        if session.model_fingerprint == model_fingerprint:
+            self.report['model reused'] += 1
+        elif session.model_fingerprint is not None:
+            self.report['model reloaded'] += 1
+        session.load_model()
+        return session
+
+    def release(self, session: AmplProblem):
+        # Returns a session to the pool, once its results have been processed. The oldest idle sessions beyond the limit are closed
+        session.wait_for_export()
+        self.idle.append(session)
+        while len(self.idle) > self.max_idle_sessions:
+            self.idle.pop(0).close()
+
+    def close(self):
+        # Closes all the idle sessions
+        while self.idle:
+            self.idle.pop().close()
@@ -0,0 +1,424 @@
+"""
+Benders decomposition of the native model over its typical periods. With typical periods, the periods are only coupled
+through the sizing variables (size, ips) and the costs: the master problem holds the sizing variables and one
+estimate of the operating cost of each period, and the dispatch of each period (power, ics, energyStorageLevel, ...)
+is a separate LP, solved for the sizes proposed by the master. The subproblems return optimality cuts (or feasibility
+cuts, if the sizes cannot satisfy the demand) until the lower bound of the master and the best solution found meet.
+The subproblems can be solved in parallel by a pool of processes, and only the master, that grows with the number of
+units and iterations, and one period at a time need to be handled by the solver
+"""
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import NamedTuple
+import importlib.util, time
+import numpy as np
+from OptiENEA.classes.native_model import NativeProblem
+
+
+@dataclass(frozen=True)
+class DecompositionSettings:
+    """
+    The settings of the decomposition, read from the "Decomposition" block of the general settings:
+      - method: decomposition method. Only "benders" is available
+      - workers: number of processes solving the subproblems. With 1, they are solved in the main process
+      - tolerance: relative gap between the upper and lower bounds at which the solve stops
+      - max_iterations: maximum number of iterations. When it is reached, the solve result is "limit"
+    """
+    method: str = 'benders'
+    workers: int = 1
+    tolerance: float = 1e-4
+    max_iterations: int = 100
+
+    # Names of the settings in general.yml
+    SETTINGS_NAMES = {'Method': 'method', 'Workers': 'workers', 'Tolerance': 'tolerance', 'Max iterations': 'max_iterations'}
+
+    def __post_init__(self):
+        object.__setattr__(self, 'method', str(self.method).lower())
+        if self.method != 'benders':
+            raise ValueError(f'The decomposition method should be "benders". {self.method} was provided')
+        for name in ('workers', 'max_iterations'):
+            if not isinstance(getattr(self, name), int) or getattr(self, name) < 1:
+                raise ValueError(f'The {name} decomposition setting should be a positive integer. {getattr(self, name)} was provided')
+        if not self.tolerance >= 0:
+            raise ValueError(f'The tolerance decomposition setting should be a non-negative number. {self.tolerance} was provided')
+
+    @classmethod
+    def from_settings(cls, settings: dict | None) -> 'DecompositionSettings | None':
+        # Reads the "Decomposition" block of general.yml. Without it, the problem is solved as a whole
+        if settings is None:
+            return None
+        unknown = set(settings) - set(cls.SETTINGS_NAMES)
+        if unknown:
+            raise ValueError(f'Unknown decomposition settings: {", ".join(sorted(unknown))}. Valid settings are {", ".join(cls.SETTINGS_NAMES)}')
+        return cls(**{cls.SETTINGS_NAMES[name]: value for name, value in settings.items()})
+
+
+@dataclass
+class Subproblem:
+    """
+    The dispatch LP of one period, for given values of the master columns it is linked to:
+      - columns: the columns of the period in the full model
+      - linking: the master columns that appear in the rows of the period, and their positions among the master columns
+      - matrix: the rows of the period, with the columns of the period followed by the linking columns
+      - balance_rows: the positions of the layer balance rows among the rows of the period
+    """
+    period: int
+    columns: np.ndarray
+    linking: np.ndarray
+    linking_positions: np.ndarray
+    matrix: object
+    row_lower: np.ndarray
+    row_upper: np.ndarray
+    lower: np.ndarray
+    upper: np.ndarray
+    linking_lower: np.ndarray
+    linking_upper: np.ndarray
+    costs: np.ndarray
+    balance_rows: np.ndarray
+
+
+class LinearSolution(NamedTuple):
+    status: str
+    objective: float
+    x: np.ndarray | None
+    reduced_costs: np.ndarray | None
+
+
+class BendersProblem(NativeProblem):
+    """
+    A NativeProblem solved by Benders decomposition over its typical periods (see DecompositionSettings).
+    The nonzeros of the model are added as for the monolithic one, then split: the cost columns (OPEX, CAPEX, TOTEX, ...) are eliminated
+    through the rows that define them, and all other rows either only contain master columns, or the columns of a single period
+    """
+    STABILIZATION = 0.5  # Weight of the master solution in the point where the subproblems are solved
+
+    def __init__(self, problem, settings: DecompositionSettings):
+        super().__init__(problem)
+        self.settings = settings
+        self.subproblems = []
+
+    @staticmethod
+    def check_decomposable(has_units_operated_only_on_off: bool):
+        # Raises an error for the problems that cannot be decomposed. Checked when the settings are read, and again when the model is built
+        if has_units_operated_only_on_off:
+            raise ValueError('The Benders decomposition needs LP subproblems, so it does not support units operated on/off. Solve the problem without decomposition instead')
+
+    def build(self):
+        self.check_decomposable(self.features.has_units_operated_only_on_off)
+        super().build()
+        self.build_report |= {'periods': self.n_periods, 'master columns': len(self.master_columns)}
+
+    def assemble(self, rows: np.ndarray, columns: np.ndarray, coefficients: np.ndarray) -> int:
+        """
+        Splits the model into the master problem and one subproblem per period. Their matrices are built directly from the
+        nonzeros of the model, grouped by block of rows, so that the matrix of the whole model is never built
+        """
+        from scipy import sparse
+        period = self.column_periods()
+        defined = np.zeros(self.n_columns, dtype = bool)
+        defined[list(self.definitions)] = True
+        defining = np.zeros(self.n_rows, dtype = bool)
+        defining[list(self.definitions.values())] = True
+        balance = np.zeros(self.n_rows, dtype = bool)
+        balance[np.concatenate(self.balance_rows)] = True
+        # The rows defining the cost columns are only kept to eliminate them (see eliminated_objective and full_solution)
+        is_definition = defining[rows]
+        if defined[columns[~is_definition]].any():
+            raise ValueError('The cost columns should only appear in the rows that define them')
+        self.definition_matrix = sparse.csr_matrix((coefficients[is_definition], (rows[is_definition], columns[is_definition])),
+                                                   shape = (self.n_rows, self.n_columns))
+        rows, columns, coefficients = rows[~is_definition], columns[~is_definition], coefficients[~is_definition]
+        # The block of each row: the period of its columns, -1 if it only contains master columns, -2 for the defining rows
+        entry_periods = period[columns]
+        row_period, row_first_period = np.full(self.n_rows, -1), np.full(self.n_rows, self.n_periods)
+        np.maximum.at(row_period, rows, entry_periods)
+        timed_entries = entry_periods >= 0
+        np.minimum.at(row_first_period, rows[timed_entries], entry_periods[timed_entries])
+        timed_rows = row_period >= 0
+        if (row_period[timed_rows] != row_first_period[timed_rows]).any():
+            raise ValueError('Each row of the model should only contain the columns of one period')
+        row_period[defining] = -2
+        column_period = np.where(defined, -2, period)
+        # The rows and columns of each block, and the position of each row and column within its block
+        blocks = np.arange(-1, self.n_periods)
+        block_rows, row_position = group_by_block(row_period, blocks)
+        block_columns, column_position = group_by_block(column_period, blocks)
+        entry_order = np.argsort(row_period[rows], kind = 'stable')
+        entry_bounds = np.searchsorted(row_period[rows][entry_order], np.append(blocks, self.n_periods))
+        block_entries = [entry_order[entry_bounds[i]:entry_bounds[i + 1]] for i in range(len(blocks))]
+        row_lower, row_upper = np.concatenate(self.row_lower_bounds), np.concatenate(self.row_upper_bounds)
+        lower, upper, _ = self.column_bounds()
+        costs = self.eliminated_objective()
+        self.master_columns, self.master_rows = block_columns[0], block_rows[0]
+        entries = block_entries[0]
+        self.master_matrix = sparse.csr_matrix((coefficients[entries], (row_position[rows[entries]], column_position[columns[entries]])),
+                                               shape = (len(self.master_rows), len(self.master_columns)))
+        self.master_row_lower, self.master_row_upper = row_lower[self.master_rows], row_upper[self.master_rows]
+        self.master_costs = costs[self.master_columns]
+        self.subproblems = []
+        n_nonzeros = self.master_matrix.nnz
+        for k in range(self.n_periods):
+            period_rows, period_columns, entries = block_rows[k + 1], block_columns[k + 1], block_entries[k + 1]
+            entry_columns = columns[entries]
+            is_linking = period[entry_columns] == -1
+            linking = np.unique(entry_columns[is_linking])
+            # The columns of the period come first, followed by the linking columns
+            local_columns = np.where(is_linking, len(period_columns) + np.searchsorted(linking, entry_columns), column_position[entry_columns])
+            period_matrix = sparse.csc_matrix((coefficients[entries], (row_position[rows[entries]], local_columns)),
+                                              shape = (len(period_rows), len(period_columns) + len(linking)))
+            n_nonzeros += period_matrix.nnz
+            self.subproblems.append(Subproblem(k, period_columns, linking, column_position[linking], period_matrix,
+                                               row_lower[period_rows], row_upper[period_rows], lower[period_columns], upper[period_columns],
+                                               lower[linking], upper[linking], costs[period_columns], np.flatnonzero(balance[period_rows])))
+        return n_nonzeros + self.definition_matrix.nnz
+
+    def eliminated_objective(self) -> np.ndarray:
+        # The objective expressed without the cost columns, replacing each of them with the other terms of its defining row
+        costs, matrix = self.objective.copy(), self.definition_matrix
+        while True:
+            columns = [column for column in self.definitions if costs[column] != 0]
+            if not columns:
+                return costs
+            for column in columns:
+                row = self.definitions[column]
+                start, end = matrix.indptr[row], matrix.indptr[row + 1]
+                costs[matrix.indices[start:end]] -= costs[column] * matrix.data[start:end]
+
+    def column_periods(self) -> np.ndarray:
+        # The period of each column of the model, -1 for the columns that do not depend on time (sizes, costs)
+        period = np.full(self.n_columns, -1)
+        for block in self.variables.values():
+            if block.timed:
+                period[block.offset:block.offset + len(block.keys) * self.n_time_steps] = np.tile(self.period_of_step, len(block.keys))
+        if 'energyStorageLevel0' in self.variables:
+            block = self.variables['energyStorageLevel0']
+            period[block.offset:block.offset + len(block.keys)] = [self.periods.index(key[-1]) if self.features.has_typical_periods else 0 for key in block.keys]
+        return period
+
+    def solve(self, solver: str = 'highs'):
+        """
+        Solves the problem by Benders decomposition. The subproblems are not solved at the master solution, but between it and
+        the last feasible solution (in-out stabilization): this avoids the many iterations spent on sizes too small to be feasible
+        """
+        if str(solver).lower() != 'highs':
+            raise ValueError(f'The native interpreter only supports the HiGHS solver. {solver} was provided')
+        start = time.perf_counter()
+        n_master, integer = len(self.master_columns), self.column_bounds()[2][self.master_columns] == 1
+        self.cuts, self.best_upper_bound, self.best = [], np.inf, None
+        lower_bound, iteration, stalled = -np.inf, 0, False
+        with self.period_solver() as solve_periods:
+            # Lower bound of the operating cost of each period, whatever the sizes
+            relaxed = solve_periods(None)
+            for result in relaxed:
+                if result.status != 'solved':
+                    raise ValueError(f'The Benders decomposition needs bounded subproblems, but the operating cost of a period is {result.status} whatever the sizes')
+            period_lower_bounds = np.array([result.objective for result in relaxed])
+            # The largest sizes chosen by the relaxed subproblems are a first feasible solution
+            core = self.core_point(relaxed)
+            core = core if self.evaluate(core, solve_periods(core)) else None
+            self.solve_result = 'limit'
+            for iteration in range(1, self.settings.max_iterations + 1):
+                master = self.solve_master(period_lower_bounds)
+                if master.status != 'solved':
+                    self.solve_result = master.status
+                    break
+                sizes, estimates, lower_bound = master.x[:n_master], master.x[n_master:], master.objective
+                if self.best is not None and self.best_upper_bound - lower_bound <= self.settings.tolerance * max(1.0, abs(self.best_upper_bound)):
+                    self.solve_result = 'solved'
+                    break
+                query = sizes if core is None or stalled else np.where(integer, sizes, self.STABILIZATION * sizes + (1 - self.STABILIZATION) * core)
+                results = solve_periods(query)
+                n_cuts = len(self.cuts)
+                if self.evaluate(query, results, master.x):
+                    core = query
+                # Without new cuts, the next subproblems are solved at the master solution
+                stalled = len(self.cuts) == n_cuts
+        self.solution = self.full_solution(*self.best) if self.best is not None else np.full(self.n_columns, np.nan)
+        self.build_report |= {'benders iterations': iteration, 'lower bound': lower_bound, 'upper bound': float(self.best_upper_bound),
+                              'objective': float(self.best_upper_bound) if self.best is not None else None,
+                              'solve seconds': time.perf_counter() - start}
+
+    def solve_statistics(self) -> dict:
+        return super().solve_statistics() | {name: self.build_report.get(name) for name in ('benders iterations', 'lower bound')}
+
+    def evaluate(self, sizes: np.ndarray, results: list, master_solution: np.ndarray | None = None) -> bool:
+        """
+        Adds the cuts given by the solutions of the subproblems for some sizes (only the ones that cut off the master solution, if given),
+        and updates the best solution. Returns True if the sizes are feasible
+        """
+        for subproblem, result in zip(self.subproblems, results):
+            if result.status not in ('solved', 'infeasible'):
+                raise ValueError(f'The subproblem of period {subproblem.period} could not be solved ({result.status})')
+            row, lower = self.cut(subproblem, result, sizes)
+            if master_solution is None or row @ master_solution < lower - 1e-9 * max(1.0, abs(lower)):
+                self.cuts.append((row, lower))
+        master_rows = self.master_matrix @ sizes
+        feasible = (all(result.status == 'solved' for result in results) and
+                    (master_rows >= self.master_row_lower - 1e-6).all() and (master_rows <= self.master_row_upper + 1e-6).all())
+        if feasible:
+            upper_bound = self.master_costs @ sizes + sum(result.objective for result in results)
+            if upper_bound < self.best_upper_bound:
+                self.best_upper_bound, self.best = upper_bound, (sizes, [result.x for result in results])
+        return feasible
+
+    def core_point(self, relaxed: list) -> np.ndarray:
+        # The largest value of each master column in the solutions of the relaxed subproblems (rounded up for integer columns)
+        lower, _, integrality = (bounds[self.master_columns] for bounds in self.column_bounds())
+        core = np.where(np.isfinite(lower), lower, 0.0)
+        for subproblem, result in zip(self.subproblems, relaxed):
+            np.maximum.at(core, subproblem.linking_positions, result.x[len(subproblem.columns):])
+        return np.where(integrality == 1, np.ceil(core - 1e-6), core)
+
+    @contextmanager
+    def period_solver(self):
+        # A function solving all the subproblems for some values of the master columns, in a pool of processes if more than one worker is used
+        if self.settings.workers == 1:
+            yield lambda values: [solve_period(subproblem, values, self.highs_options) for subproblem in self.subproblems]
+            return
+        with ProcessPoolExecutor(self.settings.workers, initializer = set_worker_subproblems, initargs = (self.subproblems, self.highs_options)) as pool:
+            yield lambda values: list(pool.map(solve_worker_period, range(len(self.subproblems)), [values] * len(self.subproblems)))
+
+    def solve_master(self, period_lower_bounds: np.ndarray) -> LinearSolution:
+        # The master problem with the cuts found so far: sizing columns, followed by the estimate of the operating cost of each period
+        from scipy import sparse
+        master_lower, master_upper, integrality = (bounds[self.master_columns] for bounds in self.column_bounds())
+        rows = [sparse.hstack([self.master_matrix, sparse.csr_matrix((len(self.master_rows), self.n_periods))])]
+        row_lower, row_upper = [self.master_row_lower], [self.master_row_upper]
+        if self.cuts:
+            rows.append(sparse.csr_matrix(np.array([cut[0] for cut in self.cuts])))
+            row_lower.append(np.array([cut[1] for cut in self.cuts]))
+            row_upper.append(np.full(len(self.cuts), np.inf))
+        return solve_linear_problem(np.concatenate([self.master_costs, np.ones(self.n_periods)]), sparse.vstack(rows, format = 'csc'),
+                                    np.concatenate(row_lower), np.concatenate(row_upper),
+                                    np.concatenate([master_lower, period_lower_bounds]), np.concatenate([master_upper, np.full(self.n_periods, np.inf)]),
+                                    self.highs_options, np.concatenate([integrality, np.zeros(self.n_periods, dtype = int)]))
+
+    def cut(self, subproblem: Subproblem, result: LinearSolution, sizes: np.ndarray) -> tuple:
+        """
+        The cut given by the solution of a subproblem, as a row of the master problem and its lower bound:
+          - optimality cut: estimate_k >= cost_k + gradient * (sizes - current sizes)
+          - feasibility cut: 0 >= infeasibility_k + gradient * (sizes - current sizes)
+        """
+        n_master = len(self.master_columns)
+        gradient = result.reduced_costs
+        columns = np.append(subproblem.linking_positions, n_master + subproblem.period) if result.status == 'solved' else subproblem.linking_positions
+        coefficients = np.append(-gradient, 1.0) if result.status == 'solved' else -gradient
+        row = np.zeros(n_master + self.n_periods)
+        row[columns] = coefficients
+        return row, result.objective - gradient @ sizes[subproblem.linking_positions]
+
+    def full_solution(self, sizes: np.ndarray, period_solutions: list) -> np.ndarray:
+        # The values of all the columns of the model, with the cost columns calculated from their defining rows
+        solution = np.full(self.n_columns, np.nan)
+        solution[self.master_columns] = sizes
+        for subproblem, values in zip(self.subproblems, period_solutions):
+            solution[subproblem.columns] = values[:len(subproblem.columns)]
+        matrix, pending = self.definition_matrix, dict(self.definitions)
+        while pending:
+            n_pending = len(pending)
+            for column, row in list(pending.items()):
+                start, end = matrix.indptr[row], matrix.indptr[row + 1]
+                others = matrix.indices[start:end] != column
+                terms = solution[matrix.indices[start:end][others]]
+                if not np.isnan(terms).any():
+                    solution[column] = -(matrix.data[start:end][others] @ terms)
+                    del pending[column]
+            if len(pending) == n_pending:
+                raise ValueError(f'The values of the cost columns {sorted(pending)} could not be calculated: their defining rows depend on each other or on columns without value')
+        return solution
+
+
+def group_by_block(block_of: np.ndarray, blocks: np.ndarray) -> tuple[list, np.ndarray]:
+    """
+    Groups the rows (or columns) of the model by block: returns the sorted rows of each of the blocks, and the position of each row
+    within its block. Rows in other blocks (e.g. the defining rows) are left out
+    """
+    order = np.argsort(block_of, kind = 'stable')
+    bounds = np.searchsorted(block_of[order], np.append(blocks, blocks[-1] + 1))
+    groups = [order[bounds[i]:bounds[i + 1]] for i in range(len(blocks))]
+    position = np.zeros(len(block_of), dtype = int)
+    for group in groups:
+        position[group] = np.arange(len(group))
+    return groups, position
+
+
+def solve_period(subproblem: Subproblem, master_values: np.ndarray | None, options: dict) -> LinearSolution:
+    """
+    Solves the subproblem of a period with the linking columns fixed to their values in master_values (or free within their bounds if None).
+    The reduced costs returned are the ones of the linking columns, i.e. the gradient of the cost of the period with respect to them.
+    If the subproblem is infeasible, the sum of the violations of the layer balances is minimized instead, and the result has the infeasible status
+    """
+    from scipy import sparse
+    n_columns, n_linking = len(subproblem.columns), len(subproblem.linking)
+    linking_lower = subproblem.linking_lower if master_values is None else master_values[subproblem.linking_positions]
+    linking_upper = subproblem.linking_upper if master_values is None else master_values[subproblem.linking_positions]
+    lower, upper = np.concatenate([subproblem.lower, linking_lower]), np.concatenate([subproblem.upper, linking_upper])
+    result = solve_linear_problem(np.concatenate([subproblem.costs, np.zeros(n_linking)]), subproblem.matrix,
+                                  subproblem.row_lower, subproblem.row_upper, lower, upper, options)
+    if result.status == 'solved':
+        return LinearSolution('solved', result.objective, result.x, result.reduced_costs[n_columns:])
+    if result.status != 'infeasible' or master_values is None:
+        return LinearSolution(result.status, np.nan, None, None)
+    # The infeasibility is measured as the energy missing or in excess in the layer balances
+    n_balance_rows = len(subproblem.balance_rows)
+    slacks = sparse.csc_matrix((np.ones(n_balance_rows), (subproblem.balance_rows, np.arange(n_balance_rows))), shape = (subproblem.matrix.shape[0], n_balance_rows))
+    n_slacks = 2 * n_balance_rows
+    elastic = solve_linear_problem(np.concatenate([np.zeros(n_columns + n_linking), np.ones(n_slacks)]),
+                                   sparse.hstack([subproblem.matrix, slacks, -slacks], format = 'csc'),
+                                   subproblem.row_lower, subproblem.row_upper,
+                                   np.concatenate([lower, np.zeros(n_slacks)]), np.concatenate([upper, np.full(n_slacks, np.inf)]), options)
+    return LinearSolution('infeasible', elastic.objective, None, elastic.reduced_costs[n_columns:n_columns + n_linking])
+
+
+def solve_linear_problem(costs, matrix, row_lower, row_upper, lower, upper, options: dict, integrality = None) -> LinearSolution:
+    # Solves min costs * x with row_lower <= matrix * x <= row_upper and lower <= x <= upper, with highspy if available, else with scipy
+    integrality = np.zeros(len(costs), dtype = int) if integrality is None else np.asarray(integrality)
+    if importlib.util.find_spec('highspy') is not None:
+        import highspy
+        highs = highspy.Highs()
+        highs.setOptionValue('output_flag', False)
+        for name, value in options.items():
+            highs.setOptionValue(name, value)
+        matrix = matrix.tocsc()
+        highs.passModel(len(costs), matrix.shape[0], matrix.nnz, int(highspy.MatrixFormat.kColwise), int(highspy.ObjSense.kMinimize), 0.0,
+                        costs, lower, upper, row_lower, row_upper, matrix.indptr.astype(np.int32), matrix.indices.astype(np.int32), matrix.data,
+                        integrality.astype(np.int32))
+        highs.run()
+        status = highs.modelStatusToString(highs.getModelStatus())
+        status = NativeProblem.HIGHS_RESULTS.get(status, 'limit' if 'limit' in status.lower() else 'failure')
+        if status != 'solved':
+            return LinearSolution(status, np.nan, None, None)
+        solution = highs.getSolution()
+        return LinearSolution(status, highs.getInfo().objective_function_value, np.array(solution.col_value), np.array(solution.col_dual))
+    from scipy import sparse
+    from scipy.optimize import Bounds, LinearConstraint, linprog, milp
+    options = {name: (value == 'on') if name == 'presolve' else value for name, value in options.items() if name in NativeProblem.MILP_OPTIONS}
+    if integrality.any():
+        result = milp(costs, integrality = integrality, bounds = Bounds(lower, upper), constraints = LinearConstraint(matrix, row_lower, row_upper), options = options)
+        status = NativeProblem.SOLVE_RESULTS.get(result.status, 'failure')
+        return LinearSolution(status, result.fun, result.x, None) if status == 'solved' else LinearSolution(status, np.nan, None, None)
+    # linprog needs the ranged rows as equalities and upper bounds
+    matrix = sparse.csr_matrix(matrix)
+    equal = row_lower == row_upper
+    upper_rows, lower_rows = ~equal & np.isfinite(row_upper), ~equal & np.isfinite(row_lower)
+    result = linprog(costs, A_ub = sparse.vstack([matrix[upper_rows], -matrix[lower_rows]]), b_ub = np.concatenate([row_upper[upper_rows], -row_lower[lower_rows]]),
+                     A_eq = matrix[equal], b_eq = row_lower[equal], bounds = np.column_stack([lower, upper]), method = 'highs',
+                     options = {name: value for name, value in options.items() if name != 'mip_rel_gap'})
+    status = NativeProblem.SOLVE_RESULTS.get(result.status, 'failure')
+    if status != 'solved':
+        return LinearSolution(status, np.nan, None, None)
+    return LinearSolution(status, result.fun, result.x, result.lower.marginals + result.upper.marginals)
+
+
+# Subproblems of the worker processes, sent once when the pool is created
+_worker_subproblems, _worker_options = [], {}
+
+
+def set_worker_subproblems(subproblems: list, options: dict):
+    global _worker_subproblems, _worker_options
+    _worker_subproblems, _worker_options = subproblems, options
+
+
+def solve_worker_period(period: int, master_values: np.ndarray | None) -> LinearSolution:
+    return solve_period(_worker_subproblems[period], master_values, _worker_options)
@@ -0,0 +1,130 @@
+import hashlib, json, os, pickle
+import numpy as np
+import pandas as pd
+import yaml
+from OptiENEA.classes.timeseries_store import TimeSeriesStore
+
+CACHE_VERSION = 2
+
+
+class InputCache:
+    """
+    On-disk cache of the parsed problem input files.
+    Parsed YAML files are stored as pickles, while the time series data are stored as a binary
+    NumPy array [n_series, n_steps] plus a small JSON file describing columns and index. The binary copy
+    can be memory-mapped, so that large time series are never fully loaded in memory.
+    Entries are addressed by the hash of the content of the input file, and a manifest keeps track
+    of the size and modification time of each input file, so that unchanged files are not even re-hashed.
+    When an input file changes, its cache entry is automatically replaced
+    """
+    folder: str
+    manifest: dict
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.manifest_path = os.path.join(self.folder, 'manifest.json')
+        self.manifest = {}
+        if os.path.isfile(self.manifest_path):
+            try:
+                with open(self.manifest_path, 'r') as stream:
+                    self.manifest = json.load(stream)
+            except (OSError, ValueError):
+                self.manifest = {}
+        if self.manifest.get('version') != CACHE_VERSION:
+            self.manifest = {'version': CACHE_VERSION, 'files': {}}
+
+    def file_hash(self, path: str) -> str:
+        """
+        Returns the hash of the content of the file. The hash is re-computed only if the
+        size or the modification time of the file changed since the last time it was read
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        entry = self.manifest['files'].get(path)
+        if entry and entry['mtime'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+            return entry['hash']
+        digest = hashlib.sha256()
+        with open(path, 'rb') as stream:
+            for block in iter(lambda: stream.read(1 << 20), b''):
+                digest.update(block)
+        file_hash = digest.hexdigest()
+        self.manifest['files'][path] = {'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'hash': file_hash}
+        if entry and entry['hash'] != file_hash:
+            self.remove_entry(entry['hash'])
+        self.save_manifest()
+        return file_hash
+
+    def load_yaml(self, path: str) -> dict:
+        # Returns the content of a YAML file, parsing it only if it is not already in the cache
+        entry_path = os.path.join(self.folder, f'{self.file_hash(path)}.pkl')
+        if os.path.isfile(entry_path):
+            try:
+                with open(entry_path, 'rb') as stream:
+                    return pickle.load(stream)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                pass
+        with open(path, 'r') as stream:
+            data = yaml.safe_load(stream)
+        self.write_atomic(entry_path, lambda stream: pickle.dump(data, stream, protocol = pickle.HIGHEST_PROTOCOL))
+        return data
+
+    def load_timeseries_store(self, path: str, dtype = np.float64, chunk_size: int = 100_000, memory_map: bool = False) -> TimeSeriesStore:
+        """
+        Returns the time series data in the csv file as a TimeSeriesStore, parsing the file only if it is not already in the cache
+        :param: dtype        The data type of the values. Each data type has its own cache entry
+        :param: chunk_size   Number of rows parsed at once when reading the csv file
+        :param: memory_map   If True, the store reads the data from a memory map of the cached binary file
+        """
+        file_hash = self.file_hash(path)
+        dtype = np.dtype(dtype)
+        values_path = os.path.join(self.folder, f'{file_hash}_{dtype.name}.npy')
+        meta_path = os.path.join(self.folder, f'{file_hash}.json')
+        if os.path.isfile(values_path) and os.path.isfile(meta_path):
+            try:
+                return InputCache.timeseries_from_entry(values_path, meta_path, path, memory_map)
+            except (OSError, ValueError, KeyError):
+                pass
+        store = TimeSeriesStore.from_csv(path, dtype = dtype, chunk_size = chunk_size)
+        meta = {
+            'keys': [[list(key), row] for key, row in store.keys.items()],
+            'column_names': store.column_names,
+            'index': store.index.tolist(),
+            'index_name': store.index.name}
+        self.write_atomic(values_path, lambda stream: np.save(stream, store.data))
+        self.write_atomic(meta_path, lambda stream: stream.write(json.dumps(meta).encode('utf-8')))
+        if memory_map:
+            return InputCache.timeseries_from_entry(values_path, meta_path, path, memory_map)
+        return store
+
+    @staticmethod
+    def timeseries_from_entry(values_path: str, meta_path: str, source: str, memory_map: bool = False) -> TimeSeriesStore:
+        with open(meta_path, 'r') as stream:
+            meta = json.load(stream)
+        values = np.load(values_path, mmap_mode = 'r' if memory_map else None)
+        index = pd.Index(meta['index'], name = meta['index_name'])
+        if index.equals(pd.RangeIndex(len(index))):
+            index = pd.RangeIndex(len(index), name = meta['index_name'])
+        keys = {tuple(key): row for key, row in meta['keys']}
+        return TimeSeriesStore(values, keys, source, index, meta['column_names'])
+
+    def remove_entry(self, file_hash: str):
+        # Removes all cached files related to a given content hash, unless another input file still uses it
+        if any(entry['hash'] == file_hash for entry in self.manifest['files'].values()):
+            return
+        for filename in os.listdir(self.folder):
+            if filename.startswith(file_hash):
+                try:
+                    os.remove(os.path.join(self.folder, filename))
+                except FileNotFoundError:
+                    pass
+
+    def save_manifest(self):
+        self.write_atomic(self.manifest_path, lambda stream: stream.write(json.dumps(self.manifest).encode('utf-8')))
+
+    def write_atomic(self, path: str, writer):
+        # Writes to a temporary file first, so that an interrupted run never leaves a corrupted cache entry
+        os.makedirs(self.folder, exist_ok = True)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as stream:
+            writer(stream)
+        os.replace(temp_path, path)
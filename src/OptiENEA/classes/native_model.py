@@ -0,0 +1,570 @@
+"""
+Native backend of OptiENEA: the model described in ampl_model is assembled directly as a sparse matrix from the sets and
+parameters of the problem, and solved in-process with HiGHS (through scipy.optimize.milp), without AMPL.
+Constraints are assembled block by block, each block covering all the time steps of a unit and layer at once.
+Additional constraints and custom objectives are written in AMPL, so they are only supported by the AMPL interpreter
+"""
+from dataclasses import dataclass, field
+import importlib.util, time, warnings
+import numpy as np
+import pandas as pd
+from OptiENEA.classes.ampl_model import ModelFeatures
+from OptiENEA.classes.warm_start import WarmStart
+
+
+@dataclass
+class VariableBlock:
+    """
+    The columns of one variable of the model:
+      - keys: the index of the variable without the time dimension (an empty tuple for scalar variables)
+      - timed: if True, each key has one column per time step, and the columns of each key are contiguous
+    """
+    name: str
+    offset: int
+    keys: list
+    timed: bool = False
+    lower: np.ndarray = None
+    upper: np.ndarray = None
+    integer: bool = False
+    positions: dict = field(init = False)
+
+    def __post_init__(self):
+        self.positions = {key: position for position, key in enumerate(self.keys)}
+
+    def set_bounds(self, key, n_time_steps: int, lower = None, upper = None):
+        # Tightens the bounds of the columns of a key (bounds are only made tighter, as when several constraints apply)
+        columns = self.columns(key, n_time_steps) - self.offset
+        if lower is not None:
+            self.lower[columns] = np.maximum(self.lower[columns], lower)
+        if upper is not None:
+            self.upper[columns] = np.minimum(self.upper[columns], upper)
+
+    def columns(self, key, n_time_steps: int):
+        # The column of a key (or the columns of a key at all time steps, for timed variables)
+        start = self.offset + self.positions[key] * (n_time_steps if self.timed else 1)
+        return np.arange(start, start + n_time_steps) if self.timed else start
+
+
+class NativeVariable:
+    """
+    The values of a variable of a solved NativeProblem, with the interface of the amplpy variables used by OptimizationOutput
+    """
+    def __init__(self, name: str, index: pd.Index | None, values: np.ndarray):
+        self.name = name
+        self.index = index
+        self.values = values
+
+    def value(self) -> float:
+        return float(self.values[0])
+
+    def __getitem__(self, key) -> 'NativeVariable':
+        # The value of the variable for one index, e.g. size['PV'] or ics['PV', 10]
+        return NativeVariable(self.name, None, self.values[[self.index.get_loc(key)]])
+
+    def get_values(self) -> 'NativeVariable':
+        return self
+
+    def to_pandas(self) -> pd.DataFrame:
+        return pd.DataFrame({f'{self.name}.val': self.values}, index = self.index)
+
+
+class NativeProblem:
+    """
+    The optimization problem of a Problem, built as a sparse matrix (one column per variable, one row per constraint)
+    and solved with HiGHS. It exposes the same methods as AmplProblem used by Problem and OptimizationOutput
+    (solve, solve_result, get_variable, wait_for_export)
+    """
+    SOLVE_RESULTS = {0: 'solved', 1: 'limit', 2: 'infeasible', 3: 'unbounded'}  # scipy.optimize.milp status
+    HIGHS_RESULTS = {'Optimal': 'solved', 'Infeasible': 'infeasible', 'Unbounded': 'unbounded', 'Primal infeasible or unbounded': 'infeasible'}
+    # Names of the SolverOptions in HiGHS, and the ones also supported by scipy.optimize.milp
+    HIGHS_NAMES = {'threads': 'threads', 'mip_gap': 'mip_rel_gap', 'mip_gap_abs': 'mip_abs_gap', 'time_limit': 'time_limit',
+                   'presolve': 'presolve', 'algorithm': 'solver', 'parallel': 'parallel'}
+    MILP_OPTIONS = ('time_limit', 'presolve', 'mip_rel_gap')
+    OBJECTIVES = ('TOTEX', 'CAPEX', 'OPEX')
+    SOLVE_STATISTICS = ('presolved variables', 'presolved constraints', 'presolved binaries', 'objective', 'mip gap',
+                        'simplex iterations', 'ipm iterations', 'mip nodes')
+
+    def __init__(self, problem):
+        self.problem = problem
+        self.features = ModelFeatures.from_problem(problem)
+        self.temp_folder = None
+        self.solve_result = None
+        self.solution = None
+        self.variables = {}
+        self.highs_options = {}
+        self.warm_start = None
+        self.basis = None  # Simplex basis of the last solve (LPs solved with highspy only)
+        self.build_report = {}  # Size of the model and time needed to build and solve it
+        self.n_columns, self.n_rows = 0, 0
+        self.rows, self.columns, self.coefficients = [], [], []
+        self.definitions = {}  # Row defining the value of each cost column (e.g. OPEX = sum of the operating costs), by column
+        self.balance_rows = []  # Rows of the layer balances
+        self.row_lower_bounds, self.row_upper_bounds = [], []
+
+    @classmethod
+    def check_supported(cls, objective: str, additional_constraints_data: dict):
+        # Raises an error for the problems the native interpreter cannot build. Checked when the settings are read, and again when the model is built
+        if objective not in cls.OBJECTIVES:
+            raise ValueError(f'The native interpreter only supports the TOTEX, CAPEX and OPEX objectives. Use the AMPL interpreter for the {objective} objective')
+        if additional_constraints_data:
+            raise ValueError('The native interpreter does not support additional constraints. Use the AMPL interpreter instead')
+
+    def build(self):
+        """
+        Builds the constraint matrix, the bounds and the objective of the problem
+        """
+        self.check_supported(self.problem.objective.name, self.problem.additional_constraints_data)
+        start = time.perf_counter()
+        self.read_time_dimension()
+        self.read_units()
+        self.add_variables()
+        self.add_constraints()
+        self.objective = np.zeros(self.n_columns)
+        self.objective[self.variables[self.problem.objective.name].columns((), self.n_time_steps)] = 1.0
+        # The blocks of nonzeros are released once they are assembled
+        entries = [np.concatenate(blocks) for blocks in (self.rows, self.columns, self.coefficients)]
+        self.rows, self.columns, self.coefficients = [], [], []
+        self.build_report = {'variables': self.n_columns, 'constraints': self.n_rows, 'nonzeros': self.assemble(*entries),
+                             'build seconds': time.perf_counter() - start}
+
+    def assemble(self, rows: np.ndarray, columns: np.ndarray, coefficients: np.ndarray) -> int:
+        # Builds the constraint matrix from its nonzeros, and returns their number
+        from scipy import sparse  # Imported here, so that scipy is only loaded if the native interpreter is used
+        self.matrix = sparse.csr_matrix((coefficients, (rows, columns)), shape = (self.n_rows, self.n_columns))
+        return self.matrix.nnz
+
+    def set_solver_options(self, solver: str, options) -> dict:
+        """
+        Translates the solver options (a SolverOptions) to HiGHS options, and returns the effective settings.
+        The "extra" options are read as HiGHS options (e.g. "mip_max_nodes=1000 simplex_strategy=4").
+        Without highspy, the problem is solved by scipy.optimize.milp, which only supports some of the options: the others are ignored
+        """
+        if str(solver).lower() != 'highs':
+            raise ValueError(f'The native interpreter only supports the HiGHS solver. {solver} was provided')
+        self.highs_options = {}
+        for name, value in options.to_dict().items():
+            if name == 'extra':
+                for option in value.split():
+                    option_name, _, option_value = option.partition('=')
+                    self.highs_options[option_name] = parse_option_value(option_value)
+            else:
+                self.highs_options[self.HIGHS_NAMES[name]] = ('on' if value else 'off') if isinstance(value, bool) else value
+        if importlib.util.find_spec('highspy') is None:
+            ignored = [name for name in self.highs_options if name not in self.MILP_OPTIONS]
+            if ignored:
+                warnings.warn(f'The solver options {", ".join(ignored)} need highspy, and are ignored. Install highspy to use them')
+            self.highs_options = {name: value for name, value in self.highs_options.items() if name in self.MILP_OPTIONS}
+        return dict(self.highs_options)
+
+    def solve(self, solver: str = 'highs'):
+        if str(solver).lower() != 'highs':
+            raise ValueError(f'The native interpreter only supports the HiGHS solver. {solver} was provided')
+        start = time.perf_counter()
+        if importlib.util.find_spec('highspy') is not None:
+            self.solve_with_highspy()
+        else:
+            self.solve_with_scipy()
+        self.build_report['solve seconds'] = time.perf_counter() - start
+
+    def column_bounds(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Lower bounds, upper bounds and integrality (1 for integer columns) of all the columns
+        blocks = self.variables.values()
+        return (np.concatenate([block.lower for block in blocks]), np.concatenate([block.upper for block in blocks]),
+                np.concatenate([np.full(len(block.lower), int(block.integer)) for block in blocks]))
+
+    def solve_with_highspy(self):
+        import highspy
+        highs = highspy.Highs()
+        highs.setOptionValue('output_flag', False)
+        for name, value in self.highs_options.items():
+            highs.setOptionValue(name, value)
+        lower, upper, integrality = self.column_bounds()
+        matrix = self.matrix.tocsc()
+        highs.passModel(self.n_columns, self.n_rows, matrix.nnz, int(highspy.MatrixFormat.kColwise), int(highspy.ObjSense.kMinimize), 0.0,
+                        self.objective, lower, upper, np.concatenate(self.row_lower_bounds), np.concatenate(self.row_upper_bounds),
+                        matrix.indptr.astype(np.int32), matrix.indices.astype(np.int32), matrix.data, integrality.astype(np.int32))
+        if self.warm_start is not None:
+            self.apply_warm_start(highs, is_mip = bool(integrality.any()))
+        if self.highs_options.get('presolve') != 'off' and self.build_report.get('warm start') != 'basis':
+            # The size of the presolved model is only available when the presolve is run separately (it is not repeated by run)
+            highs.presolve()
+            presolved = highs.getPresolvedLp()
+            self.build_report |= {'presolved variables': presolved.num_col_, 'presolved constraints': presolved.num_row_,
+                                  'presolved binaries': sum(value != highspy.HighsVarType.kContinuous for value in presolved.integrality_)}
+        highs.run()
+        status = highs.modelStatusToString(highs.getModelStatus())
+        self.solve_result = self.HIGHS_RESULTS.get(status, 'limit' if 'limit' in status.lower() else 'failure')
+        info = highs.getInfo()
+        has_solution = info.primal_solution_status == 2  # Feasible solution, also when a limit is reached
+        self.solution = np.array(highs.getSolution().col_value) if has_solution else np.full(self.n_columns, np.nan)
+        # HiGHS reports -1 for the counts of the algorithms that were not used
+        self.build_report |= {'objective': info.objective_function_value if has_solution else None,
+                              'mip gap': info.mip_gap if integrality.any() else None,
+                              'simplex iterations': max(info.simplex_iteration_count, 0), 'ipm iterations': max(info.ipm_iteration_count, 0),
+                              'mip nodes': info.mip_node_count if integrality.any() else None}
+        basis = highs.getBasis()
+        self.basis = (list(basis.col_status), list(basis.row_status)) if basis.valid and not integrality.any() else None
+
+    def apply_warm_start(self, highs, is_mip: bool):
+        """
+        Seeds HiGHS with the warm start: LPs start from the basis of the previous problem, if it has the same size,
+        MIPs start from the values of the previous solution (used by HiGHS as first incumbent if they are feasible)
+        """
+        import highspy
+        col_status, row_status = self.warm_start.basis or ([], [])
+        if not is_mip and len(col_status) == self.n_columns and len(row_status) == self.n_rows:
+            basis = highspy.HighsBasis()
+            basis.col_status, basis.row_status, basis.valid = col_status, row_status, True
+            highs.setBasis(basis)
+            self.build_report['warm start'] = 'basis'
+        elif is_mip:
+            columns, values = self.warm_start_solution()
+            highs.setSolution(len(columns), columns, values)
+            self.build_report['warm start'] = 'solution'
+
+    def solve_with_scipy(self):
+        from scipy.optimize import Bounds, LinearConstraint, milp
+        if self.warm_start is not None:
+            warnings.warn('Warm starts need highspy, and are ignored. Install highspy to use them')
+        lower, upper, integrality = self.column_bounds()
+        options = {name: (value == 'on') if name == 'presolve' else value for name, value in self.highs_options.items()}
+        result = milp(self.objective, integrality = integrality, bounds = Bounds(lower, upper),
+                      constraints = LinearConstraint(self.matrix, np.concatenate(self.row_lower_bounds), np.concatenate(self.row_upper_bounds)),
+                      options = options)
+        self.solve_result = self.SOLVE_RESULTS.get(result.status, 'failure')
+        self.solution = result.x if result.x is not None else np.full(self.n_columns, np.nan)
+        self.build_report |= {'objective': result.fun, 'mip gap': getattr(result, 'mip_gap', None) if integrality.any() else None,
+                              'mip nodes': getattr(result, 'mip_node_count', None) if integrality.any() else None}
+
+    def wait_for_export(self):
+        # No model or data files are written by the native interpreter
+        pass
+
+    def solve_statistics(self) -> dict:
+        # Size of the model and statistics of the last solve (see RunTelemetry)
+        integrality = self.column_bounds()[2]
+        return {'variables': self.n_columns, 'constraints': self.n_rows, 'binaries': int(integrality.sum())} | {
+            name: self.build_report.get(name) for name in self.SOLVE_STATISTICS}
+
+    def get_variable(self, name: str) -> NativeVariable:
+        block = self.variables[name]
+        n_values = len(block.keys) * (self.n_time_steps if block.timed else 1)
+        return NativeVariable(name, self.variable_index(block), self.solution[block.offset:block.offset + n_values])
+
+    def get_variable_values(self, names: list) -> dict:
+        # The values of several variables, by name, as Series indexed like the variables (see AmplProblem.get_variable_values)
+        return {name: pd.Series(self.get_variable(name).values, index = self.variable_index(self.variables[name]), name = name) for name in names}
+
+    def variable_index(self, block: VariableBlock) -> pd.Index | None:
+        # The index of the values of a variable, in the order of its columns (None for scalar variables)
+        if block.keys == [()]:
+            return None
+        if not block.keys:
+            return pd.Index([])
+        keys = pd.MultiIndex.from_tuples(block.keys) if isinstance(block.keys[0], tuple) else pd.Index(block.keys)
+        if not block.timed:
+            return keys
+        key_levels = [keys.get_level_values(level) for level in range(keys.nlevels)]
+        time_levels = [self.time_index.get_level_values(level) for level in range(self.time_index.nlevels)]
+        return pd.MultiIndex.from_arrays([np.repeat(level, self.n_time_steps) for level in key_levels] +
+                                         [np.tile(level, len(keys)) for level in time_levels])
+
+    def get_warm_start(self) -> WarmStart:
+        # The solution (and, for LPs, the simplex basis) to be used as starting point for a similar problem
+        values = {name: self.get_variable(name).to_pandas().iloc[:, 0] for name in WarmStart.VARIABLES if name in self.variables}
+        return WarmStart(values, self.basis)
+
+    def set_warm_start(self, warm_start: WarmStart | None):
+        self.warm_start = warm_start
+
+    def warm_start_solution(self) -> tuple[np.ndarray, np.ndarray]:
+        # The columns that have a value in the warm start, and their values
+        columns, values = [], []
+        for name in self.warm_start.values:
+            if name in self.variables:
+                block = self.variables[name]
+                matched = self.warm_start.values[name].reindex(self.variable_index(block))
+                positions = np.flatnonzero(matched.notna().to_numpy())
+                columns.append(block.offset + positions)
+                values.append(matched.to_numpy(dtype = float)[positions])
+        if not columns:
+            return np.array([], dtype = np.int32), np.array([])
+        return np.concatenate(columns).astype(np.int32), np.concatenate(values)
+
+    # Data of the problem
+
+    def read_time_dimension(self):
+        """
+        Sets the time steps of the model (in the order of the columns of the timed variables), with their duration,
+        the occurrance of their period, and their position within the period
+        """
+        sets, parameters = self.problem.sets, self.problem.parameters
+        if self.features.has_typical_periods:
+            periods = sorted(sets['typicalPeriods'].content)
+            steps = [np.array(sorted(sets['timeStepsOfPeriod'].content[tp])) for tp in periods]
+            self.time_index = pd.MultiIndex.from_arrays([np.repeat(periods, [len(s) for s in steps]), np.concatenate(steps)])
+            self.period_of_step = np.repeat(np.arange(len(periods)), [len(s) for s in steps])
+            self.periods, self.n_periods = periods, len(periods)
+            occurrance = parameters['OCCURRANCE'].content['OCCURRANCE'].reindex(periods).to_numpy(dtype = float)
+            self.occurrance = occurrance[self.period_of_step]
+        else:
+            self.time_index = pd.Index(sorted(sets['timeSteps'].content))
+            self.period_of_step = np.zeros(len(self.time_index), dtype = int)
+            self.n_periods = 1
+            self.occurrance = np.full(len(self.time_index), float(parameters['OCCURRANCE'].content))
+        self.n_time_steps = len(self.time_index)
+        step = self.time_index.get_level_values(-1).to_numpy()
+        self.first_steps = step == 0
+        self.last_steps = np.append(self.period_of_step[1:] != self.period_of_step[:-1], True)
+        duration = parameters['TIME_STEP_DURATION'].content
+        if isinstance(duration, pd.Series):
+            self.duration = duration.set_axis(duration.index.to_flat_index()).reindex(self.time_index.to_flat_index()).to_numpy(dtype = float)
+        else:
+            self.duration = np.full(self.n_time_steps, float(duration))
+
+    def read_units(self):
+        # The sets of units of the model (see ampl_model.model_sets)
+        sets = self.problem.sets
+        self.processes = sorted(sets['processes'].content)
+        self.markets = sorted(sets['markets'].content)
+        self.standard_utilities = sorted(sets['standardUtilities'].content)
+        self.storage_units = sorted(sets['storageUnits'].content) if self.features.has_storage else []
+        self.utilities = sorted(set(self.standard_utilities) | set(self.markets) | set(self.storage_units))
+        self.units = sorted(set(self.utilities) | set(self.processes))
+        self.nonmarket_utilities = sorted(set(self.utilities) - set(self.markets))
+        self.layers_of_unit = {u: sorted(sets['layersOfUnit'].content[u]) for u in self.units}
+        self.main_layer_of_unit = {u: sorted(sets['mainLayerOfUnit'].content.get(u, [])) for u in self.units}
+
+    def values(self, name: str, default: float = 0.0) -> dict:
+        # Values of an indexed parameter that does not depend on time, by index
+        content = self.problem.parameters[name].content
+        values = {} if content.empty else content[name].to_dict()
+        return DefaultValues(values, default)
+
+    def time_profiles(self, name: str) -> dict:
+        # Values of a time-dependent parameter, as one array over the time steps of the model for each (unit, layer)
+        content = self.problem.parameters[name].content
+        if content.empty:
+            return {}
+        series = content[name]
+        time_index = self.time_index.to_flat_index()
+        profiles = {}
+        for key, group in series.groupby(level = [0, 1], sort = False):
+            values = group.droplevel([0, 1])
+            profiles[key] = values.set_axis(values.index.to_flat_index()).reindex(time_index).to_numpy(dtype = float)
+        return profiles
+
+    # Assembly of the model
+
+    def add_variable(self, name: str, keys: list, timed: bool = False, lower = -np.inf, upper = np.inf, integer: bool = False):
+        # Adds the columns of a variable. The bounds are scalars, or arrays with one value per column
+        n_columns = len(keys) * (self.n_time_steps if timed else 1)
+        block = VariableBlock(name, self.n_columns, list(keys), timed,
+                              lower = np.broadcast_to(np.asarray(lower, dtype = float), (n_columns,)).copy(),
+                              upper = np.broadcast_to(np.asarray(upper, dtype = float), (n_columns,)).copy(),
+                              integer = integer)
+        self.variables[name] = block
+        self.n_columns += n_columns
+        return block
+
+    def add_rows(self, n_rows: int, lower = -np.inf, upper = np.inf) -> np.ndarray:
+        # Adds constraint rows with the given bounds, and returns their positions
+        self.row_lower_bounds.append(np.broadcast_to(np.asarray(lower, dtype = float), (n_rows,)).copy())
+        self.row_upper_bounds.append(np.broadcast_to(np.asarray(upper, dtype = float), (n_rows,)).copy())
+        rows = np.arange(self.n_rows, self.n_rows + n_rows)
+        self.n_rows += n_rows
+        return rows
+
+    def add_terms(self, rows, columns, coefficients = 1.0):
+        # Adds the coefficients of some columns to some rows. Scalars are broadcast to the shape of the arrays
+        rows, columns, coefficients = np.broadcast_arrays(np.asarray(rows), np.asarray(columns), np.asarray(coefficients, dtype = float))
+        self.rows.append(rows.ravel())
+        self.columns.append(columns.ravel())
+        self.coefficients.append(coefficients.ravel())
+
+    def add_definition(self, columns, rows):
+        # Records the rows that define the value of some columns, with coefficient 1 (used to eliminate them, see BendersProblem)
+        self.definitions.update(zip(np.atleast_1d(columns).tolist(), np.atleast_1d(rows).tolist()))
+
+    def timed_keys(self, units: list) -> list:
+        return [(u, l) for u in units for l in self.layers_of_unit[u]]
+
+    def add_variables(self):
+        features, nt = self.features, self.n_time_steps
+        # Power of the units: processes are fixed to their power profile, markets to their limits
+        power = self.add_variable('power', self.timed_keys(self.units), timed = True)
+        process_power = self.time_profiles('POWER')
+        for p in self.processes:
+            for l in self.layers_of_unit[p]:
+                profile = -process_power.get((p, l), np.zeros(nt))
+                power.set_bounds((p, l), nt, profile, profile)
+        power_max, power_max_rel = self.values('POWER_MAX'), self.time_profiles('POWER_MAX_REL')
+        for u in self.markets:
+            for l in self.layers_of_unit[u]:
+                limit = power_max[u, l] * power_max_rel.get((u, l), np.ones(nt))
+                if power_max[u, l] >= 0:
+                    power.set_bounds((u, l), nt, 0.0, limit)
+                if power_max[u, l] <= 0:
+                    power.set_bounds((u, l), nt, limit, 0.0)
+        self.add_variable('layer_operating_cost', self.timed_keys(self.markets))
+        self.add_variable('ics', self.nonmarket_utilities, timed = True, lower = 0.0, upper = 1.0)
+        self.add_variable('OPEX', [()])
+        if features.has_storage:
+            self.add_variable('energyStorageLevel', self.timed_keys(self.storage_units), timed = True, lower = 0.0)
+            periods = self.periods if features.has_typical_periods else [()]
+            self.add_variable('energyStorageLevel0', [key + ((tp,) if features.has_typical_periods else ()) for key in self.timed_keys(self.storage_units)
+                                                      for tp in periods], lower = 0.0)
+            # Charging and discharging utilities only charge and discharge their storage unit
+            for u in self.storage_units:
+                for l in self.layers_of_unit[u]:
+                    for ch in self.problem.sets['chargingUtilitiesOfStorageUnit'].content.get(u, []):
+                        power.set_bounds((ch, l), nt, lower = 0.0)
+                    for dis in self.problem.sets['dischargingUtilitiesOfStorageUnit'].content.get(u, []):
+                        power.set_bounds((dis, l), nt, upper = 0.0)
+        if features.has_capex:
+            self.add_variable('unitAnnualizedInvestmentCost', self.nonmarket_utilities, lower = 0.0)
+            power_min, energy_max = self.values('POWER_MIN'), self.values('ENERGY_MAX')
+            size_lower = [power_min[u] if features.has_minimum_installed_power else 0.0 for u in self.nonmarket_utilities]
+            size_upper = [energy_max[u] if u in self.storage_units else np.inf for u in self.nonmarket_utilities]
+            self.add_variable('size', self.nonmarket_utilities, lower = np.maximum(size_lower, 0.0), upper = size_upper)
+            self.add_variable('CAPEX', [()])
+            self.add_variable('TOTEX', [()])
+        if features.has_units_with_minimum_size_if_installed:
+            self.add_variable('ips', sorted(self.problem.sets['unitsWithMinimumSizeIfInstalled'].content), lower = 0.0, upper = 1.0, integer = True)
+        if features.has_units_operated_only_on_off:
+            self.add_variable('ips_t', sorted(self.problem.sets['unitsOnOff'].content), timed = True, lower = 0.0, upper = 1.0, integer = True)
+
+    def add_constraints(self):
+        features, nt, v = self.features, self.n_time_steps, self.variables
+        power, ics = v['power'], v['ics']
+        # calculate_opex
+        row = self.add_rows(1, 0.0, 0.0)
+        self.add_terms(row, v['OPEX'].columns((), nt))
+        self.add_definition(v['OPEX'].columns((), nt), row)
+        self.add_terms(row, [v['layer_operating_cost'].columns(key, nt) for key in v['layer_operating_cost'].keys], -1.0)
+        if features.has_units_eligible_for_tax_deduction:
+            parameters, specific_investment_cost = self.problem.parameters, self.values('SPECIFIC_INVESTMENT_COST')
+            tax_deduction = float(parameters['TAX_DEDUCTION'].content) / float(parameters['YEARS_FOR_TAX_DEDUCTION'].content)
+            for u in sorted(self.problem.sets['unitsEligibleForTaxDeduction'].content):
+                self.add_terms(row, v['size'].columns(u, nt), specific_investment_cost[u] * tax_deduction)
+        # layer_balance
+        for l in sorted(self.problem.sets['layers'].content):
+            rows = self.add_rows(nt, 0.0, 0.0)
+            self.balance_rows.append(rows)
+            for u in self.units:
+                if l in self.layers_of_unit[u]:
+                    self.add_terms(rows, power.columns((u, l), nt))
+        power_max, power_max_rel = self.values('POWER_MAX'), self.time_profiles('POWER_MAX_REL')
+        if features.has_capex:
+            size = v['size']
+            # component_sizing
+            for u in self.standard_utilities:
+                for l in self.main_layer_of_unit[u]:
+                    rows = self.add_rows(nt, lower = 0.0)
+                    self.add_terms(rows, size.columns(u, nt))
+                    self.add_terms(rows, ics.columns(u, nt), -abs(power_max[u, l]))
+            # calculate_capex, calculate_investment_cost and calculate_totex
+            row = self.add_rows(1, 0.0, 0.0)
+            self.add_terms(row, v['CAPEX'].columns((), nt))
+            self.add_definition(v['CAPEX'].columns((), nt), row)
+            self.add_terms(row, v['unitAnnualizedInvestmentCost'].offset + np.arange(len(self.nonmarket_utilities)), -1.0)
+            specific_investment_cost_annualized = self.values('SPECIFIC_INVESTMENT_COST_ANNUALIZED')
+            rows = self.add_rows(len(self.nonmarket_utilities), 0.0, 0.0)
+            self.add_terms(rows, v['unitAnnualizedInvestmentCost'].offset + np.arange(len(rows)))
+            self.add_definition(v['unitAnnualizedInvestmentCost'].offset + np.arange(len(rows)), rows)
+            self.add_terms(rows, size.offset + np.arange(len(rows)), [-specific_investment_cost_annualized[u] for u in self.nonmarket_utilities])
+            row = self.add_rows(1, 0.0, 0.0)
+            self.add_terms(row, [v['TOTEX'].columns((), nt), v['CAPEX'].columns((), nt), v['OPEX'].columns((), nt)], [1.0, -1.0, -1.0])
+            self.add_definition(v['TOTEX'].columns((), nt), row)
+        # calculate_operating_cost_time_dependent
+        energy_average_price, energy_price_variation = self.values('ENERGY_AVERAGE_PRICE'), self.time_profiles('ENERGY_PRICE_VARIATION')
+        for u in self.markets:
+            for l in self.layers_of_unit[u]:
+                row = self.add_rows(1, 0.0, 0.0)
+                self.add_terms(row, v['layer_operating_cost'].columns((u, l), nt))
+                self.add_definition(v['layer_operating_cost'].columns((u, l), nt), row)
+                self.add_terms(row, power.columns((u, l), nt),
+                               -energy_average_price[u, l] * energy_price_variation.get((u, l), np.ones(nt)) * self.duration * self.occurrance)
+        # component_load
+        for u in self.standard_utilities:
+            for l in self.layers_of_unit[u]:
+                rows = self.add_rows(nt, 0.0, 0.0)
+                self.add_terms(rows, power.columns((u, l), nt))
+                self.add_terms(rows, ics.columns(u, nt), -power_max[u, l] * power_max_rel.get((u, l), np.ones(nt)))
+        if features.has_units_with_minimum_size_if_installed:
+            # component_sizing_with_minimum_size_if_installed and constraint_on_ips
+            size_min_if_installed = self.values('SIZE_MIN_IF_INSTALLED')
+            for u in v['ips'].keys:
+                for l in self.main_layer_of_unit[u]:
+                    row = self.add_rows(1, lower = 0.0)
+                    self.add_terms(row, [v['size'].columns(u, nt), v['ips'].columns(u, nt)], [1.0, -size_min_if_installed[u]])
+                rows = self.add_rows(nt, upper = 0.0)
+                self.add_terms(rows, ics.columns(u, nt))
+                self.add_terms(rows, v['ips'].columns(u, nt), -1.0)
+        if features.has_units_operated_only_on_off:
+            # component_load_onoff
+            for u in v['ips_t'].keys:
+                rows = self.add_rows(nt, 0.0, 0.0)
+                self.add_terms(rows, ics.columns(u, nt))
+                self.add_terms(rows, v['ips_t'].columns(u, nt), -1.0)
+        if features.has_storage:
+            self.add_storage_constraints()
+
+    def add_storage_constraints(self):
+        nt, v, sets = self.n_time_steps, self.variables, self.problem.sets
+        power, level, level0, size = v['power'], v['energyStorageLevel'], v['energyStorageLevel0'], v['size']
+        storage_losses, energy_max, crate, erate = self.values('STORAGE_LOSSES'), self.values('ENERGY_MAX'), self.values('CRATE', 1.0), self.values('ERATE', 1.0)
+        error_margin_on_cyclic_soc = 0.1
+        first, last = np.flatnonzero(self.first_steps), np.flatnonzero(self.last_steps)
+        for u in self.storage_units:
+            for l in self.layers_of_unit[u]:
+                level_columns, power_columns = level.columns((u, l), nt), power.columns((u, l), nt)
+                level0_columns = level0.offset + level0.positions[(u, l) + ((self.periods[0],) if self.features.has_typical_periods else ())] + np.arange(self.n_periods)
+                # storage_balance: the level at the first step of each period starts from energyStorageLevel0
+                rows = self.add_rows(nt, 0.0, 0.0)
+                self.add_terms(rows, level_columns)
+                self.add_terms(rows, power_columns, self.duration)
+                others = np.flatnonzero(~self.first_steps)
+                self.add_terms(rows[others], level_columns[others - 1], -1.0)
+                self.add_terms(rows[first], level0_columns[self.period_of_step[first]], -(1 - storage_losses[u]))
+                # storage_cyclic_constraint_high and storage_cyclic_constraint_low
+                for lower, upper in ((0.0, np.inf), (-np.inf, error_margin_on_cyclic_soc * energy_max[u])):
+                    rows = self.add_rows(self.n_periods, lower, upper)
+                    self.add_terms(rows, level_columns[last])
+                    self.add_terms(rows, level0_columns, -1.0)
+                # storage_max_energy, storage_max_ch_power and storage_max_dis_power
+                for columns, coefficient, lower, upper in ((level_columns, -1.0, -np.inf, 0.0),
+                                                           (power_columns, crate[u], 0.0, np.inf),
+                                                           (power_columns, -erate[u], -np.inf, 0.0)):
+                    rows = self.add_rows(nt, lower, upper)
+                    self.add_terms(rows, columns)
+                    self.add_terms(rows, size.columns(u, nt), coefficient)
+                # storage_ch_power_cost and storage_dis_power_cost
+                for ch in sorted(sets['chargingUtilitiesOfStorageUnit'].content.get(u, [])):
+                    rows = self.add_rows(nt, upper = 0.0)
+                    self.add_terms(rows, power.columns((ch, l), nt))
+                    self.add_terms(rows, size.columns(u, nt), -crate[u])
+                for dis in sorted(sets['dischargingUtilitiesOfStorageUnit'].content.get(u, [])):
+                    rows = self.add_rows(nt, lower = 0.0)
+                    self.add_terms(rows, power.columns((dis, l), nt))
+                    self.add_terms(rows, size.columns(u, nt), erate[u])
+
+
+class DefaultValues(dict):
+    # The values of an indexed parameter, with the default value of the AMPL model for missing indices
+    def __init__(self, values: dict, default: float):
+        super().__init__(values)
+        self.default = default
+
+    def __missing__(self, key):
+        return self.default
+
+
+def parse_option_value(text: str):
+    # Options given as text are converted to numbers when possible
+    for option_type in (int, float):
+        try:
+            return option_type(text)
+        except ValueError:
+            pass
+    return text
@@ -1,75 +1,278 @@
 import numpy as np
 import pandas as pd
-from typing import Optional, Sequence, Union
-import os
-from OptiENEA.classes.amplpy import AmplProblem
+from typing import Optional, Sequence, Union, TYPE_CHECKING
+import importlib.util, json, os, warnings
 from OptiENEA.classes.typical_periods import TypicalPeriodSet
+from OptiENEA.classes.time_step_aggregation import TimeStepAggregation
+from OptiENEA.classes.telemetry import to_json_value
+from OptiENEA.helpers.helpers import attempt_to_order_results_files
 from dataclasses import dataclass, field
-from copy import copy
+from functools import cached_property
+if TYPE_CHECKING:
+    from OptiENEA.classes.amplpy import AmplProblem  # amplpy is only imported when a model is built
+
+RESULTS_FORMATS = ('parquet', 'excel', 'both')
+TIMESERIES_TABLES = ('timeseries', 'timeseries_full')  # Tables with (variable, unit, layer) columns
+METADATA_FILENAME = 'metadata.json'
+
 
 @dataclass
 class OptimizationOutput:
-    ampl: AmplProblem
+    """
+    The output of a run. Only the raw values of the output variables (solution) are kept: the tables of results (kpis, units,
+    timeseries_full, timeseries and extra) are built from them when they are first read, and cached until release is called.
+    An output read from the results files (see from_results) has no solution: its tables are read from the files instead
+    """
+    ampl: 'AmplProblem'
     varnames_output: dict
     results_folder: str
     typical_periods: TypicalPeriodSet = None
-    output_kpis: list = field(default_factory=list)
-    output_units: pd.DataFrame = field(default_factory=pd.DataFrame)
-    output_timeseries: pd.DataFrame = field(default_factory=pd.DataFrame)
-    output_extra: dict = field(default_factory=dict)
-    
+    time_step_aggregation: TimeStepAggregation = None
+    solver_settings: dict = field(default_factory=dict)  # Effective solver settings of the run, saved with the results
+    zero_tolerance: float = 1e-6  # Time series whose absolute values are all below the tolerance are not in timeseries
+    solution: dict | None = None  # Values of the output variables, by name, as Series indexed like the variables
+    run_name: str | None = None  # Name of the run whose results files are read, if there is no solution
+
+    VIEWS = ('kpis', 'units', 'model_timeseries', 'timeseries_full', 'timeseries', 'extra')
+
     def generate_output_structures(self):
+        """
+        Fetches the values of the output variables from the interpreter, at once (one call per group of variables with the same indexing).
+        The tables of results are then built from them when they are read
+        """
+        groups = {}
         for var_name, var_info in self.varnames_output.items():
-            if var_info.indexed_over == None:
-                self.output_kpis.append({'KPI': var_name, 'Value': self.ampl.get_variable(var_name).value()})
-            elif 'timeSteps' in var_info.indexed_over:
-                temp = self.ampl.get_variable(var_name).get_values().to_pandas()
-                temp.columns = [x.strip('.val') for x in temp.columns]
-                temp = temp.unstack(level=[0, 1])
-                # output['timeseries'] = temp.combine_first(output['timeseries'])
-                if self.typical_periods is not None:
-                    temp = self.reconstruct_output_ts_data_from_typical_periods(temp)
-                self.output_timeseries = pd.concat([self.output_timeseries, temp], axis = 1)
-            elif 'nonmarketUtilities' in var_info.indexed_over:
-                temp = self.ampl.get_variable(var_name).get_values().to_pandas()
-                temp.columns = [x.strip('.val') for x in temp.columns]
-                self.output_units = temp.combine_first(self.output_units)
-            else:
-                self.output_extra[var_name] = self.ampl.get_variable(var_name).get_values().to_pandas()
-                self.output_extra[var_name].columns = [x.strip('.val') for x in self.output_extra[var_name].columns]
-        self.output_timeseries_full = copy(self.output_timeseries)
-        columns_to_drop = []
-        for column in self.output_timeseries.columns:
-            if (self.output_timeseries[column] == 0).all():
-                columns_to_drop.append(column)
-        self.output_timeseries = self.output_timeseries.drop(columns=columns_to_drop)
-        self.output_kpis = pd.DataFrame(self.output_kpis).set_index('KPI')
+            groups.setdefault(tuple(var_info.indexed_over or ()), []).append(var_name)
+        self.solution = {}
+        for names in groups.values():
+            self.solution |= self.ampl.get_variable_values(names)
+        self.release()
+
+    def release(self):
+        # Frees the memory used by the tables of results. They are built again if they are read afterwards
+        for name in self.VIEWS:
+            self.__dict__.pop(name, None)
+
+    def solution_of(self, kind: str) -> dict:
+        # The values of the output variables of a kind: kpis (scalar variables), timeseries (indexed over the time steps), units or extra
+        kinds = {name: 'kpis' if info.indexed_over is None else 'timeseries' if 'timeSteps' in info.indexed_over else
+                 'units' if 'nonmarketUtilities' in info.indexed_over else 'extra' for name, info in self.varnames_output.items()}
+        return {name: values for name, values in self.solution.items() if kinds.get(name) == kind}
+
+    @cached_property
+    def kpis(self) -> pd.DataFrame:
+        # The values of the scalar output variables, indexed by KPI
+        if self.solution is None:
+            return read_results_table(self.results_folder, self.run_name, 'kpis')
+        values = self.solution_of('kpis')
+        return pd.DataFrame({'Value': [float(series.iloc[0]) for series in values.values()]}, index = pd.Index(list(values), name = 'KPI'))
+
+    @cached_property
+    def units(self) -> pd.DataFrame:
+        # The values of the output variables indexed over the units, with one column per variable
+        if self.solution is None:
+            return read_results_table(self.results_folder, self.run_name, 'units')
+        values = self.solution_of('units')
+        return pd.concat(values, axis = 1, sort = True) if values else pd.DataFrame()
+
+    @cached_property
+    def extra(self) -> dict:
+        # The values of the other output variables, by name
+        if self.solution is None:
+            names = read_results_metadata(self.results_folder, self.run_name).get('extra_tables', [])
+            return {name: read_results_table(self.results_folder, self.run_name, name) for name in names}
+        return {name: series.to_frame(name) for name, series in self.solution_of('extra').items()}
+
+    @cached_property
+    def model_timeseries(self) -> pd.DataFrame:
+        # The time series at the time steps of the model (segments of aggregated time steps, typical periods)
+        values = self.solution_of('timeseries') if self.solution is not None else {}
+        return self.timeseries_frame(values) if values else pd.DataFrame()
+
+    @cached_property
+    def timeseries_full(self) -> pd.DataFrame:
+        # The time series at the original time steps
+        if self.solution is None:
+            return read_results_table(self.results_folder, self.run_name, 'timeseries_full')
+        return self.expand_model_timeseries(self.model_timeseries)
+
+    @cached_property
+    def timeseries(self) -> pd.DataFrame:
+        # The time series at the original time steps, without those that are zero (within zero_tolerance) at all time steps
+        return drop_zero_columns(self.timeseries_full, self.zero_tolerance)
+
+    # Names of the tables of results used before they were built on demand
+    output_kpis = property(lambda self: self.kpis)
+    output_units = property(lambda self: self.units)
+    output_timeseries_full = property(lambda self: self.timeseries_full)
+    output_timeseries = property(lambda self: self.timeseries)
+    output_extra = property(lambda self: self.extra)
+
+    def expand_model_timeseries(self, df: pd.DataFrame) -> pd.DataFrame:
+        # The time series at the time steps of the model (segments of aggregated time steps, typical periods) brought back to the original time steps
+        if df.columns.empty:
+            return df
+        if self.time_step_aggregation is not None:
+            df = self.time_step_aggregation.expand_dataframe(df)
+        if self.typical_periods is not None:
+            df = self.reconstruct_output_ts_data_from_typical_periods(df)
+        return df
+
+    @staticmethod
+    def timeseries_frame(timeseries: dict) -> pd.DataFrame:
+        """
+        Lays out the values of variables indexed over (unit, layer, time step) in a DataFrame with one row per time step
+        and one column per (variable, unit, layer), as unstacking each variable would, but filling a single array.
+        The positions of the values in the array are computed from the integer codes of the index levels, without hashing the index
+        """
+        layouts = {name: (level_groups(series.index, [0, 1]), level_groups(series.index, range(2, series.index.nlevels)))
+                   for name, series in timeseries.items()}
+        time_index = next(iter(layouts.values()))[1][1]  # All the variables are indexed over the same time steps
+        column_keys, offsets = [], {}
+        for name, ((_, keys), _) in layouts.items():
+            offsets[name] = len(column_keys)
+            column_keys.extend((name,) + key for key in keys)
+        array = np.full((len(time_index), len(column_keys)), np.nan)
+        for name, ((key_codes, _), (time_codes, times)) in layouts.items():
+            rows = time_codes if times.equals(time_index) else time_index.get_indexer(times)[time_codes]
+            array[rows, offsets[name] + key_codes] = timeseries[name].to_numpy(dtype = float)
+        return pd.DataFrame(array, index = time_index, columns = pd.MultiIndex.from_tuples(column_keys))
     
+    @classmethod
+    def from_results(cls, results_folder: str, run_name: str) -> 'OptimizationOutput':
+        """
+        The output of a run saved by save_output (in either format), e.g. to export it to Excel afterwards.
+        The output is not linked to an interpreter (ampl is None): its tables are read from the files when they are first read
+        """
+        metadata = read_results_metadata(results_folder, run_name)
+        return cls(None, {}, results_folder, solver_settings = metadata.get('solver_settings', {}),
+                   zero_tolerance = metadata.get('zero_tolerance', cls.zero_tolerance), run_name = run_name)
+
+    def save_output(self, run_name: str, results_format: str = 'parquet'):
+        """
+        Saves the output in the results folder, in the given format:
+          - parquet: one Parquet file per table in the Results_{run_name} folder, with the metadata of the run (see save_output_to_parquet)
+          - excel: the Results_{run_name}.xlsx workbook, with one sheet per table
+          - both
+        Parquet files need the optional pyarrow dependency: without it, the output is saved to Excel
+        """
+        if results_format not in RESULTS_FORMATS:
+            raise ValueError(f'The results format should be one of {", ".join(RESULTS_FORMATS)}. {results_format} was provided')
+        if results_format != 'excel' and importlib.util.find_spec('pyarrow') is None:
+            warnings.warn('Saving the results to Parquet files needs pyarrow, the results are saved to Excel. Install pyarrow to use Parquet')
+            results_format = 'excel'
+        if results_format in ('parquet', 'both'):
+            self.save_output_to_parquet(run_name)
+        if results_format in ('excel', 'both'):
+            self.save_output_to_excel(run_name)
+
+    def save_output_to_parquet(self, run_name: str):
+        """
+        Writes each table of the output to a Parquet file of the Results_{run_name} folder, and the metadata of the run
+        (run name, names of the tables, solver settings) to its metadata.json file.
+        Only the full time series are written: the time series without the zero columns are obtained from them when reading
+        """
+        folder = os.path.join(self.results_folder, f'Results_{run_name}')
+        os.makedirs(folder, exist_ok = True)
+        tables = {'kpis': self.kpis, 'units': self.units, 'timeseries_full': self.timeseries_full} | {
+            name: df for name, df in self.extra.items() if not df.empty}
+        for name, df in tables.items():
+            df.to_parquet(os.path.join(folder, f'{name}.parquet'))
+        metadata = {'run_name': run_name, 'tables': list(tables), 'extra_tables': [name for name in tables if name in self.extra],
+                    'zero_tolerance': self.zero_tolerance, 'solver_settings': self.solver_settings}
+        with open(os.path.join(folder, METADATA_FILENAME), 'w', encoding = 'utf-8') as stream:
+            json.dump(to_json_value(metadata), stream, indent = 2)
+
     def save_output_to_excel(self, run_name):
         # Writing all output to Excel
         with pd.ExcelWriter(os.path.join(self.results_folder, f"Results_{run_name}.xlsx"), engine="xlsxwriter") as writer:
-            self.output_kpis.to_excel(writer, sheet_name='kpis', float_format = "%.3f")
-            self.output_units.to_excel(writer, sheet_name='units', float_format = "%.3f")
-            self.output_timeseries.to_excel(writer, sheet_name='timeseries', float_format = "%.3f")
-            self.output_timeseries_full.to_excel(writer, sheet_name='timeseries_full', float_format = "%.3f")
-            for sheet_name, df in self.output_extra.items():
+            self.kpis.to_excel(writer, sheet_name='kpis', float_format = "%.3f")
+            self.units.to_excel(writer, sheet_name='units', float_format = "%.3f")
+            self.timeseries.to_excel(writer, sheet_name='timeseries', float_format = "%.3f")
+            self.timeseries_full.to_excel(writer, sheet_name='timeseries_full', float_format = "%.3f")
+            if self.solver_settings:
+                pd.Series(self.solver_settings, name = 'Value').rename_axis('Setting').to_frame().to_excel(writer, sheet_name='solver')
+            for sheet_name, df in self.extra.items():
                 if not df.empty:
                     df.to_excel(writer, sheet_name=sheet_name, float_format = "%.3f")
 
 
     def reconstruct_output_ts_data_from_typical_periods(self, df) -> pd.DataFrame:
         """
-        Reconstruct an 8760-like hourly DataFrame from typical-period results.
-
-        Parameters
-        ----------
-        Returns
-        -------
-        pd.DataFrame with length P*hours_per_period and same columns as df_typ.
+        Reconstructs the time series at all the time steps of the original periods from the results of the typical periods.
+        The results are laid out in a [K, L, columns] block, from which all the original periods are gathered at once,
+        following the assignment of each period to its typical period
+        :param: df  DataFrame indexed over (typical period, time step of the period)
+        :return:    DataFrame with P*L rows (P original periods of L time steps) and the same columns as df
         """
-        out_array = []
-        for tp_id in range(len(self.typical_periods.assignment)):
-            out_array.append(df.xs(self.typical_periods.assignment[tp_id], level = 0))
-        output = pd.concat(out_array)
-        output.index = np.arange(len(self.typical_periods.assignment) * self.typical_periods.L)
-        return output
\ No newline at end of file
+        periods, steps = (df.index.get_level_values(level).to_numpy().astype(int) for level in (0, 1))
+        block = np.full((self.typical_periods.K, self.typical_periods.L, df.shape[1]), np.nan)
+        block[periods, steps] = df.to_numpy(dtype = float)
+        values = block[self.typical_periods.assignment].reshape(-1, df.shape[1])
+        return pd.DataFrame(values, index = pd.RangeIndex(values.shape[0]), columns = df.columns)
+
+
+def level_groups(index: pd.MultiIndex, levels) -> tuple[np.ndarray, pd.Index]:
+    # The position of each element of the index among the unique combinations of the given levels, and these combinations (sorted).
+    # The combinations are found in linear time, by marking them in an array over all the possible ones (the product of the sizes of the levels)
+    levels = list(levels)
+    shape = [len(index.levels[level]) for level in levels]
+    codes = np.ravel_multi_index([index.codes[level] for level in levels], shape)
+    is_present = np.zeros(np.prod(shape, dtype = np.int64), dtype = bool)
+    is_present[codes] = True
+    unique_codes = np.flatnonzero(is_present)
+    positions = (np.cumsum(is_present) - 1)[codes]
+    level_codes = np.unravel_index(unique_codes, shape)
+    values = [index.levels[level][codes] for level, codes in zip(levels, level_codes)]
+    return positions, (pd.MultiIndex.from_arrays(values, names = [index.names[level] for level in levels]) if len(levels) > 1 else
+                       pd.Index(values[0], name = index.names[levels[0]]))
+
+
+def drop_zero_columns(df: pd.DataFrame, tolerance: float) -> pd.DataFrame:
+    # The DataFrame without the columns whose absolute values are all below the tolerance
+    is_zero = np.isclose(df.to_numpy(dtype = float), 0, rtol = 0, atol = tolerance).all(axis = 0)
+    return df.loc[:, ~is_zero]
+
+
+def list_results(results_folder: str) -> list:
+    """
+    The names of the runs whose output is saved in the results folder, in either format (see OptimizationOutput.save_output).
+    Runs of parametric runs are sorted by scenario number, where possible
+    """
+    run_names = set()
+    for name in os.listdir(results_folder):
+        path = os.path.join(results_folder, name)
+        if name.startswith('Results_') and os.path.isfile(os.path.join(path, METADATA_FILENAME)):
+            run_names.add(name)
+        elif name.startswith('Results_') and name.endswith('.xlsx') and os.path.isfile(path):
+            run_names.add(name.removesuffix('.xlsx'))
+    ordered = attempt_to_order_results_files(sorted(run_names), 'Results_Scenario', extension = '')
+    return [name.removeprefix('Results_') for name in ordered]
+
+
+def read_results_metadata(results_folder: str, run_name: str) -> dict:
+    # The metadata of a run saved to Parquet files. For a run saved to Excel, the metadata are rebuilt from the workbook
+    folder = os.path.join(results_folder, f'Results_{run_name}')
+    if os.path.isfile(os.path.join(folder, METADATA_FILENAME)):
+        with open(os.path.join(folder, METADATA_FILENAME), 'r', encoding = 'utf-8') as stream:
+            return json.load(stream)
+    with pd.ExcelFile(f'{folder}.xlsx') as workbook:
+        metadata = {'run_name': run_name, 'tables': workbook.sheet_names,
+                    'extra_tables': [name for name in workbook.sheet_names if name not in ('kpis', 'units', 'solver') + TIMESERIES_TABLES]}
+        if 'solver' in workbook.sheet_names:
+            metadata['solver_settings'] = workbook.parse('solver', index_col = 0)['Value'].to_dict()
+    return metadata
+
+
+def read_results_table(results_folder: str, run_name: str, table: str) -> pd.DataFrame:
+    """
+    Reads one table (kpis, units, timeseries, timeseries_full or an extra output table) of the output of a run,
+    from its Parquet file or, for runs saved to Excel only, from the sheet of the workbook
+    """
+    folder = os.path.join(results_folder, f'Results_{run_name}')
+    if os.path.isfile(os.path.join(folder, METADATA_FILENAME)):
+        if table == 'timeseries':
+            metadata = read_results_metadata(results_folder, run_name)
+            return drop_zero_columns(pd.read_parquet(os.path.join(folder, 'timeseries_full.parquet')), metadata['zero_tolerance'])
+        return pd.read_parquet(os.path.join(folder, f'{table}.parquet'))
+    return pd.read_excel(f'{folder}.xlsx', sheet_name = table, header = [0, 1, 2] if table in TIMESERIES_TABLES else 0, index_col = 0)
@@ -1,15 +1,19 @@
 import OptiENEA.helpers.helpers as helpers
-import os, yaml
-from pandas import DataFrame
-
-with open(f'{os.path.dirname(os.path.realpath(__file__))}\\..\\lib\\default_entities.yml') as stream:
-    DEFAULT_ENTITIES = yaml.safe_load(stream)
+import copy
+from collections.abc import Sequence
+import numpy as np
+from pandas import DataFrame, Index, MultiIndex, Series, concat
 
 class Parameter:
     # Class containing the problem parameters
+    dirty: bool                 # True if the whole content changed since the modifications were last cleared (e.g. by Problem.snapshot)
+    dirty_positions: set        # Positions of the single rows that changed since the modifications were last cleared
+    elided_entries: dict        # (unit, layer) entries of a time-dependent parameter left out because equal to the default value
+
     def __init__(self, name, indexing_sets):
         self.name = name
         self.list_content = []
+        self.elided_entries = {}
         self.indexing_level = len(indexing_sets) if indexing_sets else 0
         if indexing_sets == None:
             self.content = 0.0
@@ -18,7 +22,149 @@ class Parameter:
     
     def __call__(self):
         return self.content
+
+    @property
+    def content(self):
+        return self._content
+
+    @content.setter
+    def content(self, value):
+        # Replacing the content invalidates the position index and marks the whole parameter as modified
+        self._content = value
+        self._positions = None
+        self._prefix_positions = {}
+        self.dirty = True
+        self.dirty_positions = set()
+
+    def copy(self):
+        # Returns a copy of the parameter, with its own content, so that it can be updated without affecting the original.
+        # The copy keeps the modifications of the original: only its own updates are then added to them
+        new_parameter = copy.copy(self)
+        new_parameter.list_content = list(self.list_content)
+        new_parameter.elided_entries = dict(self.elided_entries)
+        new_parameter.content = self._content.copy() if isinstance(self._content, DataFrame | Series) else self._content
+        new_parameter.dirty, new_parameter.dirty_positions = self.dirty, set(self.dirty_positions)
+        return new_parameter
+
+    def get_positions(self, indexing):
+        """
+        Returns the row positions in the content DataFrame corresponding to a given index, or None if the index is not in the content.
+        The index can be either a full key of the parameter or a partial key (e.g. only the unit name), in which case all
+        the rows starting with that key are returned. The position index is built the first time it is needed.
+        """
+        if self._positions is None:
+            self._positions = dict(zip(self._content.index, range(len(self._content.index))))
+        if indexing in self._positions:
+            return [self._positions[indexing]]
+        prefix_length = len(indexing) if isinstance(indexing, tuple) else 1
+        if self._content.index.nlevels <= prefix_length:
+            return None
+        if prefix_length not in self._prefix_positions:
+            levels = 0 if prefix_length == 1 else list(range(prefix_length))
+            self._prefix_positions[prefix_length] = self._content.groupby(level = levels, sort = False).indices
+        positions = self._prefix_positions[prefix_length].get(indexing)
+        return None if positions is None else positions.tolist()
+
+    def update(self, indexing, value):
+        """
+        Updates the value of the parameter at a given index, without re-sorting or re-building the content.
+        Only the modified rows are marked as dirty. Indices that are not in the content yet are added to it.
+        :param: indexing  The index of the value that we want to update (full or partial key, as a tuple or any other sequence). Ignored for scalar parameters
+        :param: value     The new value of the parameter
+        """
+        if isinstance(self._content, float | int):
+            self.content = value
+        elif isinstance(self._content, DataFrame):
+            if self._content.empty and self.name in self._content.columns and len(self._content.columns) > 1:
+                self.content = self._content.set_index(list(self._content.columns[:-1]))
+            if isinstance(indexing, Sequence | np.ndarray) and not isinstance(indexing, str):
+                indexing = tuple(indexing)  # Keys given as lists (e.g. ['PV']) are looked up as tuples
+            if isinstance(indexing, tuple) and len(indexing) == 1:
+                indexing = indexing[0]
+            if self.elided_entries:
+                # Entries left out because equal to the default value are added back before being updated
+                prefix = (indexing if isinstance(indexing, tuple) else (indexing,))[:2]
+                for key in [key for key in self.elided_entries if key[:len(prefix)] == prefix]:
+                    self.restore_elided_entry(key)
+            positions = self.get_positions(indexing)
+            if positions is None:
+                # New index: the content is extended, and will need to be written again as a whole
+                content = self._content
+                content.loc[indexing, self.name] = value
+                self.content = content
+            else:
+                column = self._content.columns.get_loc(self.name)
+                if len(positions) == 1:
+                    self._content.iat[positions[0], column] = value
+                else:
+                    self._content.iloc[positions, column] = value
+                self.dirty_positions.update(positions)
+
+    def modified_content(self):
+        """
+        Returns the part of the content that was modified since the modifications were last cleared: the full content,
+        only the modified rows, or None if nothing changed
+        """
+        if self.dirty:
+            return self._content
+        if self.dirty_positions:
+            return self._content.iloc[sorted(self.dirty_positions)]
+        return None
+
+    def clear_modifications(self):
+        # Resets the modification tracking: the current content is then the reference the modifications are tracked against
+        self.dirty = False
+        self.dirty_positions = set()
     
+    def set_time_dependent_content(self, unit_set: str, entries: list, time_index: dict, default: float | None = None):
+        """
+        Fills the content of a time-dependent parameter, indexed over [unit_set, 'layersOfUnit', *time sets], in one go.
+        The rows are first counted, then unit and layer codes, time indices and values are written in preallocated arrays,
+        so that the MultiIndex is built only once
+        :param: unit_set     Name of the set of units indexing the parameter (e.g. 'processes')
+        :param: entries      List of (unit name, layer, values) tuples. Values are either a scalar or have one element per time step
+        :param: time_index   Dictionary {set name: array with the element of the set for each time step}
+        :param: default      The default value of the parameter in the model. Entries equal to it at all time steps are left
+                             out of the content (AMPL then uses the default), and are restored if they are updated later
+        """
+        self.elided_entries = {}
+        if default is not None:
+            kept_entries = []
+            for unit_name, layer, data in entries:
+                if np.all(np.asarray(data, dtype = float) == default):
+                    self.elided_entries[(unit_name, layer)] = (unit_set, time_index, default)
+                else:
+                    kept_entries.append((unit_name, layer, data))
+            entries = kept_entries
+        self.content = self.time_dependent_frame(unit_set, entries, time_index)
+
+    def restore_elided_entry(self, key: tuple):
+        # Adds back to the content the rows of an entry that was left out because equal to the default value
+        unit_set, time_index, default = self.elided_entries.pop(key)
+        rows = self.time_dependent_frame(unit_set, [(key[0], key[1], default)], time_index)
+        self.content = rows if self._content.empty else concat([self._content, rows])
+
+    def time_dependent_frame(self, unit_set: str, entries: list, time_index: dict) -> DataFrame:
+        # Returns the DataFrame with the rows of the given (unit name, layer, values) entries (see set_time_dependent_content)
+        n_entries = len(entries)
+        n_steps = len(next(iter(time_index.values())))
+        values = np.empty(n_entries * n_steps, dtype = float)
+        unit_codes = np.empty(n_entries, dtype = np.intp)
+        layer_codes = np.empty(n_entries, dtype = np.intp)
+        units, layers = {}, {}
+        for idx, (unit_name, layer, data) in enumerate(entries):
+            values[idx * n_steps : (idx + 1) * n_steps] = np.asarray(data, dtype = float)
+            unit_codes[idx] = units.setdefault(unit_name, len(units))
+            layer_codes[idx] = layers.setdefault(layer, len(layers))
+        levels = [Index(list(units)), Index(list(layers))]
+        codes = [np.repeat(unit_codes, n_steps), np.repeat(layer_codes, n_steps)]
+        for elements in time_index.values():
+            level, code = np.unique(elements, return_inverse = True)
+            levels.append(Index(level))
+            codes.append(np.tile(code, n_entries))
+        index = MultiIndex(levels = levels, codes = codes, names = [unit_set, 'layersOfUnit'] + list(time_index.keys()), verify_integrity = False)
+        return DataFrame({self.name: values}, index = index)
+
     def is_empty(self):
         # Checks if the parameter is empty of data
         if self.indexing_level  == 0:
@@ -35,6 +181,6 @@ class Parameter:
         Intializes the full list of problem parameters
         """
         problem_parameters = {}
-        for param_name, indexing_sets in DEFAULT_ENTITIES['PARAMETERS'].items():
+        for param_name, indexing_sets in helpers.load_library_data('default_entities.yml')['PARAMETERS'].items():
             problem_parameters[param_name] = Parameter(param_name, indexing_sets)
         return problem_parameters
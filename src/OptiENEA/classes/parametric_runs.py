@@ -1,11 +1,10 @@
 from OptiENEA.classes.problem import Problem
-from OptiENEA.helpers.helpers import validate_project_structure, attempt_to_order_results_files
+from OptiENEA.classes.output import list_results, read_results_table
+from OptiENEA.classes.results_database import ResultsDatabase
 import pandas as pd
 import numpy as np
 import os
 from datetime import datetime
-import matplotlib.pyplot as plt
-import seaborn as sns
 from typing import List, Tuple, Dict
 
 """
@@ -13,6 +12,11 @@ This class is made to provide support for parametric runs
 """
 
 
+def input_name(param: tuple) -> str:
+    # The name of a parameter of the scenarios description, without its file or problem level and the empty levels
+    return ':'.join([x for x in param if x not in ("-", 'Problem', 'units.yml', 'general.yml')])
+
+
 class ParametricRuns():
     name: str
     problem: Problem
@@ -22,7 +26,10 @@ class ParametricRuns():
     scenario_results: pd.DataFrame
     kpis: pd.DataFrame
 
-    def __init__(self, name: str, problem: Problem, filename_scenarios: str = 'Scenarios.xlsx'):
+    def __init__(self, name: str, problem: Problem, filename_scenarios: str = 'Scenarios.xlsx', warm_start: bool = False):
+        """
+        :param: warm_start   If True, the scenarios are solved in order of similarity, each one starting from the solution of the closest scenario already solved
+        """
         self.name = name
         self.run_name = name + " " + datetime.now().strftime("%Y-%m-%d %H:%M").replace(":", ".")
         self.problem = problem
@@ -30,6 +37,8 @@ class ParametricRuns():
         self.parametric_runs_results_folder = os.path.join(self.problem.problem_folder, 'Results', self.run_name)
         self.parametric_runs_temp_folder = os.path.join(self.problem.problem_folder, 'Temporary files', self.run_name)
         self.typical_periods = None
+        self.session_pool = None
+        self.warm_start = warm_start
         self.load_scenario_file()
 
     def load_scenario_file(self):
@@ -62,42 +71,72 @@ class ParametricRuns():
         print(f'Start running parametric test "{self.name}"')
         self.problem.create_folders()
         self.create_folders()
+        database = ResultsDatabase(self.parametric_runs_results_folder)  # Each solved scenario appends its results to it
         parameters_to_update = self.check_parameters_to_update()
-        
-        for scenario in self.scenarios_description.index:
-            problem = Problem(
-                name = self.problem.name, 
-                problem_folder = self.problem.problem_folder,
-                temp_folder = os.path.join(self.parametric_runs_temp_folder, f'Scenario {scenario}'),
-                results_folder = os.path.join(self.parametric_runs_results_folder)
-                )
-            validate_project_structure(problem.problem_folder)
-            problem.create_folders()  # Creates the project folders
-            problem.read_problem_data()  # Reads problem general data and data about units
-            # This part updates "raw" values
-            self.update_raw_parameters(parameters_to_update['Raw'], problem, scenario)
-            problem.read_problem_parameters()
-            if self.typical_periods is None:
-                problem.generate_typical_periods()  # If needed, generates the data about the typical periods
-                self.typical_periods = problem.typical_periods
-            else:
-                problem.typical_periods = self.typical_periods
-            problem.set_occurrance()
-            problem.read_units_data()  # Uses the problem data read before and saves them in the appropriate format
-            problem.parse_sets()
-            problem.parse_parameters()
-            # This part updates "final" parameters
-            self.update_problem_parameters(parameters_to_update['Problem'], problem, scenario)
-            run_name = f'Scenario {scenario}'  # f'Scenario {scenario} run {datetime.now().strftime("%Y-%m-%d %H:%M").replace(":", ".")}'
-            self.scenarios_description.loc[scenario, ('Run name','-','-','-')] = run_name
-            problem.create_ampl_model(run_name = run_name)  # Creates the problem mod file
-            print(f'Starting solving problem {problem.name} in scenario # {scenario}')
-            problem.solve_ampl_problem()  # Solves the optimization problem
-            print('Solution completed!')
-            problem.process_output()  # Saves the output into useful and readable data structures
+        # The input files are read and parsed only once: each scenario is a copy-on-write clone of the base problem
+        self.problem.snapshot()
+        self.typical_periods = self.problem.typical_periods
+        if self.problem.interpreter == 'ampl':
+            from OptiENEA.classes.amplpy import AmplSessionPool  # Imported here, so that amplpy is only loaded by the AMPL interpreter
+            self.session_pool = AmplSessionPool()  # All scenarios share the same AMPL sessions
+        order = self.scenario_order() if self.warm_start else [(scenario, None) for scenario in self.scenarios_description.index]
+        warm_starts = {}  # Solutions of the scenarios solved so far, by scenario
+        try:
+            for scenario, closest_scenario in order:
+                problem = self.problem.clone(
+                    raw_data_updates = self.update_raw_parameters(parameters_to_update['Raw'], scenario),
+                    parameter_updates = self.update_problem_parameters(parameters_to_update['Problem'], scenario),
+                    temp_folder = os.path.join(self.parametric_runs_temp_folder, f'Scenario {scenario}'),
+                    results_folder = os.path.join(self.parametric_runs_results_folder)
+                    )
+                problem.session_pool, problem.ampl_problem = self.session_pool, None
+                problem.create_folders()  # Creates the project folders
+                run_name = f'Scenario {scenario}'  # f'Scenario {scenario} run {datetime.now().strftime("%Y-%m-%d %H:%M").replace(":", ".")}'
+                self.scenarios_description.loc[scenario, ('Run name','-','-','-')] = run_name
+                completed = False
+                try:
+                    problem.create_ampl_model(run_name = run_name)  # Creates the problem mod file
+                    print(f'Starting solving problem {problem.name} in scenario # {scenario}')
+                    problem.solve_ampl_problem(warm_start = warm_starts.get(closest_scenario))  # Solves the optimization problem
+                    if self.warm_start:
+                        warm_starts[scenario] = problem.ampl_problem.get_warm_start()
+                    print('Solution completed!')
+                    problem.process_output()  # Saves the output into useful and readable data structures
+                    database.append(scenario, run_name, self.scenario_inputs(scenario), problem.output.kpis, problem.output.units, problem.solver_settings)
+                    problem.output.release()
+                    completed = True
+                finally:
+                    if self.session_pool is not None and problem.ampl_problem is not None:
+                        if completed:
+                            self.session_pool.release(problem.ampl_problem)  # The AMPL session can now be used by the next scenario
+                        else:
+                            problem.ampl_problem.close()  # A session left in an unknown state by an error is not reused
+        finally:
+            if self.session_pool is not None:
+                self.session_pool.close()
+                self.session_pool = None
         self.generate_summary_output()
         # self.generate_summary_output_flows()
 
+    def scenario_order(self) -> list[tuple]:
+        """
+        Orders the scenarios so that each one is as similar as possible to a scenario solved before it. Starting from the baseline,
+        the next scenario is always the one closest to any of the scenarios already solved.
+        Returns the list of (scenario, closest scenario already solved) pairs (None for the baseline).
+        The distance between two scenarios is the sum of the differences of their parameters, each scaled by its range
+        """
+        values = self.scenarios_description.select_dtypes('number')
+        span = (values.max() - values.min()).replace(0, 1)
+        scaled = ((values - values.min()) / span).fillna(0).to_numpy(dtype = float)
+        distances = np.abs(scaled[:, None, :] - scaled[None, :, :]).sum(axis = 2)
+        order, solved, remaining = [(values.index[0], None)], [0], list(range(1, len(values)))
+        while remaining:
+            candidates = distances[np.ix_(solved, remaining)]
+            closest, position = np.unravel_index(np.argmin(candidates), candidates.shape)
+            order.append((values.index[remaining[position]], values.index[solved[closest]]))
+            solved.append(remaining.pop(position))
+        return order
+
     def create_folders(self):
         try:
             os.mkdir(self.parametric_runs_results_folder)
@@ -107,7 +146,9 @@ class ParametricRuns():
 
     def generate_summary_output(self, results_folder: str | None = None, generate_output_xlsx: bool = True):
         """
-        This method creates a summary output file by reading the output
+        This method creates a summary output file, with the inputs and the selected KPIs of each scenario.
+        The KPIs are queried from the results database of the run (see ResultsDatabase) or, for results folders without
+        it (e.g. results saved before the database was introduced), read from the results files of the scenarios
         """
         # 1 - The results include the input
         self.output = self.scenarios_description.copy(deep=True)
@@ -115,28 +156,43 @@ class ParametricRuns():
         if results_folder:
             self.parametric_runs_results_folder = results_folder
         # 2 - Flatte the column index
-        column_names = [('Input', ':'.join([x for x in param if x not in ("-", 'Problem', 'units.yml', 'general.yml')])) for param in self.output.columns]
+        column_names = [('Input', input_name(param)) for param in self.output.columns]
         self.output.columns = pd.MultiIndex.from_tuples(column_names)
         kpi_columns = [('Output', ':'.join([self.kpis.loc[x, 'Name'],self.kpis.loc[x, 'Indexing']])) for x in self.kpis.index if self.kpis.loc[x, 'Indexing'] != '-']
         kpi_columns = kpi_columns + [('Output', self.kpis.loc[x, 'Name']) for x in self.kpis.index if self.kpis.loc[x, 'Indexing'] == '-']
-        temp_kpi = pd.DataFrame(index = self.output.index, columns = pd.MultiIndex.from_tuples(kpi_columns))
-        # Identifying result files
-        file_list = [f for f in os.listdir(self.parametric_runs_results_folder) if os.path.isfile(os.path.join(self.parametric_runs_results_folder, f))]
-        file_list = [f for f in file_list if (('Results' in f) and ('.xlsx' in f))]
-        file_list = attempt_to_order_results_files(file_list, 'Results_Scenario')
-        for scenario, results_filename in enumerate(file_list):
-            temp_output_kpis, temp_output_units = self.read_optimization_output_files(results_filename)
-            if (temp_output_kpis is not None) and (temp_output_units is not None):
-                for kpi in kpi_columns:
-                    if len(kpi[1].split(':')) == 1:
-                        temp_kpi.loc[scenario, kpi] = temp_output_kpis.loc[kpi[1]].Value
-                    else:
-                        temp_kpi.loc[scenario, kpi] = temp_output_units.loc[kpi[1].split(':')[1], kpi[1].split(':')[0]]
+        # 3 - KPIs are named as the summary columns: "name" for the scalar ones, "name:unit" for those indexed over the units
+        results = self.read_scenario_results()
+        results['key'] = results['name'].where(results['category'] == 'kpi', results['name'] + ':' + results['item'])
+        temp_kpi = results.pivot_table(index = 'scenario', columns = 'key', values = 'value', aggfunc = 'last')
+        temp_kpi = temp_kpi.reindex(index = self.output.index, columns = [kpi[1] for kpi in kpi_columns])
+        temp_kpi.columns = pd.MultiIndex.from_tuples(kpi_columns)
         self.output = self.output.combine_first(temp_kpi)
         if generate_output_xlsx:
             self.output.to_excel(os.path.join(self.parametric_runs_results_folder, f'{self.name}_parametric_results.xlsx'))
         return self.output
 
+    def read_scenario_results(self) -> pd.DataFrame:
+        """
+        The KPIs and the output variables indexed over the units of each scenario, in long form (scenario, category, name, item, value)
+        as returned by ResultsDatabase.results. Without a results database, the results files are assigned to the scenarios in order
+        """
+        if os.path.isfile(os.path.join(self.parametric_runs_results_folder, ResultsDatabase.FILENAME)):
+            results = ResultsDatabase(self.parametric_runs_results_folder).results(('kpi', 'unit'))
+            scenarios = {str(scenario): scenario for scenario in self.scenarios_description.index}
+            return results.assign(scenario = results['scenario'].map(scenarios))
+        results = []
+        for scenario, run_name in zip(self.scenarios_description.index, list_results(self.parametric_runs_results_folder)):
+            kpis, units = self.read_optimization_output_files(run_name)
+            units = units.stack().dropna()
+            results.append(pd.DataFrame({'scenario': scenario, 'category': 'kpi', 'name': kpis.index, 'item': '', 'value': kpis['Value'].to_numpy()}))
+            results.append(pd.DataFrame({'scenario': scenario, 'category': 'unit', 'name': units.index.get_level_values(1),
+                                         'item': units.index.get_level_values(0).astype(str), 'value': units.to_numpy()}))
+        return pd.concat(results, ignore_index = True) if results else pd.DataFrame(columns = ['scenario', 'category', 'name', 'item', 'value'])
+
+    def scenario_inputs(self, scenario) -> dict:
+        # The values of the parameters of a scenario, named as the input columns of the summary
+        return {input_name(param): value for param, value in self.scenarios_description.loc[scenario].items() if param[0] != 'Run name'}
+
     def generate_summary_output_flows(self, 
                                     flows: Dict[str, Tuple],
                                     results_folder: str | None = None,
@@ -185,7 +241,7 @@ class ParametricRuns():
 
         Notes:
         ------
-        - The function assumes optimization results are stored in Excel files with 'timeseries_full' sheet.
+        - The function reads the 'timeseries_full' table of the results of each run (Parquet files or Excel workbook).
         - Flow identifiers should follow the format ('power', unit, flow_type) in the results files.
         - For location extraction, flow_type is expected to contain location information when has_locations=True.
         """
@@ -193,9 +249,7 @@ class ParametricRuns():
         # Identifying result files
         if not results_folder:
             results_folder = self.parametric_runs_results_folder
-        file_list = [f for f in os.listdir(results_folder) if os.path.isfile(os.path.join(results_folder, f))]
-        file_list = [f for f in file_list if (('Results' in f) and ('.xlsx' in f))]
-        file_list = attempt_to_order_results_files(file_list, 'Results_Scenario')
+        file_list = list_results(results_folder)
         if scenarios_to_plot:
             file_list = [filename for id, filename in enumerate(file_list) if id in scenarios_to_plot]
         else:
@@ -204,12 +258,7 @@ class ParametricRuns():
         counter = 0
         for scenario_id, filename in enumerate(file_list):
             cumulative_energy_demand = 0
-            temp = pd.read_excel(
-                os.path.join(results_folder, filename),
-                'timeseries_full',
-                header = [0,1,2], 
-                index_col = 0,
-                )
+            temp = read_results_table(results_folder, filename, 'timeseries_full')
             for flow_name, flow in flows.items():
                 col = ('power', flow[0], flow[1])
                 if has_locations:
@@ -256,34 +305,29 @@ class ParametricRuns():
                 parameters_to_update['Raw'].append(par)
         return parameters_to_update
     
-    def update_raw_parameters(self, raw_parameters_to_update, problem, scenario):
+    def update_raw_parameters(self, raw_parameters_to_update, scenario):
+        # Returns the (type, path, value) updates of the raw data for the selected scenario, as used by Problem.clone
+        updates = []
         for param in raw_parameters_to_update:
             for data_type in ('units', 'general'):
                 if data_type in param[1]:
                     path = [x for x in param[2:] if x != '-']
-                    problem.update_problem_data(data_type, path, self.scenarios_description.loc[scenario, param])
-        return problem
+                    updates.append((data_type, path, self.scenarios_description.loc[scenario, param]))
+        return updates
     
-    def update_problem_parameters(self, problem_parameters_to_update, problem, scenario):
+    def update_problem_parameters(self, problem_parameters_to_update, scenario):
+        # Returns the (name, indexing, value) updates of the problem parameters for the selected scenario, as used by Problem.clone
+        updates = []
         for param in problem_parameters_to_update:
             param_name = param[1]
             indexing = tuple([x for x in param[2:] if x != '-'])
-            problem.update_problem_parameters(param_name, indexing, self.scenarios_description.loc[scenario, param])
-        return problem
+            updates.append((param_name, indexing, self.scenarios_description.loc[scenario, param]))
+        return updates
 
-    def read_optimization_output_files(self, results_filename):
-        kpis = pd.read_excel(
-            os.path.join(self.parametric_runs_results_folder, results_filename),
-            'kpis',
-            header = 0, 
-            index_col = 0,
-        )
-        units = pd.read_excel(
-            os.path.join(self.parametric_runs_results_folder, results_filename),
-            'units',
-            header = 0, 
-            index_col = 0,
-        )
+    def read_optimization_output_files(self, run_name):
+        # The kpis and units tables of the results of a run, from its Parquet files or its Excel workbook
+        kpis = read_results_table(self.parametric_runs_results_folder, run_name, 'kpis')
+        units = read_results_table(self.parametric_runs_results_folder, run_name, 'units')
         return kpis, units
     
     def plot_costs_by_scenario(
@@ -301,6 +345,8 @@ class ParametricRuns():
         df: one row per scenario, with columns for CAPEX, OPEX, TOTEX.
         Produces stacked bars for CAPEX+OPEX and a line for TOTEX.
         """
+        import matplotlib.pyplot as plt  # Plotting libraries are only imported when a plot is requested
+        import seaborn as sns
 
         # --- basic validation
         required = {capex_col, opex_col, totex_col}
@@ -373,13 +419,13 @@ class ParametricRuns():
         normalize:      boolean. If True, results shown are normlized so that each bar sums to 100%
         has_locations:  boolean. If True, The hatches will be applied to allow the user to distinguish between locations
         """
+        import matplotlib.pyplot as plt  # Plotting libraries are only imported when a plot is requested
+        import seaborn as sns
         # Getting time series data
         # Identifying result files
         if not results_folder:
             results_folder = self.parametric_runs_results_folder
-        file_list = [f for f in os.listdir(results_folder) if os.path.isfile(os.path.join(results_folder, f))]
-        file_list = [f for f in file_list if (('Results' in f) and ('.xlsx' in f))]
-        file_list = attempt_to_order_results_files(file_list, 'Results_Scenario')
+        file_list = list_results(results_folder)
         if scenarios_to_plot:
             file_list = [filename for id, filename in enumerate(file_list) if id in scenarios_to_plot]
         else:
@@ -388,12 +434,7 @@ class ParametricRuns():
         counter = 0
         for scenario_id, filename in enumerate(file_list):
             cumulative_energy_demand = 0
-            temp = pd.read_excel(
-                os.path.join(results_folder, filename),
-                'timeseries_full',
-                header = [0,1,2], 
-                index_col = 0,
-                )
+            temp = read_results_table(results_folder, filename, 'timeseries_full')
             for flow_name, flow in flows.items():
                 col = ('power', flow[0], flow[1])
                 if has_locations:
@@ -7,7 +7,8 @@ Created on Mon Sep 16 10:33:51 2019
 This file describes the classes of the OptiENEA tool
 
 """
-import os, sys
+import copy, os, sys, time
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
 from OptiENEA.classes.unit import *
@@ -16,11 +17,34 @@ from OptiENEA.classes.variable import Variable
 from OptiENEA.classes.objective_function import ObjectiveFunction
 from OptiENEA.classes.parameter import Parameter
 from OptiENEA.classes.layer import Layer
-from OptiENEA.classes.amplpy import AmplProblem
-from OptiENEA.classes.output import OptimizationOutput
+from OptiENEA.classes.output import OptimizationOutput, RESULTS_FORMATS
+from OptiENEA.classes.timeseries_store import TimeSeriesStore
+from OptiENEA.classes.input_cache import InputCache
+from OptiENEA.classes.stage_pipeline import Stage, StagePipeline
+from OptiENEA.classes.solver_options import SolverOptions
+from OptiENEA.classes.native_model import NativeProblem
+from OptiENEA.classes.benders import BendersProblem, DecompositionSettings
+from OptiENEA.classes.warm_start import WarmStart
+from OptiENEA.classes.telemetry import RunTelemetry
 from OptiENEA.classes.typical_periods import *
-from typing import Optional, Sequence, Union
-from OptiENEA.helpers.helpers import validate_project_structure, set_in_path, key_dotted_to_tuple
+from OptiENEA.classes.time_step_aggregation import TimeStepAggregation, TimeStepAggregationConfig, TimeStepAggregator
+from typing import Optional, Sequence, Union, TYPE_CHECKING
+from OptiENEA.helpers.helpers import validate_project_structure, set_in_path, copy_path, key_dotted_to_tuple
+if TYPE_CHECKING:
+      from OptiENEA.classes.amplpy import AmplProblem, AmplSessionPool  # amplpy is only imported when a model is built
+
+@dataclass(frozen = True)
+class ProblemSnapshot:
+      """
+      The state of a parsed problem (all attributes set up to the parameters stage) and the memoized stages of its pipeline.
+      The data are not copied: they are shared with the problem and with all the clones created from the snapshot
+      """
+      state: dict
+      memo: dict
+
+      # Attributes that are specific of a problem run, and are not part of the snapshot
+      EXCLUDED = ('pipeline', 'last_snapshot', 'base_snapshot', 'ampl_problem', 'output', 'run_name', 'warm_start', 'timings')
+
 
 class Problem:
       name: str
@@ -34,65 +58,247 @@ class Problem:
       layers: set[Layer] | None
       raw_unit_data: dict | None
       raw_general_data : dict | None
+      timeseries_store: TimeSeriesStore | None
+      raw_timeseries_store: TimeSeriesStore | None
+      pipeline: StagePipeline | None
+      last_snapshot: ProblemSnapshot | None
       objective: ObjectiveFunction | None
-      ampl_problem: AmplProblem
+      ampl_problem: 'AmplProblem'
+      session_pool: Optional['AmplSessionPool']
       has_typical_periods: bool
+      has_time_step_aggregation: bool
+      time_step_aggregation: TimeStepAggregation | None
       interpreter: str
       solver: str
+      solver_options: SolverOptions
+      decomposition: DecompositionSettings | None
+      solver_settings: dict
+      warm_start: WarmStart | None
+      timings: dict
+      model_export: str
       interest_rate: float
       simulation_horizon: int
       ampl_parameters : dict
 
       # Initialization function
-      def __init__(self, name: str, problem_folder = None, temp_folder = None, input_folder = None, results_folder = None):
+      def __init__(self, name: str, problem_folder = None, temp_folder = None, input_folder = None, results_folder = None, cache_folder = None):
             """
             :param: problem_folder        the folder where the main content of the problem is (data, results, etc)
             :param: temp_folder           the temporary folder where temporary data is saved. Useful to specify if problem_folder is on cloud and many simulations are expected
+            :param: cache_folder          the folder where the parsed input files are cached. Useful to share the cache among problems using the same input (e.g. parametric runs)
             """
             self.name = name
             self.problem_folder = problem_folder or Path(sys.argv[0]).resolve().parent
             self.temp_folder = temp_folder or os.path.join(self.problem_folder, 'Temporary files')
             self.input_folder = input_folder or os.path.join(self.problem_folder, 'Input')
             self.results_folder = results_folder or os.path.join(self.problem_folder, 'Results')
+            self.cache_folder = cache_folder or os.path.join(self.temp_folder, 'Input cache')
+            self.use_input_cache = True
             self.units = {}
             self.sets = Set.create_empty_sets()
             self.parameters = Parameter.create_empty_parameters()
             self.layers = set()
             self.interpreter = 'ampl'
             self.solver = 'highs'
+            self.solver_options = SolverOptions()
+            self.solver_option_overrides = {}  # Solver options set with Problem.set_solver_options, on top of the ones of general.yml
+            self.solver_settings = {}  # Effective solver settings of the last solve
+            self.decomposition = None  # If set, the problem is solved by decomposition over its typical periods (native interpreter only)
+            self.warm_start = None  # If set, the solve starts from this solution (e.g. of a similar scenario)
+            self.timings = {}  # Seconds spent in each step of the last run (see RunTelemetry)
+            self.model_export = 'background'
+            self.results_format = 'parquet'
             # Addiing ampl parameters
             self.interest_rate = 0.06
             self.simulation_horizon = 8760
+            self.raw_timeseries_store = None
             self.raw_timeseries_data = pd.DataFrame()
             self.raw_general_data = {}
             self.raw_unit_data = {}
             self.additional_constraints_data = {}
             self.has_typical_periods = False
+            self.typical_periods = None
+            self.has_time_step_aggregation = False
+            self.time_step_aggregation = None
+            self.timeseries_store = None
+            self.pipeline = None
+            self.last_snapshot = None
+            self.base_snapshot = None  # The snapshot the problem was cloned from (see Problem.clone)
+            self.session_pool = None  # If set, the AMPL sessions are taken from the pool instead of being started for each model
 
       def load_problem_data():
             """
             This is basically creating the problem and loading all the data but not running it
             """
 
-      def run(self):
+      def run(self, verbose: bool = False):
             """
             Class method that simply runs the model as a whole. Useful once everything is set up to run things quickly
+            The workflow is run as a pipeline of stages: when the problem is run again, only the stages whose inputs changed are executed
+            :param: verbose   If True, prints which stages were executed and which were skipped
             """
             validate_project_structure(self.problem_folder)
             self.create_folders()  # Creates the project folders
-            self.read_problem_data()  # Reads problem general data and data about units
-            self.read_problem_parameters()
-            self.generate_typical_periods()  # If needed, generates the data about the typical periods
-            self.set_occurrance()
-            self.read_units_data()  # Uses the problem data read before and saves them in the appropriate format
-            self.parse_sets()
-            self.parse_parameters()
-            # self.set_objective_function()  # Reads and sets the objective function
-            self.create_ampl_model()  # Creates the problem mod file
-            self.solve_ampl_problem()  # Solves the optimization problem
-            # self.read_output()  # Reads the output generated
-            self.process_output()  # Saves the output into useful and readable data structures
-            # self.generate_plots()  # Generates required figures
+            if self.pipeline is None:
+                  self.pipeline = self.create_pipeline()
+            self.timings = {}
+            self.pipeline.run(verbose = verbose)
+
+      def create_pipeline(self) -> StagePipeline:
+            """
+            Declares the stages of the problem workflow, with the data each of them depends on:
+                  - read: reads the input files (Problem.read_problem_data)
+                  - settings: reads the general settings and standard parameters (Problem.read_problem_parameters)
+                  - typical periods: generates the typical periods, if needed. The result is also saved to disk, as the clustering is expensive
+                  - time step aggregation: merges similar consecutive time steps into segments, if needed. Also saved to disk
+                  - time step duration: sets the TIME_STEP_DURATION parameter to the duration of the segments, if time steps are aggregated
+                  - occurrance: sets the occurrance of the periods (Problem.set_occurrance)
+                  - units: creates the units (Problem.read_units_data)
+                  - sets, parameters: parses the problem sets and parameters
+                  - model, solve, output: creates the AMPL model, solves it and processes the results
+            """
+            def read_units_data():
+                  self.units = {}
+                  self.layers = set()
+                  self.read_units_data()
+            def parse_sets():
+                  self.sets = Set.create_empty_sets()
+                  self.parse_sets()
+            def parse_parameters():
+                  # Parameters set by the previous stages are kept, all others are parsed again from scratch
+                  previous_parameters = {name: self.parameters[name] for name in ('TIME_STEP_DURATION', 'TAX_DEDUCTION', 'YEARS_FOR_TAX_DEDUCTION', 'OCCURRANCE')}
+                  self.parameters = Parameter.create_empty_parameters() | previous_parameters
+                  self.parse_parameters()
+            stages = [
+                  Stage('read', self.read_problem_data,
+                        inputs = self.input_files_fingerprint,
+                        outputs = ('raw_unit_data', 'raw_general_data', 'additional_constraints_data', 'raw_timeseries_store')),
+                  Stage('settings', self.read_problem_parameters,
+                        inputs = lambda: (self.raw_general_data['Settings'], self.raw_general_data['Standard parameters']),
+                        outputs = ('interpreter', 'solver', 'solver_options', 'decomposition', 'model_export', 'results_format', 'interest_rate', 'simulation_horizon', 'output_variables', 'has_typical_periods', 'has_time_step_aggregation', 'objective'),
+                        depends_on = ('read',)),
+                  # The time series data are an input of this stage even without typical periods, as they are then used directly by the units
+                  Stage('typical periods', self.generate_typical_periods,
+                        inputs = lambda: (self.raw_general_data['Settings'].get('Typical periods'), self.has_typical_periods, self.get_raw_timeseries_store()),
+                        outputs = ('typical_periods',),
+                        persistent = True),
+                  Stage('time step aggregation', self.generate_time_step_aggregation,
+                        inputs = lambda: (self.raw_general_data['Settings'].get('Time step aggregation'), self.has_time_step_aggregation, self.has_typical_periods,
+                                          self.base_time_step_durations(), None if self.has_typical_periods else self.get_raw_timeseries_store()),
+                        outputs = ('time_step_aggregation',),
+                        depends_on = ('typical periods',),
+                        persistent = True),
+                  # The settings stage resets the TIME_STEP_DURATION parameter, so the durations of the segments are set again after it
+                  Stage('time step duration', self.set_time_step_duration,
+                        depends_on = ('settings', 'time step aggregation')),
+                  Stage('occurrance', self.set_occurrance,
+                        inputs = lambda: self.raw_general_data['Standard parameters'].get('Occurrance'),
+                        depends_on = ('typical periods',)),
+                  Stage('units', read_units_data,
+                        inputs = lambda: (self.raw_unit_data, self.interest_rate, self.simulation_horizon),
+                        outputs = ('units', 'layers'),
+                        depends_on = ('typical periods', 'time step aggregation')),
+                  Stage('sets', parse_sets,
+                        inputs = lambda: (self.simulation_horizon, self.parameters['TIME_STEP_DURATION'].content),
+                        outputs = ('sets',),
+                        depends_on = ('units', 'time step aggregation')),
+                  Stage('parameters', parse_parameters,
+                        inputs = lambda: (self.raw_general_data['Standard parameters'], self.additional_constraints_data),
+                        outputs = ('parameters',),
+                        depends_on = ('units', 'occurrance')),
+                  Stage('model', self.create_ampl_model,
+                        inputs = lambda: (self.interpreter, self.decomposition, self.model_export, self.raw_general_data['Settings']['Objective'], self.additional_constraints_data),
+                        outputs = ('ampl_problem', 'run_name'),
+                        depends_on = ('sets', 'parameters')),
+                  Stage('solve', self.solve_ampl_problem,
+                        inputs = lambda: (self.solver, self.solver_options),
+                        depends_on = ('model',)),
+                  Stage('output', self.process_output,
+                        inputs = lambda: (self.raw_general_data['Settings']['Output variables'], self.results_format, self.results_folder),
+                        outputs = ('output',),
+                        depends_on = ('solve',))]
+            return StagePipeline(self, stages, cache_folder = self.cache_folder)
+
+      def snapshot(self) -> ProblemSnapshot:
+            """
+            Parses the problem (running only the stages whose inputs changed) and captures its state, so that scenario variants
+            can then be created with Problem.clone without reading and parsing the input files again.
+            The snapshot shares the data of the problem: changes made in place to the problem afterwards also affect it
+            """
+            validate_project_structure(self.problem_folder)
+            self.create_folders()
+            if self.pipeline is None:
+                  self.pipeline = self.create_pipeline()
+            self.pipeline.run(until = 'parameters', verbose = False)
+            # Only the stages up to the parameters are part of the snapshot: the model, solve and output of the problem (if it was run) are not
+            parsing_stages = list(self.pipeline.stages)[:list(self.pipeline.stages).index('parameters') + 1]
+            self.last_snapshot = ProblemSnapshot(
+                  {name: value for name, value in vars(self).items() if name not in ProblemSnapshot.EXCLUDED},
+                  {name: record for name, record in self.pipeline.memo.items() if name in parsing_stages})
+            # The parameters of the snapshot are the reference their modifications are tracked against: AMPL sessions that hold
+            # the data of the snapshot then only receive the modifications made by each clone (see AmplProblem.write_parameters_to_amplpy)
+            for parameter in self.parameters.values():
+                  parameter.clear_modifications()
+            return self.last_snapshot
+
+      def clone(self, raw_data_updates: Sequence[tuple] = (), parameter_updates: Sequence[tuple] = (), 
+                name: str | None = None, temp_folder: str | None = None, results_folder: str | None = None) -> 'Problem':
+            """
+            Returns a parsed copy of the problem (from the last snapshot, which is created if needed), with some of its data updated.
+            All data are shared with the snapshot (copy-on-write): only the raw data paths and the parameters that are updated are copied.
+            If raw data are updated, only the stages depending on them are run again (e.g. the units, but not the typical periods)
+            :param: raw_data_updates     List of (type, path, value) tuples, as used by Problem.update_problem_data
+            :param: parameter_updates    List of (name, indexing, value) tuples, as used by Problem.update_problem_parameters
+            """
+            snapshot = self.last_snapshot or self.snapshot()
+            problem = Problem.__new__(Problem)
+            problem.__dict__.update(snapshot.state)
+            problem.name = name or self.name
+            problem.temp_folder = temp_folder or self.temp_folder
+            problem.results_folder = results_folder or self.results_folder
+            problem.last_snapshot = None
+            problem.base_snapshot = snapshot
+            problem.warm_start = None
+            problem.timings = {}
+            problem.pipeline = problem.create_pipeline()
+            problem.pipeline.memo = dict(snapshot.memo)
+            if raw_data_updates:
+                  for data_type, path, value in raw_data_updates:
+                        match data_type:
+                              case 'general':
+                                    problem.raw_general_data = copy_path(problem.raw_general_data, path)
+                              case 'units':
+                                    problem.raw_unit_data = copy_path(problem.raw_unit_data, path)
+                        problem.update_problem_data(data_type, path, value)
+                  problem.pipeline.run(until = 'parameters', verbose = False)
+            if parameter_updates:
+                  problem.parameters = dict(problem.parameters)
+                  for parameter_name in {parameter_name for parameter_name, _, _ in parameter_updates}:
+                        problem.parameters[parameter_name] = problem.parameters[parameter_name].copy()
+                  # The updated parameters are also what the parameters stage restores when the clone is run (see update_problem_parameters)
+                  for parameter_name, indexing, value in parameter_updates:
+                        problem.update_problem_parameters(parameter_name, indexing, value)
+            return problem
+
+      def base_data(self) -> ProblemSnapshot | None:
+            # The snapshot the problem was cloned from, if the problem still has its sets and parameters (or copies of them), None otherwise
+            if self.base_snapshot is None or self.sets is not self.base_snapshot.state['sets']:
+                  return None
+            return self.base_snapshot
+
+      def input_files_fingerprint(self) -> list:
+            # Returns the hash of each file in the input folder, used to check if the input files changed since the last run
+            cache = InputCache(self.cache_folder) if self.use_input_cache else None
+            fingerprints = []
+            for filename in sorted(os.listdir(self.input_folder)):
+                  path = os.path.join(self.input_folder, filename)
+                  if os.path.isfile(path):
+                        if cache:
+                              fingerprints.append((filename, cache.file_hash(path)))
+                        else:
+                              stat = os.stat(path)
+                              fingerprints.append((filename, stat.st_mtime_ns, stat.st_size))
+            return fingerprints
 
       def create_folders(self):
             """
@@ -113,21 +319,91 @@ class Problem:
             They MUST be stored in the problem folder with the names:
                   - 'units.yml' for data related to problem units
                   - 'general.yml' for general data about the problem
+            If use_input_cache is True, the parsed content of the files is cached in the cache folder, 
+            and files that did not change since the last run are not parsed again
+            The time series data are read into a TimeSeriesStore, according to the "Time series" settings (see read_timeseries_settings)
             """
-            with open(os.path.join(self.input_folder, 'units.yml'), 'r') as stream:
-                  self.raw_unit_data = yaml.safe_load(stream)
-            with open(os.path.join(self.input_folder, 'general.yml'), 'r') as stream:
-                  self.raw_general_data = yaml.safe_load(stream)
-            if 'constraints.yml' in os.listdir(self.input_folder):
-                  with open(os.path.join(self.input_folder, 'constraints.yml'), 'r') as stream:
-                        self.additional_constraints_data = yaml.safe_load(stream)
-            if 'timeseries_data.csv' in os.listdir(self.input_folder):
-                  self.raw_timeseries_data = pd.read_csv(
-                        os.path.join(self.input_folder, 'timeseries_data.csv'), 
-                        header = [0,1,2], 
-                        index_col = 0, 
-                        sep = ";")
+            input_files = os.listdir(self.input_folder)
+            cache = InputCache(self.cache_folder) if self.use_input_cache else None
+            self.raw_unit_data = Problem.read_yaml_file(os.path.join(self.input_folder, 'units.yml'), cache)
+            self.raw_general_data = Problem.read_yaml_file(os.path.join(self.input_folder, 'general.yml'), cache)
+            if 'constraints.yml' in input_files:
+                  self.additional_constraints_data = Problem.read_yaml_file(os.path.join(self.input_folder, 'constraints.yml'), cache)
+            if 'timeseries_data.csv' in input_files:
+                  dtype, chunk_size, memory_map = self.read_timeseries_settings()
+                  if cache:
+                        self.raw_timeseries_store = cache.load_timeseries_store(os.path.join(self.input_folder, 'timeseries_data.csv'), dtype, chunk_size, memory_map)
+                  else:
+                        self.raw_timeseries_store = TimeSeriesStore.from_csv(os.path.join(self.input_folder, 'timeseries_data.csv'), dtype, chunk_size)
 
+      def read_timeseries_settings(self) -> tuple:
+            """
+            Reads the optional "Time series" block of the general settings:
+                  - Precision: 'float64' (default) or 'float32', to halve the memory used by the time series
+                  - Chunk size: number of rows of the csv file parsed at once (default 100000)
+                  - Memory map: if True, the time series are read from a memory map of the binary copy stored in the input cache (default False)
+            """
+            settings = self.raw_general_data.get('Settings', {}).get('Time series') or {}
+            precision = settings.get('Precision', 'float64')
+            if precision not in ('float32', 'float64'):
+                  raise ValueError(f'The value of the Time series precision setting should either be "float32" or "float64". {precision} was provided')
+            return np.dtype(precision), int(settings.get('Chunk size', 100_000)), bool(settings.get('Memory map', False))
+
+      @staticmethod
+      def read_yaml_file(path: str, cache: InputCache | None = None) -> dict:
+            if cache:
+                  return cache.load_yaml(path)
+            with open(path, 'r') as stream:
+                  return yaml.safe_load(stream)
+
+      @staticmethod
+      def read_timeseries_file(path: str) -> pd.DataFrame:
+            return pd.read_csv(
+                  path, 
+                  header = [0,1,2], 
+                  index_col = 0, 
+                  sep = ";")
+
+
+      @property
+      def raw_timeseries_data(self) -> pd.DataFrame:
+            """
+            The raw time series data, as a DataFrame with one column per series.
+            When the data were read from file, the DataFrame is only created the first time it is requested, as a view of the raw time series store
+            """
+            if self.raw_timeseries_store is not None and self._raw_timeseries_data_store is not self.raw_timeseries_store:
+                  self._raw_timeseries_data = self.raw_timeseries_store.to_dataframe()
+                  self._raw_timeseries_data_store = self.raw_timeseries_store
+            return self._raw_timeseries_data
+
+      @raw_timeseries_data.setter
+      def raw_timeseries_data(self, value: pd.DataFrame):
+            # Replacing the raw data as a DataFrame: the raw time series store will be re-created from it when needed
+            self._raw_timeseries_data = value
+            self._raw_timeseries_data_store = None
+            self.raw_timeseries_store = None
+
+      def get_raw_timeseries_store(self) -> TimeSeriesStore:
+            # Returns the store with the raw time series data, creating it from the DataFrame if the data were provided in that form
+            if self.raw_timeseries_store is None:
+                  self.raw_timeseries_store = TimeSeriesStore.from_dataframe(self._raw_timeseries_data)
+                  self._raw_timeseries_data_store = self.raw_timeseries_store
+            return self.raw_timeseries_store
+
+      def get_timeseries_store(self) -> TimeSeriesStore:
+            """
+            Returns the problem-level time series store, shared by all units.
+            The store is built from the typical periods, if used, or is the raw time series store otherwise,
+            and it is rebuilt only if the data it was built from has been replaced.
+            If time steps are aggregated, the store with the segments of the aggregation is returned instead
+            """
+            if self.time_step_aggregation is not None:
+                  self.timeseries_store = self.time_step_aggregation.store
+            elif not self.has_typical_periods:
+                  self.timeseries_store = self.get_raw_timeseries_store()
+            elif self.timeseries_store is None or self.timeseries_store.source is not self.typical_periods:
+                  self.timeseries_store = TimeSeriesStore.from_typical_periods(self.typical_periods)
+            return self.timeseries_store
 
       def update_problem_data(self, type: str, path: tuple, value: float):
             """
@@ -140,11 +416,31 @@ class Problem:
                         self.raw_general_data = set_in_path(self.raw_general_data, path, value)
                   case 'units':
                         self.raw_unit_data = set_in_path(self.raw_unit_data, path, value)
+            # The data are also changed in the memoized outputs of the read stage, so that they are kept when the stage is skipped.
+            # The stages that depend on them are then run again, as their fingerprints change
+            if self.pipeline is not None and 'read' in self.pipeline.memo:
+                  self.pipeline.replace_outputs('read', raw_unit_data = self.raw_unit_data, raw_general_data = self.raw_general_data)
 
       def read_problem_parameters(self):
             # Reads the problem's general data into the deidcated structure
-            self.interpreter = self.raw_general_data['Settings']['Interpreter']
+            # Interpreter: ampl, or native (the model is built as a sparse matrix and solved with HiGHS, without AMPL)
+            self.interpreter = str(self.raw_general_data['Settings']['Interpreter']).lower()
+            if self.interpreter not in ('ampl', 'native'):
+                  raise ValueError(f'The value of the Interpreter setting should be either "ampl" or "native". {self.interpreter} was provided')
             self.solver = self.raw_general_data['Settings']['Solver']
+            self.solver_options = SolverOptions.from_settings(self.raw_general_data['Settings'].get('Solver options')).updated(**self.solver_option_overrides)
+            # Decomposition: the problem is split in a master problem and one subproblem per typical period (see BendersProblem)
+            self.decomposition = DecompositionSettings.from_settings(self.raw_general_data['Settings'].get('Decomposition'))
+            if self.decomposition is not None and self.interpreter != 'native':
+                  raise ValueError('The Decomposition setting is only supported by the native interpreter')
+            # Export of the model and data files: off, on (before the solve), compressed or background (while solving)
+            self.model_export = str(self.raw_general_data['Settings'].get('Model export', 'background')).lower()
+            if self.model_export not in ('off', 'on', 'compressed', 'background'):
+                  raise ValueError(f'The value of the Model export setting should be one of "off", "on", "compressed" or "background". {self.model_export} was provided')
+            # Format of the results files: parquet (one file per table), excel or both (see OptimizationOutput.save_output)
+            self.results_format = str(self.raw_general_data['Settings'].get('Results format', 'parquet')).lower()
+            if self.results_format not in RESULTS_FORMATS:
+                  raise ValueError(f'The value of the Results format setting should be one of "parquet", "excel" or "both". {self.results_format} was provided')
             # Addiing ampl parameters
             self.interest_rate = self.raw_general_data['Standard parameters']['Interest rate']
             self.simulation_horizon: int = self.raw_general_data['Standard parameters']['NT']
@@ -153,7 +449,7 @@ class Problem:
                   self.parameters["TIME_STEP_DURATION"].content = self.raw_general_data['Standard parameters']['Time step duration']
             elif self.raw_general_data['Standard parameters']['Time step duration'] == 'file':
                   self.parameters["TIME_STEP_DURATION"] = Parameter("TIME_STEP_DURATION", ['timeSteps'])
-                  self.parameters["TIME_STEP_DURATION"].content = self.raw_timeseries_data[('Time step duration',"-","-")]
+                  self.parameters["TIME_STEP_DURATION"].content = self.get_raw_timeseries_store().get_series(('Time step duration',"-","-"))
             else:
                  raise ValueError(f'The value of the Time step duration setting should either be a number or the string "file". {self.raw_general_data["Standard parameters"]["Time step duration"]} was provided')
             if 'Tax deduction' in self.raw_general_data['Standard parameters'].keys():
@@ -164,6 +460,12 @@ class Problem:
             self.output_variables = Variable.load_variables_indexing_data(self.raw_general_data['Settings']['Output variables'])
             # Checking if problem has typical periods
             self.has_typical_periods = True if 'Typical periods' in self.raw_general_data['Settings'].keys() else False
+            self.has_time_step_aggregation = True if 'Time step aggregation' in self.raw_general_data['Settings'].keys() else False
+            # The problems the native interpreter cannot build are rejected before their data are parsed
+            if self.interpreter == 'native':
+                  NativeProblem.check_supported(self.raw_general_data['Settings']['Objective'], self.additional_constraints_data)
+            if self.decomposition is not None:
+                  BendersProblem.check_decomposable(any(isinstance(info, dict) and info.get('OnOff utility', False) for info in self.raw_unit_data.values()))
             self.objective = ObjectiveFunction(self.raw_general_data['Settings']['Objective'])
 
       def generate_typical_periods(self):
@@ -186,10 +488,62 @@ class Problem:
                               extreme_selector = Problem.read_extreme_selector_data(tp_param['Extreme periods configuration']),
                               random_state=1))
                   print('Building typical periods...', end=' ')
-                  self.typical_periods = tp_builder.build(self.raw_timeseries_data)
+                  self.typical_periods = tp_builder.build(self.get_raw_timeseries_store())
                   print('Done')
                   self.typical_periods.to_yaml(path = os.path.join(self.temp_folder, 'typical_periods_data.yml'))
       
+      def generate_time_step_aggregation(self):
+            """
+            Merges consecutive, similar time steps into segments of variable length, according to the "Time step aggregation" settings:
+                  - Number of segments: the target number of segments (per typical period, if the problem has typical periods)
+                  - Tolerance: the maximum root-mean-square deviation from the original series, relative to their standard deviation
+                  - Weights: optional weights of the time series in the similarity measure
+            The time series are replaced by their duration-weighted averages over each segment, so that the energy is conserved
+            """
+            if self.has_time_step_aggregation == False:
+                  self.time_step_aggregation = None
+            else:
+                  ts_param = self.raw_general_data['Settings']['Time step aggregation'] or {}
+                  aggregator = TimeStepAggregator(TimeStepAggregationConfig(
+                        n_segments = ts_param.get('Number of segments'),
+                        tolerance = ts_param.get('Tolerance'),
+                        var_weights = {key_dotted_to_tuple(key): value for key, value in (ts_param.get('Weights') or {}).items()}))
+                  print('Aggregating time steps...', end=' ')
+                  if self.has_typical_periods:
+                        self.time_step_aggregation = aggregator.build(
+                              TimeSeriesStore.from_typical_periods(self.typical_periods),
+                              durations = self.base_time_step_durations(),
+                              block_length = self.typical_periods.L)
+                  else:
+                        self.time_step_aggregation = aggregator.build(
+                              self.get_raw_timeseries_store(),
+                              durations = self.base_time_step_durations(),
+                              exclude = (('Time step duration', '-', '-'),))
+                  print(f'Done ({self.time_step_aggregation.n_steps} time steps to {self.time_step_aggregation.n_segments} segments)')
+            self.timeseries_store = None
+            self.set_time_step_duration()
+
+      def base_time_step_durations(self) -> float | np.ndarray:
+            # Returns the duration of the time steps as provided in the input files: a single value or, if "file", one value per time step
+            time_step_duration = self.raw_general_data['Standard parameters']['Time step duration']
+            if time_step_duration != 'file':
+                  return time_step_duration
+            if self.has_typical_periods:
+                  raise ValueError('Time step durations read from file cannot be used together with typical periods')
+            return self.get_raw_timeseries_store().get_array(('Time step duration', '-', '-'))
+
+      def set_time_step_duration(self):
+            # If time steps are aggregated, the TIME_STEP_DURATION parameter is set to the duration of each segment
+            if self.time_step_aggregation is not None:
+                  self.parameters['TIME_STEP_DURATION'] = Parameter('TIME_STEP_DURATION', ['timeSteps'])
+                  self.parameters['TIME_STEP_DURATION'].content = self.time_step_aggregation.duration_series()
+
+      def time_steps_of_periods(self) -> np.ndarray:
+            # Returns the number of time steps of each typical period (fewer than the hours per period if time steps are aggregated)
+            if self.time_step_aggregation is not None:
+                  return self.time_step_aggregation.segments_per_block
+            return np.full(self.typical_periods.K, self.typical_periods.L)
+
       @staticmethod
       def read_extreme_selector_data(tp_param_extreme):
             config = []
@@ -233,9 +587,9 @@ class Problem:
                         discharging_unit_info = StorageUnit.create_auxiliary_unit_info(unit_name, unit_info, 'Discharging')
                         auxiliary_units.update({charging_unit_info['Name']: charging_unit_info})
                         auxiliary_units.update({discharging_unit_info['Name']: discharging_unit_info})
-            self.raw_unit_data.update(auxiliary_units)
-            for unit_name, unit_info in self.raw_unit_data.items():
-                  new_unit = self.load_unit(unit_name, unit_info)  # Create the new unit
+            # Units work on a copy of the raw data (and auxiliary units are not added to them), so that these are left as read from the input files
+            for unit_name, unit_info in (self.raw_unit_data | auxiliary_units).items():
+                  new_unit = self.load_unit(unit_name, copy.deepcopy(unit_info))  # Create the new unit
                   self.units[unit_name] = new_unit
                   self.layers = self.layers.union(new_unit.parse_layers())
       
@@ -258,16 +612,16 @@ class Problem:
 
       def parse_sets(self):
             # NOTE: The append method is a method of the class "Set"
+            # Time sets are contiguous integers, so they are stored as ranges
             if not self.has_typical_periods:
-                  if len(self.parameters["TIME_STEP_DURATION"].content) == 1:
-                        self.sets['timeSteps'].content.update([int(x) for x in range(0, int(self.simulation_horizon), int(self.parameters['TIME_STEP_DURATION']()))])
+                  if not isinstance(self.parameters["TIME_STEP_DURATION"].content, pd.Series):
+                        self.sets['timeSteps'].set_range(0, int(self.simulation_horizon), int(self.parameters['TIME_STEP_DURATION']()))
                   else:
-                        self.sets['timeSteps'].content.update([int(x) for x in range(0, len(self.parameters['TIME_STEP_DURATION'].content))])
+                        self.sets['timeSteps'].set_range(0, len(self.parameters['TIME_STEP_DURATION'].content))
             else:
-                  self.sets['typicalPeriods'].content.update([int(x) for x in range(self.typical_periods.K)])
-                  for tp in range(self.typical_periods.K):
-                        for ts in range(self.typical_periods.L):
-                              self.sets['timeStepsOfPeriod'].append(ts, tp)
+                  self.sets['typicalPeriods'].set_range(0, self.typical_periods.K)
+                  for tp, n_time_steps in enumerate(self.time_steps_of_periods()):
+                        self.sets['timeStepsOfPeriod'].set_range(0, int(n_time_steps), subset = tp)
             for layer in self.layers:
                   self.sets['layers'].append(layer.name)
             for unit_name, unit in self.units.items():
@@ -299,26 +653,19 @@ class Problem:
       def parse_parameters(self):
         # Parses data for the parameters
             if not self.has_typical_periods:
-                  time_steps = np.arange(len(self.raw_timeseries_data.index))
+                  time_index = {'timeSteps': np.arange(self.get_timeseries_store().n_steps)}
             else:
-                  typical_periods = np.repeat(np.arange(self.typical_periods.K), self.typical_periods.L)
-                  time_steps = np.tile(np.arange(self.typical_periods.L), self.typical_periods.K)
+                  time_steps_of_periods = self.time_steps_of_periods()
+                  time_index = {'typicalDays': np.repeat(np.arange(self.typical_periods.K), time_steps_of_periods),
+                                'timeStepsOfPeriod': np.concatenate([np.arange(n) for n in time_steps_of_periods])}
+            # Time-dependent parameters are collected as (unit, layer, values) entries and assembled in bulk at the end
+            time_dependent_parameters = {'POWER': ('processes', []), 'POWER_MAX_REL': ('nonStorageUtilities', []), 'ENERGY_PRICE_VARIATION': ('markets', [])}
+            # Default values of the time-dependent parameters in the model: entries always equal to them are not sent to AMPL
+            time_dependent_defaults = {'POWER_MAX_REL': 1.0, 'ENERGY_PRICE_VARIATION': 1.0}
             for unit_name, unit in self.units.items():
                   if isinstance(unit, Process):
                         for layer in unit.layers:
-                              if isinstance(unit.power[layer], pd.Series):
-                                    temp = pd.DataFrame(index = unit.power[layer].index)
-                              else:
-                                    temp = pd.DataFrame(index = [x for x in range(self.simulation_horizon)])
-                              temp.loc[:, 'processes'] = unit_name      
-                              temp.loc[:, 'layersOfUnit'] = layer
-                              if not self.has_typical_periods:
-                                    temp.loc[:, 'timeSteps'] = time_steps
-                              else:
-                                    temp.loc[:, 'typicalDays'] = typical_periods
-                                    temp.loc[:, 'timeStepsOfPeriod'] = time_steps
-                              temp.loc[:, 'POWER'] = unit.power[layer]
-                              self.parameters['POWER'].list_content.append(temp)
+                              time_dependent_parameters['POWER'][1].append((unit_name, layer, unit.power[layer]))
                   elif isinstance(unit, Utility):
                         self.parameters['SPECIFIC_INVESTMENT_COST_ANNUALIZED'].list_content.append({'utilities': unit_name, 'SPECIFIC_INVESTMENT_COST_ANNUALIZED': unit.specific_annualized_capex})
                         self.parameters['SPECIFIC_INVESTMENT_COST'].list_content.append({'utilities': unit_name, 'SPECIFIC_INVESTMENT_COST': unit.specific_capex})
@@ -335,29 +682,11 @@ class Problem:
                               for layer in unit.layers:
                                     self.parameters['POWER_MAX'].list_content.append({'nonStorageUtilities': unit_name, 'layersOfUnit': layer, 'POWER_MAX': unit.max_installed_power[layer]})
                                     if unit.time_dependent_capacity_factor[layer] is not None:
-                                          temp = pd.DataFrame(index = unit.time_dependent_capacity_factor[layer].index)
-                                          temp.loc[:, 'nonStorageUtilities'] = unit_name
-                                          temp.loc[:, 'layersOfUnit'] = layer
-                                          if not self.has_typical_periods:
-                                                temp.loc[:, 'timeSteps'] = time_steps
-                                          else:
-                                                temp.loc[:, 'typicalDays'] = typical_periods
-                                                temp.loc[:, 'timeStepsOfPeriod'] = time_steps
-                                          temp.loc[:, 'POWER_MAX_REL'] = unit.time_dependent_capacity_factor[layer]
-                                          self.parameters['POWER_MAX_REL'].list_content.append(temp)
+                                          time_dependent_parameters['POWER_MAX_REL'][1].append((unit_name, layer, unit.time_dependent_capacity_factor[layer]))
                               if isinstance(unit, Market):
                                     self.parameters['ENERGY_AVERAGE_PRICE'].list_content.append({'markets': unit_name, 'layersOfUnit': layer, 'ENERGY_AVERAGE_PRICE': unit.energy_price[layer]})
                                     if unit.energy_price_variation[layer] is not None:
-                                          temp = pd.DataFrame(index = unit.energy_price_variation[layer].index)
-                                          temp.loc[:, 'markets'] = unit_name
-                                          temp.loc[:, 'layersOfUnit'] = layer
-                                          if not self.has_typical_periods:
-                                                temp.loc[:, 'timeSteps'] = time_steps
-                                          else:
-                                                temp.loc[:, 'typicalDays'] = typical_periods
-                                                temp.loc[:, 'timeStepsOfPeriod'] = time_steps
-                                          temp.loc[:, 'ENERGY_PRICE_VARIATION'] = unit.energy_price_variation[layer]
-                                          self.parameters['ENERGY_PRICE_VARIATION'].list_content.append(temp)
+                                          time_dependent_parameters['ENERGY_PRICE_VARIATION'][1].append((unit_name, layer, unit.energy_price_variation[layer]))
                   else:
                         raise TypeError(f'Unit {unit_name} has wrong unit type: should be either Process, Utility, StorageUnit or Market')
             # Adding parameters defined in additional constraints      
@@ -365,12 +694,12 @@ class Problem:
                   self.parameters[constraint['parameter name']] = Parameter(constraint['parameter name'], None)
                   self.parameters[constraint['parameter name']].content = constraint['parameter value']
             # Finally doing the conversion from lists to Dataframes
+            for param_name, (unit_set, entries) in time_dependent_parameters.items():
+                  if entries:
+                        self.parameters[param_name].set_time_dependent_content(unit_set, entries, time_index, time_dependent_defaults.get(param_name))
             for param_name, parameter in self.parameters.items():
                   if parameter.indexing_level > 0 and parameter.list_content != []:
-                        if param_name in {'ENERGY_PRICE_VARIATION', 'POWER_MAX_REL', 'POWER'}:
-                              parameter.content = pd.concat(parameter.list_content)
-                        else:
-                              parameter.content = pd.DataFrame(parameter.list_content)
+                        parameter.content = pd.DataFrame(parameter.list_content)
                         parameter.content = parameter.content.assign(**{param_name: parameter.content[param_name].astype(float)})  # Sets all parameter values to float, so to avoid data type issuse when re-setting the parameter value
                         parameter.content = parameter.content.set_index([x for x in parameter.content.columns if x != param_name])
 
@@ -381,15 +710,13 @@ class Problem:
             :param: indexing  The index of the value that we want to update
             :param: value     The new value of the parameter 
             """
-            if isinstance(self.parameters[name].content, float | int):
-                  self.parameters[name].content = value
-            elif isinstance(self.parameters[name].content, pd.DataFrame):
-                  if self.parameters[name].content.empty:
-                        self.parameters[name].content = self.parameters[name].content.set_index(list(self.parameters[name].content.columns[:-1]))     
-                  if len(indexing) == 1:
-                        indexing = indexing[0]
-                  self.parameters[name].content.sort_index(inplace=True)
-                  self.parameters[name].content.loc[indexing, name] = value
+            self.parameters[name].update(indexing, value)
+            # The parameters are also changed in the memoized outputs of the parameters stage, and the model is built and solved again
+            # on the next run: the fingerprints of the stages do not include the contents of the parameters
+            if self.pipeline is not None and 'parameters' in self.pipeline.memo:
+                  self.pipeline.replace_outputs('parameters', parameters = self.parameters)
+                  for stage_name in ('model', 'solve', 'output'):
+                        self.pipeline.invalidate(stage_name)
 
       
       def create_ampl_model(self, run_name: str | None = None):
@@ -401,24 +728,63 @@ class Problem:
             run_name : str | None, optional
                 Optional name used to create a dedicated temporary folder for this run.
             """
-            # Based on the available information, create the mod file
-            self.ampl_problem = AmplProblem(self)
             self.run_name = run_name if run_name else f'Run {datetime.now().strftime("%Y-%m-%d %H:%M").replace(":", ".")}'
+            start = time.perf_counter()
+            if self.interpreter == 'native':
+                  # The model is assembled directly from the sets and parameters, without writing or transferring any file
+                  self.ampl_problem = NativeProblem(self) if self.decomposition is None else BendersProblem(self, self.decomposition)
+                  self.ampl_problem.build()
+                  self.timings |= {'model evaluation': time.perf_counter() - start, 'data transfer': 0.0}
+                  return
+            from OptiENEA.classes.amplpy import AmplProblem  # Imported here, so that amplpy is not loaded if no model is built
+            # Based on the available information, create the mod file
+            if self.session_pool is None:
+                  self.ampl_problem = AmplProblem(self)
+                  self.ampl_problem.parse_problem_settings()
+                  self.ampl_problem.write_mod_file()
+            else:
+                  # The session comes with the model already loaded (and, if it was used before, with its data reset)
+                  self.ampl_problem = self.session_pool.acquire(self)
+            self.timings['model evaluation'] = time.perf_counter() - start
             self.ampl_problem.temp_folder = os.path.join(self.temp_folder, self.run_name)
             os.mkdir(self.ampl_problem.temp_folder)
-            self.ampl_problem.parse_problem_settings()
-            self.ampl_problem.write_mod_file()
-            self.ampl_problem.write_sets_to_amplpy()
-            self.ampl_problem.write_parameters_to_amplpy()
-            self.ampl_problem.export_model(os.path.join(self.ampl_problem.temp_folder, 'modfile.mod'))
-            self.ampl_problem.export_data(os.path.join(self.ampl_problem.temp_folder, 'datfile.dat'))
+            start = time.perf_counter()
+            if self.ampl_problem.holds_base_data:
+                  # The session already holds the data of the snapshot the problem was cloned from: only the modified parameters are sent
+                  self.ampl_problem.write_parameters_to_amplpy(only_modified = True)
+            else:
+                  self.ampl_problem.write_sets_to_amplpy()
+                  self.ampl_problem.write_parameters_to_amplpy()
+            self.timings['data transfer'] = time.perf_counter() - start
+            self.ampl_problem.export_files(self.model_export)
       
-      def solve_ampl_problem(self):
+      def solve_ampl_problem(self, warm_start: WarmStart | None = None):
             """
             Calls the required routine to solve the ampl problem
+            :param: warm_start   A solution of a similar problem (see WarmStart), used as starting point. If None, Problem.warm_start is used
             """
+            self.warm_start = warm_start or self.warm_start
+            self.solver_settings = {'solver': self.solver} | self.ampl_problem.set_solver_options(self.solver, self.solver_options)
+            if self.warm_start is not None:
+                  self.ampl_problem.set_warm_start(self.warm_start)
+                  self.solver_settings['warm start'] = True
+            start = time.perf_counter()
             self.ampl_problem.solve(solver = self.solver)
             print(self.ampl_problem.solve_result)
+            self.timings['solve'] = time.perf_counter() - start
+            self.solver_settings |= {'solve result': self.ampl_problem.solve_result, 'solve time [s]': self.timings['solve']}
+            self.ampl_problem.wait_for_export()
+
+      def set_solver_options(self, **options):
+            """
+            Sets some solver options (see SolverOptions), on top of the ones of the "Solver options" block of general.yml
+            E.g. problem.set_solver_options(threads = 4, mip_gap = 0.01, time_limit = 600)
+            """
+            self.solver_options = self.solver_options.updated(**options)
+            self.solver_option_overrides = self.solver_option_overrides | options
+            # The options are also changed in the memoized settings, so that they are kept when the settings stage is skipped
+            if self.pipeline is not None and 'settings' in self.pipeline.memo:
+                  self.pipeline.replace_outputs('settings', solver_options = self.solver_options)
 
       def set_objective_function(self):
             # Sets the objective function
@@ -430,12 +796,30 @@ class Problem:
 
       
       def process_output(self):
+            start = time.perf_counter()
             if not self.has_typical_periods:
-                  self.output = OptimizationOutput(self.ampl_problem, self.output_variables, self.results_folder)
+                  self.output = OptimizationOutput(self.ampl_problem, self.output_variables, self.results_folder, time_step_aggregation = self.time_step_aggregation,
+                                                   solver_settings = self.solver_settings)
             else:
-                  self.output = OptimizationOutput(self.ampl_problem, self.output_variables, self.results_folder, self.typical_periods)
+                  self.output = OptimizationOutput(self.ampl_problem, self.output_variables, self.results_folder, self.typical_periods, self.time_step_aggregation,
+                                                   solver_settings = self.solver_settings)
             self.output.generate_output_structures()
-            self.output.save_output_to_excel(self.run_name)
+            self.output.save_output(self.run_name, self.results_format)
+            self.output.release()  # Only the solution is kept in memory: the tables of results are built again if they are read
+            self.timings['output extraction'] = time.perf_counter() - start
+            self.write_telemetry()
+
+      def export_results_to_excel(self, run_name: str | None = None):
+            # Writes the Excel workbook of the results of a run (by default, the last one) from its saved results files
+            OptimizationOutput.from_results(self.results_folder, run_name or self.run_name).save_output_to_excel(run_name or self.run_name)
+
+      def write_telemetry(self):
+            # Appends the record of the run (size of the model, time of each step, solver statistics) to the telemetry file of the results folder
+            if self.pipeline is not None:
+                  # Stages that build the problem data: all the ones before the model (those that were skipped take no time)
+                  data_stages = list(self.pipeline.stages)[:list(self.pipeline.stages).index('model')]
+                  self.timings['data build'] = sum(self.pipeline.durations.get(name, 0.0) for name in data_stages)
+            RunTelemetry.from_problem(self).append_to(self.results_folder)
 
 
 
@@ -0,0 +1,93 @@
+"""
+Append-only database of the results of parametric runs. Each solved scenario appends, in a single transaction, its inputs,
+its KPIs, the values of the output variables indexed over the units (e.g. their sizes) and the metadata of its solve.
+The database is a SQLite file in the results folder, so the summary of the scenarios is a query, without reading the
+results files of each scenario again. Scenarios solved more than once keep all their records: queries return the last one
+"""
+from contextlib import contextmanager
+from datetime import datetime
+import json, os, sqlite3
+import pandas as pd
+from OptiENEA.classes.telemetry import to_json_value
+
+
+class ResultsDatabase:
+    FILENAME = 'results.sqlite'
+    CATEGORIES = ('input', 'kpi', 'unit')
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS runs (
+            run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            scenario TEXT NOT NULL,
+            run_name TEXT,
+            timestamp TEXT,
+            solve_result TEXT,
+            metadata TEXT);
+        CREATE TABLE IF NOT EXISTS results (
+            run_id INTEGER NOT NULL REFERENCES runs (run_id),
+            category TEXT NOT NULL,
+            name TEXT NOT NULL,
+            item TEXT NOT NULL,
+            value REAL);
+        CREATE INDEX IF NOT EXISTS results_of_run ON results (run_id);
+        '''
+
+    def __init__(self, folder: str):
+        self.path = os.path.join(folder, self.FILENAME)
+        with self.connect() as connection:
+            connection.executescript(self.SCHEMA)
+
+    @contextmanager
+    def connect(self):
+        # A connection to the database, whose changes are committed (or rolled back, on errors) and which is closed on exit
+        connection = sqlite3.connect(self.path)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def append(self, scenario, run_name: str, inputs: dict, kpis: pd.DataFrame, units: pd.DataFrame, metadata: dict):
+        """
+        Appends the results of a solved scenario
+        :param: scenario  The scenario (as in the index of the scenarios description)
+        :param: inputs    The values of the parameters of the scenario, by name
+        :param: kpis      The KPIs of the run, indexed by KPI, with a Value column (as OptimizationOutput.kpis)
+        :param: units     The output variables indexed over the units, with one column per variable (as OptimizationOutput.units)
+        :param: metadata  The metadata of the solve (e.g. the solver settings). Its "solve result" is also stored in its own column
+        """
+        rows = [('input', name, '', value) for name, value in inputs.items()]
+        rows += [('kpi', name, '', value) for name, value in kpis['Value'].items()]
+        units = units.stack().dropna()
+        rows += [('unit', variable, str(unit), value) for (unit, variable), value in units.items()]
+        with self.connect() as connection:
+            cursor = connection.execute('INSERT INTO runs (scenario, run_name, timestamp, solve_result, metadata) VALUES (?, ?, ?, ?, ?)',
+                                        (str(scenario), run_name, datetime.now().isoformat(timespec = 'seconds'),
+                                         metadata.get('solve result'), json.dumps(to_json_value(metadata))))
+            connection.executemany('INSERT INTO results (run_id, category, name, item, value) VALUES (?, ?, ?, ?, ?)',
+                                   [(cursor.lastrowid, category, name, item, to_float(value)) for category, name, item, value in rows])
+
+    def runs(self) -> pd.DataFrame:
+        # The last run of each scenario, indexed by scenario, with its name, timestamp, solve result and metadata
+        query = 'SELECT * FROM runs WHERE run_id IN (SELECT MAX(run_id) FROM runs GROUP BY scenario) ORDER BY run_id'
+        with self.connect() as connection:
+            runs = pd.read_sql_query(query, connection, index_col = 'scenario')
+        runs['metadata'] = runs['metadata'].map(json.loads)
+        return runs
+
+    def results(self, categories: tuple = CATEGORIES) -> pd.DataFrame:
+        # The results of the last run of each scenario, in long form: one row per scenario, category, name and item
+        query = f'''
+            SELECT runs.scenario, results.category, results.name, results.item, results.value FROM results
+            JOIN runs ON runs.run_id = results.run_id
+            WHERE results.run_id IN (SELECT MAX(run_id) FROM runs GROUP BY scenario)
+            AND results.category IN ({", ".join("?" for _ in categories)})'''
+        with self.connect() as connection:
+            return pd.read_sql_query(query, connection, params = list(categories))
+
+
+def to_float(value) -> float | None:
+    # Values that are not numbers (e.g. text inputs) are stored as NULL
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
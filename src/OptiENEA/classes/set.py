@@ -1,8 +1,6 @@
 from collections import defaultdict
-import os, yaml
-
-with open(f'{os.path.dirname(os.path.realpath(__file__))}\\..\\lib\\default_entities.yml') as stream:
-    DEFAULT_ENTITIES = yaml.safe_load(stream)
+import numpy as np
+from OptiENEA.helpers.helpers import load_library_data
 
 class Set:
     name: str
@@ -20,10 +18,47 @@ class Set:
 
     def append(self, value, subset: str | None = None):
         if subset is None:
+            if not isinstance(self.content, set):
+                self.content = set(self.content.tolist() if isinstance(self.content, np.ndarray) else self.content)
             self.content.add(value)
         else:
+            if not isinstance(self.content[subset], set):
+                self.content[subset] = set(self.content[subset].tolist() if isinstance(self.content[subset], np.ndarray) else self.content[subset])
             self.content[subset].add(value)
 
+    def extend(self, values, subset: str | None = None):
+        """
+        Adds several values to the set (or to one of its subsets, for indexed sets) at once.
+        If the (sub)set is empty, a range or a NumPy array is kept as is (arrays are sorted and made unique), so that
+        large sets of integers are never converted element by element. Otherwise, the values are added to the existing content
+        """
+        current = self.content if subset is None else self.content.get(subset)
+        if current is None or len(current) == 0:
+            if isinstance(values, range):
+                new_content = values
+            elif isinstance(values, np.ndarray):
+                new_content = np.unique(values)
+            else:
+                new_content = set(values)
+        else:
+            new_content = set(current.tolist() if isinstance(current, np.ndarray) else current)
+            new_content.update(values.tolist() if isinstance(values, np.ndarray) else values)
+        if subset is None:
+            self.content = new_content
+        else:
+            self.content[subset] = new_content
+
+    def set_range(self, start: int, stop: int, step: int = 1, subset: str | None = None):
+        # Sets the content of the set (or of one of its subsets) to the contiguous integers start, start + step, ... < stop
+        if subset is None:
+            self.content = range(start, stop, step)
+        else:
+            self.content[subset] = range(start, stop, step)
+
+    def is_empty(self):
+        # Checks if the set is empty of data
+        return len(self.content) == 0
+
     def write(self, output_string):
         if isinstance(self.content, set):
             output_string += f'set {self.name} := {self.content};\n'
@@ -38,6 +73,6 @@ class Set:
         Intializes the full list of problem parameters
         """
         problem_sets = {}
-        for set_name, indexing in DEFAULT_ENTITIES['SETS'].items():
+        for set_name, indexing in load_library_data('default_entities.yml')['SETS'].items():
             problem_sets[set_name] = Set(set_name, indexing)
         return problem_sets
\ No newline at end of file
@@ -0,0 +1,76 @@
+from dataclasses import dataclass, fields, replace
+
+
+@dataclass(frozen=True)
+class SolverOptions:
+    """
+    The options passed to the solver, read from the "Solver options" block of the general settings:
+      - threads: number of threads used by the solver
+      - mip_gap, mip_gap_abs: relative and absolute optimality gap at which a MIP is considered solved
+      - time_limit: maximum solve time [s]. When it is reached, the solve result is "limit"
+      - presolve: if False, the presolve is switched off
+      - algorithm: LP algorithm, either "simplex" or "ipm"
+      - parallel: if True, the simplex is run in parallel
+      - extra: further options, passed as they are to the AMPL solver driver (e.g. "outlev=1")
+    Options left to None keep the default of the solver
+    """
+    threads: int | None = None
+    mip_gap: float | None = None
+    mip_gap_abs: float | None = None
+    time_limit: float | None = None
+    presolve: bool | None = None
+    algorithm: str | None = None
+    parallel: bool | None = None
+    extra: str = ''
+
+    # Names of the options in general.yml
+    SETTINGS_NAMES = {'Threads': 'threads', 'MIP gap': 'mip_gap', 'MIP absolute gap': 'mip_gap_abs', 'Time limit': 'time_limit',
+                      'Presolve': 'presolve', 'Algorithm': 'algorithm', 'Parallel': 'parallel', 'Extra': 'extra'}
+    # Names of the options of the AMPL solver drivers (the ones shared by the drivers based on the AMPL MP library, such as highs, gurobi or cplex)
+    AMPL_NAMES = {'threads': 'threads', 'mip_gap': 'mip:gap', 'mip_gap_abs': 'mip:gapabs', 'time_limit': 'lim:time',
+                  'presolve': 'pre:solve', 'algorithm': 'alg:solver', 'parallel': 'alg:parallel'}
+
+    def __post_init__(self):
+        # Values are checked (and on/off strings converted to booleans) as soon as the options are created
+        for name in ('presolve', 'parallel'):
+            value = getattr(self, name)
+            if isinstance(value, str):
+                if value.lower() not in ('on', 'off'):
+                    raise ValueError(f'The {name} solver option should be either "on" or "off". {value} was provided')
+                object.__setattr__(self, name, value.lower() == 'on')
+        if self.threads is not None and (not isinstance(self.threads, int) or self.threads < 1):
+            raise ValueError(f'The threads solver option should be a positive integer. {self.threads} was provided')
+        for name in ('mip_gap', 'mip_gap_abs', 'time_limit'):
+            if getattr(self, name) is not None and not getattr(self, name) >= 0:
+                raise ValueError(f'The {name} solver option should be a non-negative number. {getattr(self, name)} was provided')
+        if self.algorithm is not None:
+            object.__setattr__(self, 'algorithm', str(self.algorithm).lower())
+            if self.algorithm not in ('simplex', 'ipm'):
+                raise ValueError(f'The algorithm solver option should be either "simplex" or "ipm". {self.algorithm} was provided')
+
+    @classmethod
+    def from_settings(cls, settings: dict | None) -> 'SolverOptions':
+        # Reads the "Solver options" block of general.yml
+        settings = settings or {}
+        unknown = set(settings) - set(cls.SETTINGS_NAMES)
+        if unknown:
+            raise ValueError(f'Unknown solver options: {", ".join(sorted(unknown))}. Valid options are {", ".join(cls.SETTINGS_NAMES)}')
+        return cls(**{cls.SETTINGS_NAMES[name]: value for name, value in settings.items()})
+
+    def updated(self, **options) -> 'SolverOptions':
+        return replace(self, **options)
+
+    def to_dict(self) -> dict:
+        # The options that are set, by name
+        return {option.name: getattr(self, option.name) for option in fields(self) if getattr(self, option.name) not in (None, '')}
+
+    def to_ampl(self) -> str:
+        # The options as a string for the <solver>_options option of AMPL
+        options = []
+        for name, value in self.to_dict().items():
+            if name == 'extra':
+                continue
+            if isinstance(value, bool):
+                value = 'on' if value else 'off'
+            options.append(f'{self.AMPL_NAMES[name]}={value}')
+        return ' '.join(options + ([self.extra] if self.extra else []))
@@ -0,0 +1,135 @@
+import os, pickle, time
+from dataclasses import dataclass, field
+from typing import Any, Callable
+from OptiENEA.classes.input_cache import InputCache
+from OptiENEA.helpers.helpers import fingerprint
+
+
+@dataclass
+class Stage:
+    """
+    A step of the problem workflow
+      - run: function executing the stage on the problem
+      - inputs: function returning the data the stage reads from the problem (they are fingerprinted)
+      - outputs: names of the problem attributes written by the stage, restored when the stage is skipped
+      - depends_on: names of the stages whose outputs are used by this stage
+      - persistent: if True, the outputs are also saved on disk, so that they can be re-used by other problem instances
+    """
+    name: str
+    run: Callable[[], None]
+    inputs: Callable[[], Any] = lambda: None
+    outputs: tuple = ()
+    depends_on: tuple = ()
+    persistent: bool = False
+
+
+@dataclass
+class StageRecord:
+    # Memoized result of a stage: the fingerprint of its inputs and the values of its outputs
+    fingerprint: str
+    outputs: dict = field(default_factory = dict)
+
+
+class StagePipeline:
+    """
+    Runs a sequence of stages on a problem, skipping the stages whose inputs did not change since the last run.
+    The fingerprint of each stage is computed from its own inputs and from the fingerprints of the stages it depends on,
+    so that a change in a stage invalidates all the stages downstream of it, and only them.
+    Results are memoized in memory, while persistent stages are also stored in the cache folder
+    """
+    problem: Any
+    stages: dict[str, Stage]
+    memo: dict[str, StageRecord]
+    fingerprints: dict[str, str]
+    report: dict[str, str]
+    durations: dict[str, float]
+
+    def __init__(self, problem, stages: list[Stage], cache_folder: str | None = None):
+        self.problem = problem
+        self.stages = {stage.name: stage for stage in stages}
+        self.cache_folder = cache_folder
+        self.memo = {}
+        self.fingerprints = {}
+        self.report = {}
+        self.durations = {}  # Seconds spent in each stage during the last run (skipped stages included)
+
+    def run(self, until: str | None = None, verbose: bool = False):
+        """
+        Runs the stages in order, re-executing only those whose fingerprint changed
+        :param: until     Name of the last stage to run. If None, all stages are run
+        :param: verbose   If True, prints which stages were executed and which were skipped
+        """
+        self.fingerprints = {}
+        self.report = {}
+        self.durations = {}
+        for stage in self.stages.values():
+            start = time.perf_counter()
+            self.run_stage(stage)
+            self.durations[stage.name] = time.perf_counter() - start
+            if stage.name == until:
+                break
+        if verbose:
+            print(self.format_report())
+
+    def run_stage(self, stage: Stage):
+        stage_fingerprint = fingerprint(stage.name, stage.inputs(), [self.fingerprints[name] for name in stage.depends_on])
+        self.fingerprints[stage.name] = stage_fingerprint
+        record = self.memo.get(stage.name)
+        if record is not None and record.fingerprint == stage_fingerprint:
+            self.restore_outputs(record)
+            self.report[stage.name] = 'hit'
+            return
+        if stage.persistent:
+            record = self.load_record(stage, stage_fingerprint)
+            if record is not None:
+                self.memo[stage.name] = record
+                self.restore_outputs(record)
+                self.report[stage.name] = 'hit (disk)'
+                return
+        stage.run()
+        self.memo[stage.name] = StageRecord(stage_fingerprint, {name: getattr(self.problem, name) for name in stage.outputs})
+        if stage.persistent:
+            self.save_record(stage, self.memo[stage.name])
+        self.report[stage.name] = 'miss'
+
+    def restore_outputs(self, record: StageRecord):
+        for name, value in record.outputs.items():
+            setattr(self.problem, name, value)
+
+    def replace_outputs(self, stage_name: str, **outputs):
+        # Replaces some of the memoized outputs of a stage, which are then restored instead of the original ones when the stage is skipped.
+        # The record is replaced and not modified, as it can be shared with other pipelines (e.g. of cloned problems)
+        record = self.memo[stage_name]
+        self.memo[stage_name] = StageRecord(record.fingerprint, record.outputs | outputs)
+
+    def invalidate(self, stage_name: str | None = None):
+        # Removes the memoized results of a stage (or of all stages), forcing them to be run again
+        if stage_name is None:
+            self.memo = {}
+        else:
+            self.memo.pop(stage_name, None)
+
+    def record_path(self, stage: Stage, stage_fingerprint: str) -> str:
+        return os.path.join(self.cache_folder, f'stage_{stage.name}_{stage_fingerprint}.pkl')
+
+    def load_record(self, stage: Stage, stage_fingerprint: str) -> StageRecord | None:
+        if self.cache_folder is None or not os.path.isfile(self.record_path(stage, stage_fingerprint)):
+            return None
+        try:
+            with open(self.record_path(stage, stage_fingerprint), 'rb') as stream:
+                return StageRecord(stage_fingerprint, pickle.load(stream))
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return None
+
+    def save_record(self, stage: Stage, record: StageRecord):
+        if self.cache_folder is None:
+            return
+        InputCache(self.cache_folder).write_atomic(
+            self.record_path(stage, record.fingerprint),
+            lambda stream: pickle.dump(record.outputs, stream, protocol = pickle.HIGHEST_PROTOCOL))
+
+    def format_report(self) -> str:
+        hits = sum(status != 'miss' for status in self.report.values())
+        lines = [f'Stages: {hits} skipped, {len(self.report) - hits} executed']
+        lines += [f'  {name:<20} {status}' for name, status in self.report.items()]
+        return '\n'.join(lines)
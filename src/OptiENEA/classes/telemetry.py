@@ -0,0 +1,102 @@
+"""
+Telemetry of the runs: each solved problem produces a record with the size of its model, the time spent in each step
+of the run and the statistics of the solver. Records are appended to a JSON lines file in the results folder, so that
+runs (e.g. all the scenarios of a parametric run) can be compared afterwards, without running them again
+"""
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+import json, math, os, sys
+import numpy as np
+import pandas as pd
+from OptiENEA.helpers.helpers import fingerprint
+
+
+@dataclass
+class RunTelemetry:
+    """
+    The record of a run:
+      - model_fingerprint: hash of the data the model is built from (interpreter, objective, sets and parameters)
+      - model: numbers of variables, constraints and binaries, before and after presolve (None if not available)
+      - seconds: time spent in each of the STEPS of the run. Steps skipped because their inputs did not change take no time
+      - solver: solver, solve result, objective, MIP gap and iteration counts (None if not reported by the solver)
+      - peak_rss_mb: peak resident memory of the process [MB], None where it cannot be measured (e.g. on Windows)
+    """
+    run_name: str
+    problem_name: str
+    timestamp: str
+    interpreter: str
+    model_fingerprint: str
+    model: dict = field(default_factory = dict)
+    seconds: dict = field(default_factory = dict)
+    solver: dict = field(default_factory = dict)
+    peak_rss_mb: float | None = None
+
+    FILENAME = 'telemetry.jsonl'
+    STEPS = ('data build', 'model evaluation', 'data transfer', 'solve', 'output extraction')
+    MODEL_STATISTICS = ('variables', 'constraints', 'binaries', 'presolved variables', 'presolved constraints', 'presolved binaries')
+
+    @classmethod
+    def from_problem(cls, problem) -> 'RunTelemetry':
+        # The record of the last run of a problem. The statistics are provided by the interpreter (see solve_statistics)
+        statistics = problem.ampl_problem.solve_statistics()
+        return cls(run_name = problem.run_name,
+                   problem_name = problem.name,
+                   timestamp = datetime.now().isoformat(timespec = 'seconds'),
+                   interpreter = problem.interpreter,
+                   model_fingerprint = model_fingerprint(problem),
+                   model = {name: statistics.pop(name, None) for name in cls.MODEL_STATISTICS},
+                   seconds = {step: problem.timings.get(step, 0.0) for step in cls.STEPS},
+                   solver = {'solver': problem.solver, 'solve result': problem.ampl_problem.solve_result} | statistics,
+                   peak_rss_mb = peak_rss_mb())
+
+    def append_to(self, folder: str):
+        # Appends the record as one line of the telemetry file of the folder
+        with open(os.path.join(folder, self.FILENAME), 'a', encoding = 'utf-8') as stream:
+            stream.write(json.dumps(to_json_value(asdict(self))) + '\n')
+
+
+def read_telemetry(folder: str) -> pd.DataFrame:
+    """
+    Reads the telemetry file of a results folder, with one row per run and one column per field
+    (nested fields are flattened, e.g. "seconds.solve" or "model.presolved variables")
+    """
+    with open(os.path.join(folder, RunTelemetry.FILENAME), 'r', encoding = 'utf-8') as stream:
+        records = [json.loads(line) for line in stream if line.strip()]
+    return pd.json_normalize(records)
+
+
+def model_fingerprint(problem) -> str:
+    # Sets are sorted first, as the order of their elements changes from one Python process to the next
+    sets = {name: sorted_content(problem.sets[name].content) for name in sorted(problem.sets)}
+    parameters = {name: problem.parameters[name].content for name in sorted(problem.parameters)}
+    return fingerprint(problem.interpreter, problem.objective.name, problem.additional_constraints_data, sets, parameters)
+
+
+def sorted_content(content):
+    if isinstance(content, (set, frozenset)):
+        return sorted(content, key = str)
+    if isinstance(content, dict):
+        return {key: sorted_content(content[key]) for key in sorted(content, key = str)}
+    return content
+
+
+def peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:  # Not available on Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024  # Bytes on macOS, kilobytes on Linux
+
+
+def to_json_value(value):
+    # NumPy scalars are converted to Python numbers, and NaN or infinite values (not valid in JSON) to None
+    if isinstance(value, dict):
+        return {str(key): to_json_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json_value(item) for item in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
@@ -0,0 +1,214 @@
+import heapq
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+import numpy as np
+import pandas as pd
+from OptiENEA.classes.timeseries_store import TimeSeriesStore
+
+
+@dataclass
+class TimeStepAggregationConfig:
+    """
+    Settings of the time step aggregation:
+      - n_segments: target number of segments (per typical period, if the problem has typical periods)
+      - tolerance: maximum root-mean-square deviation between the aggregated and the original series,
+                   measured on the standardized series (e.g. 0.1 = 10% of the standard deviation of each series)
+      - var_weights: per-variable weights in the similarity measure, keyed by (unit, variable, layer)
+    Consecutive time steps are merged until the target number of segments is reached or until a further
+    merge would exceed the tolerance, whichever comes first. At least one of the two must be provided
+    """
+    n_segments: Optional[int] = None
+    tolerance: Optional[float] = None
+    var_weights: Dict[tuple, float] = field(default_factory=dict)
+    eps: float = 1e-9
+
+    def __post_init__(self):
+        if self.n_segments is None and self.tolerance is None:
+            raise ValueError('The time step aggregation requires either a target number of segments or an error tolerance')
+        if self.n_segments is not None and int(self.n_segments) < 1:
+            raise ValueError(f'The number of segments of the time step aggregation should be at least 1. {self.n_segments} was provided')
+
+
+@dataclass(frozen=True)
+class TimeStepAggregation:
+    """
+    Result of the time step aggregation:
+      - segment_starts: array [S] with the position of the first original time step of each segment
+      - durations: array [S] with the duration of each segment (sum of the durations of the merged time steps)
+      - block_starts: array [B] with the position of the first time step of each block (typical period, or the whole horizon)
+      - n_steps: number of original time steps
+      - store: the time series store at the resolution of the segments, with energy-conserving (duration-weighted) averages
+      - has_typical_periods: True if the blocks are typical periods
+    """
+    segment_starts: np.ndarray
+    durations: np.ndarray
+    block_starts: np.ndarray
+    n_steps: int
+    store: TimeSeriesStore
+    has_typical_periods: bool = False
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def n_segments(self) -> int:
+        return int(self.segment_starts.shape[0])
+
+    @property
+    def lengths(self) -> np.ndarray:
+        # Number of original time steps in each segment
+        return np.diff(np.append(self.segment_starts, self.n_steps))
+
+    @property
+    def block_of_segment(self) -> np.ndarray:
+        return np.searchsorted(self.block_starts, self.segment_starts, side='right') - 1
+
+    @property
+    def segments_per_block(self) -> np.ndarray:
+        return np.bincount(self.block_of_segment, minlength=len(self.block_starts))
+
+    def segment_index(self) -> pd.Index:
+        # Index of the segments, as used for the timeSteps (or typicalPeriods, timeStepsOfPeriod) sets
+        if not self.has_typical_periods:
+            return pd.RangeIndex(self.n_segments, name='timeSteps')
+        counts = self.segments_per_block
+        return pd.MultiIndex.from_arrays(
+            [np.repeat(np.arange(len(counts)), counts), np.concatenate([np.arange(c) for c in counts])],
+            names=['typicalPeriods', 'timeStepsOfPeriod'])
+
+    def duration_series(self) -> pd.Series:
+        # The durations of the segments, in the format used by the TIME_STEP_DURATION parameter
+        return pd.Series(self.durations, index=self.segment_index(), name='TIME_STEP_DURATION')
+
+    def aggregate(self, values: np.ndarray, weights: Optional[np.ndarray] = None) -> np.ndarray:
+        # Returns the (weighted) average of the values over each segment. Values have one element per original time step
+        values = np.asarray(values, dtype=float)
+        weights = np.ones(self.n_steps) if weights is None else np.asarray(weights, dtype=float)
+        return np.add.reduceat(values * weights, self.segment_starts) / np.add.reduceat(weights, self.segment_starts)
+
+    def expand(self, values: np.ndarray) -> np.ndarray:
+        # Returns the values of each segment repeated over the original time steps it represents
+        return np.repeat(np.asarray(values), self.lengths)
+
+    def expand_dataframe(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Expands a DataFrame indexed over the segments (e.g. optimization results) back to the original time steps.
+        Without typical periods, the result is indexed over the original time steps. With typical periods, it is indexed
+        over (typical period, time step of the period), with one row per original time step of each period
+        """
+        df = df.reindex(self.segment_index())
+        output = df.iloc[np.repeat(np.arange(self.n_segments), self.lengths)]
+        if not self.has_typical_periods:
+            output.index = pd.RangeIndex(self.n_steps)
+        else:
+            block_lengths = np.diff(np.append(self.block_starts, self.n_steps))
+            output.index = pd.MultiIndex.from_arrays(
+                [np.repeat(np.arange(len(block_lengths)), block_lengths), np.concatenate([np.arange(l) for l in block_lengths])],
+                names=df.index.names)
+        return output
+
+
+class TimeStepAggregator:
+    """
+    Merges consecutive, similar time steps into segments of variable length.
+    The merging is agglomerative: at each iteration, the two adjacent segments whose merge increases the least the
+    squared deviation from the original (standardized) series are merged, similarly to Ward clustering constrained to
+    keep the chronological order. Segments never span two blocks (e.g. two typical periods), so that the chronology
+    needed by the storage constraints is kept within each block
+    """
+
+    def __init__(self, config: TimeStepAggregationConfig):
+        self.config = config
+
+    def build(self, store: TimeSeriesStore, durations: np.ndarray | float = 1.0, block_length: Optional[int] = None,
+              exclude: tuple = ()) -> TimeStepAggregation:
+        """
+        :param: store          The time series to aggregate
+        :param: durations      The duration of each time step of the store (or a single value for all of them)
+        :param: block_length   The number of time steps of each block (typical period). If None, the whole horizon is one block
+        :param: exclude        Keys of the store that are neither used to measure similarity nor included in the aggregated store
+        """
+        n_steps = store.n_steps
+        durations = np.broadcast_to(np.asarray(durations, dtype=float), (n_steps,))
+        block_starts = np.arange(0, n_steps, block_length) if block_length else np.zeros(1, dtype=int)
+        keys = [key for key in store.keys if key not in exclude]
+        features = self.build_features(store, keys, durations)
+        segment_starts, error = self.segment(features, durations, block_starts)
+        columns = {key: np.add.reduceat(store.get_array(key) * durations, segment_starts) / np.add.reduceat(durations, segment_starts) for key in keys}
+        aggregated_store = TimeSeriesStore.from_columns(columns, len(segment_starts))
+        aggregation = TimeStepAggregation(
+            segment_starts=segment_starts,
+            durations=np.add.reduceat(durations, segment_starts),
+            block_starts=block_starts,
+            n_steps=n_steps,
+            store=aggregated_store,
+            has_typical_periods=block_length is not None,
+            meta={'n_steps': n_steps, 'n_segments': len(segment_starts), 'rms_error': error})
+        aggregated_store.source = aggregation
+        return aggregation
+
+    def build_features(self, store: TimeSeriesStore, keys: list, durations: np.ndarray) -> np.ndarray:
+        # Returns the standardized, weighted series as an array [n_steps, n_features]. Constant series are ignored
+        features = np.zeros((store.n_steps, len(keys)))
+        for id, key in enumerate(keys):
+            values = store.get_array(key).astype(float)
+            mean = np.average(values, weights=durations)
+            std = np.sqrt(np.average((values - mean) ** 2, weights=durations))
+            if std > self.config.eps:
+                features[:, id] = float(self.config.var_weights.get(key, 1.0)) * (values - mean) / std
+        return features
+
+    def segment(self, features: np.ndarray, weights: np.ndarray, block_starts: np.ndarray) -> tuple[np.ndarray, float]:
+        """
+        Returns the position of the first time step of each segment and the root-mean-square error of the aggregation
+        :param: features       Array [n_steps, n_features]
+        :param: weights        Array [n_steps] with the weight (duration) of each time step
+        :param: block_starts   Positions of the first time step of each block
+        """
+        n_steps, n_features = features.shape
+        block = np.zeros(n_steps, dtype=int)
+        block[block_starts[1:]] = 1
+        block = np.cumsum(block)
+        target = self.config.n_segments
+        segments_in_block = np.bincount(block, minlength=len(block_starts))
+        # Each segment is stored at the position of its first time step, with its total weight and weighted sum of features
+        weight = weights.astype(float).copy()
+        total = features * weights[:, None]
+        next_segment = np.arange(1, n_steps + 1)
+        previous_segment = np.arange(-1, n_steps - 1)
+        alive = np.ones(n_steps, dtype=bool)
+        version = np.zeros(n_steps, dtype=int)
+        max_error = np.inf if self.config.tolerance is None else self.config.tolerance ** 2 * weights.sum() * max(n_features, 1)
+
+        def merge_cost(a: int, b: int) -> float:
+            difference = total[a] / weight[a] - total[b] / weight[b]
+            return float(weight[a] * weight[b] / (weight[a] + weight[b]) * difference @ difference)
+
+        # Initial costs of merging each pair of consecutive time steps, computed at once
+        mergeable = np.flatnonzero(block[:-1] == block[1:])
+        differences = features[mergeable] - features[mergeable + 1]
+        costs = weights[mergeable] * weights[mergeable + 1] / (weights[mergeable] + weights[mergeable + 1]) * (differences ** 2).sum(axis=1)
+        heap = [(float(cost), int(a), int(a) + 1, 0, 0) for cost, a in zip(costs, mergeable)]
+        heapq.heapify(heap)
+        error = 0.0
+        while heap:
+            cost, a, b, version_a, version_b = heapq.heappop(heap)
+            if not (alive[a] and alive[b]) or version[a] != version_a or version[b] != version_b:
+                continue  # Outdated: one of the two segments was merged in the meantime
+            if target is not None and segments_in_block[block[a]] <= target:
+                continue
+            if error + cost > max_error:
+                break  # All remaining merges cost at least as much
+            # Merging segment b into segment a
+            weight[a] += weight[b]
+            total[a] += total[b]
+            alive[b] = False
+            next_segment[a] = next_segment[b]
+            if next_segment[a] < n_steps:
+                previous_segment[next_segment[a]] = a
+            version[a] += 1
+            segments_in_block[block[a]] -= 1
+            error += cost
+            for left, right in ((previous_segment[a], a), (a, next_segment[a])):
+                if 0 <= left and right < n_steps and block[left] == block[right]:
+                    heapq.heappush(heap, (merge_cost(left, right), int(left), int(right), int(version[left]), int(version[right])))
+        rms_error = float(np.sqrt(error / (weights.sum() * max(n_features, 1))))
+        return np.flatnonzero(alive), rms_error
@@ -0,0 +1,208 @@
+import csv, hashlib
+import numpy as np
+import pandas as pd
+from OptiENEA.helpers.helpers import key_tuple_to_dotted
+
+HEADER_ROWS = 3  # Unit name, Variable name, Layer name
+
+
+class TimeSeriesStore:
+    """
+    Problem-level registry of the time series data.
+    All series are kept in a single NumPy block of shape [n_series, n_steps], where each row
+    is identified by its (unit, variable, layer) key. Identical series are stored only once,
+    and units read zero-copy views of the block rows instead of copying the data
+    """
+    data: np.ndarray
+    keys: dict
+    units: dict
+    source: object
+    index: pd.Index
+    column_names: list
+
+    def __init__(self, data: np.ndarray, keys: dict, source = None, index: pd.Index | None = None, column_names: list | None = None):
+        """
+        :param: data          Array [n_series, n_steps] with the (unique) time series. Can also be a read-only memory map
+        :param: keys          Dictionary mapping each (unit, variable, layer) key to its row in data
+        :param: source        The object the store was built from (used to check if the store is still up to date)
+        :param: index         The index of the time steps, as read from the input file. If None, a RangeIndex is used
+        :param: column_names  The names of the levels of the keys, as read from the input file
+        """
+        self.data = data
+        if self.data.flags.writeable:
+            self.data.flags.writeable = False  # Rows can be shared by several keys, so they should never be modified in place
+        self.keys = keys
+        self.source = source
+        self.index = index if index is not None else pd.RangeIndex(data.shape[1])
+        self.column_names = column_names if column_names is not None else [None] * max([len(key) for key in keys] + [1])
+        self.content_hash = None
+        self.units = {}
+        for key, row in self.keys.items():
+            if len(key) == 3:
+                self.units.setdefault(key[0], {})[(key[1], key[2])] = row
+
+    def __contains__(self, key: tuple):
+        return key in self.keys
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def n_steps(self) -> int:
+        return int(self.data.shape[1])
+
+    @property
+    def n_unique(self) -> int:
+        return int(self.data.shape[0])
+
+    def has_unit(self, unit_name: str) -> bool:
+        return unit_name in self.units
+
+    def variables_of_unit(self, unit_name: str) -> dict:
+        # Returns a dictionary (variable, layer) -> row for all time series of the unit
+        return self.units.get(unit_name, {})
+
+    def get_array(self, key: tuple) -> np.ndarray:
+        # Returns a read-only view of the time series with the given key
+        return self.data[self.keys[key]]
+
+    def get(self, unit_name: str, variable: str, layer: str) -> pd.Series:
+        # Returns the required time series as a pandas Series that shares memory with the store
+        key = (unit_name, variable, layer)
+        return pd.Series(self.get_array(key), index = pd.RangeIndex(self.n_steps), name = key_tuple_to_dotted(key), copy = False)
+
+    def get_series(self, key: tuple) -> pd.Series:
+        # Returns the time series with the given key, with the original index of the time steps. The data are not copied
+        return pd.Series(self.get_array(key), index = self.index, name = key, copy = False)
+
+    def unit_series(self, unit_name: str) -> dict | None:
+        # Returns all the time series of the unit as a dictionary (variable, layer) -> pd.Series, or None if the unit has no time series
+        if not self.has_unit(unit_name):
+            return None
+        return {(variable, layer): self.get(unit_name, variable, layer) for (variable, layer) in self.variables_of_unit(unit_name)}
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Returns the time series as a DataFrame with one column per key, as read from the timeseries_data.csv file.
+        If no series was de-duplicated, the DataFrame is a (read-only) view of the store and no data is copied
+        """
+        rows = np.fromiter(self.keys.values(), dtype = np.intp, count = len(self.keys))
+        values = self.data if np.array_equal(rows, np.arange(self.n_unique)) else self.data[rows]
+        if len(self.column_names) > 1:
+            columns = pd.MultiIndex.from_tuples(list(self.keys), names = self.column_names)
+        else:
+            columns = pd.Index([key[0] for key in self.keys], name = self.column_names[0])
+        return pd.DataFrame(values.T, index = self.index, columns = columns, copy = False)
+
+    def fingerprint(self) -> tuple:
+        # Returns a hash of the content of the store, computed row by row (so that memory maps are never loaded as a whole)
+        if self.content_hash is None:
+            digest = hashlib.blake2b(digest_size = 16)
+            digest.update(f'{self.data.dtype.str}{self.data.shape}'.encode())
+            for row in self.data:
+                digest.update(memoryview(np.ascontiguousarray(row)))
+            self.content_hash = digest.hexdigest()
+        return (self.content_hash, list(self.keys.items()), self.index.tolist())
+
+    @classmethod
+    def from_array(cls, data: np.ndarray, column_keys: list, source = None, index: pd.Index | None = None, column_names: list | None = None):
+        """
+        Creates the store from an array [n_series, n_steps] with one row per key, removing duplicated series.
+        The array is used as is (without copies) if no series is duplicated
+        """
+        keys = {}
+        unique_rows = []
+        rows_by_digest = {}
+        for id, key in enumerate(column_keys):
+            values = data[id]
+            digest = hashlib.blake2b(memoryview(np.ascontiguousarray(values)), digest_size = 16).digest()
+            row = None
+            for candidate in rows_by_digest.get(digest, []):
+                if np.array_equal(data[unique_rows[candidate]], values, equal_nan = True):
+                    row = candidate
+                    break
+            if row is None:
+                row = len(unique_rows)
+                unique_rows.append(id)
+                rows_by_digest.setdefault(digest, []).append(row)
+            keys[key] = row
+        if len(unique_rows) < len(column_keys):
+            data = data[unique_rows]
+        return cls(data, keys, source, index, column_names)
+
+    @classmethod
+    def from_columns(cls, columns: dict, n_steps: int, source = None):
+        """
+        Creates the store from a dictionary key -> 1D array, removing duplicated series
+        """
+        data = np.empty((len(columns), n_steps), dtype = float)
+        for id, (key, values) in enumerate(columns.items()):
+            values = np.asarray(values, dtype = float)
+            if values.shape != (n_steps,):
+                raise ValueError(f'The time series {key} has {values.size} values, while {n_steps} were expected')
+            data[id] = values
+        return cls.from_array(data, list(columns.keys()), source)
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame):
+        """
+        Creates the store from the raw time series data, as read from the timeseries_data.csv file
+        """
+        if df.empty:
+            return cls(np.empty((0, len(df.index)), dtype = float), {}, df, df.index, list(df.columns.names))
+        values = np.ascontiguousarray(df.to_numpy(dtype = float).T)  # [n_series, n_steps]
+        column_keys = [tuple(col) if isinstance(col, tuple) else (col,) for col in df.columns]
+        return cls.from_array(values, column_keys, df, df.index, list(df.columns.names))
+
+    @classmethod
+    def from_csv(cls, path: str, dtype = np.float64, chunk_size: int = 100_000):
+        """
+        Reads the time series data from a csv file in the timeseries_data.csv format (three header rows and one column
+        per series, separated by ";"). The file is parsed in chunks of rows, written directly into a preallocated
+        array [n_series, n_steps], so that no full-size DataFrame is ever created
+        :param: dtype        The data type of the values (e.g. np.float32, to halve the memory use)
+        :param: chunk_size   Number of rows parsed at once
+        """
+        with open(path, 'r', newline = '') as stream:
+            reader = csv.reader(stream, delimiter = ';')
+            header = [next(reader) for _ in range(HEADER_ROWS)]
+        column_names = [row[0] for row in header]
+        column_keys = list(zip(*[row[1:] for row in header]))
+        n_steps = TimeSeriesStore.count_data_rows(path)
+        data = np.empty((len(column_keys), n_steps), dtype = dtype)
+        index_chunks = []
+        start = 0
+        for chunk in pd.read_csv(path, sep = ';', header = None, skiprows = HEADER_ROWS, index_col = 0, chunksize = chunk_size):
+            data[:, start : start + len(chunk.index)] = chunk.to_numpy(dtype = dtype).T
+            index_chunks.append(chunk.index)
+            start += len(chunk.index)
+        if start != n_steps:
+            data = data[:, :start]
+        index = index_chunks[0].append(index_chunks[1:]) if index_chunks else pd.RangeIndex(0)
+        index.name = None
+        if index.equals(pd.RangeIndex(len(index))):
+            index = pd.RangeIndex(len(index))
+        return cls.from_array(data, column_keys, path, index, column_names)
+
+    @staticmethod
+    def count_data_rows(path: str) -> int:
+        # Counts the (non-empty) data rows of the csv file, reading it in binary blocks
+        n_lines = 0
+        last_block = b''
+        with open(path, 'rb') as stream:
+            for block in iter(lambda: stream.read(1 << 20), b''):
+                n_lines += block.count(b'\n')
+                last_block = block
+        if last_block and not last_block.endswith(b'\n'):
+            n_lines += 1
+        return max(n_lines - HEADER_ROWS, 0)
+
+    @classmethod
+    def from_typical_periods(cls, typical_periods):
+        """
+        Creates the store from the profiles of a TypicalPeriodSet. Each profile [K, L] is flattened
+        to K*L time steps, with the time step of the period running fastest
+        """
+        n_steps = typical_periods.K * typical_periods.L
+        columns = {tuple(var) if isinstance(var, tuple) else (var,): np.reshape(profile, -1) for var, profile in typical_periods.profiles.items()}
+        return cls.from_columns(columns, n_steps, typical_periods)
@@ -7,6 +7,7 @@ from typing import Dict, List, Optional, Sequence, Tuple, Callable, Any
 import numpy as np
 import pandas as pd
 import yaml
+from OptiENEA.classes.timeseries_store import TimeSeriesStore
 
 
 # -----------------------------
@@ -147,27 +148,39 @@ class PeriodSegmenter:
           period_index: index identifying each period (e.g., each date / week start)
         """
         if not isinstance(series.index, pd.DatetimeIndex):
-            series.index = pd.date_range(start = pd.to_datetime('2023-01-01 00:00'), periods=len(series.index.values), freq = 'h')
+            series.index = self.default_index(len(series.index.values))
 
         s = series.sort_index()
-        if not self.tz_aware_ok and s.index.tz is not None:
+        self.check_index(s.index)
+        return self.segment_array(s.values, s.index)
+
+    @staticmethod
+    def default_index(n: int) -> pd.DatetimeIndex:
+        # Hourly index used when the data are not provided with timestamps
+        return pd.date_range(start = pd.to_datetime('2023-01-01 00:00'), periods = n, freq = 'h')
+
+    def check_index(self, index: pd.DatetimeIndex) -> None:
+        if not self.tz_aware_ok and index.tz is not None:
             raise ValueError("Timezone-aware indices are not allowed (set tz_aware_ok=True or localize/convert).")
 
         # Ensure hourly frequency (or at least regular). We won’t fill gaps silently.
-        diffs = s.index.to_series().diff().dropna()
+        diffs = index.to_series().diff().dropna()
         if not (diffs == pd.Timedelta(hours=1)).all():
             raise ValueError("Series must be strictly hourly with no gaps (diff != 1h found).")
 
+    def segment_array(self, values: np.ndarray, index: pd.DatetimeIndex) -> Tuple[np.ndarray, pd.Index]:
+        """
+        Same as segment, for values already sorted and checked. X is a view of values whenever possible
+        """
         # Custom: chunk from first timestamp
         L = self.hours_per_period
-        n = len(s)
+        n = len(values)
         P = n // L
         if P == 0:
             return np.empty((0, L)), pd.DatetimeIndex([])
-        trimmed = s.iloc[: P * L]
-        X = trimmed.values.reshape(P, L)
+        X = values[: P * L].reshape(P, L)
         # period labels = start time of each chunk
-        idx = trimmed.index[::L]
+        idx = index[: P * L : L]
         return X, pd.DatetimeIndex(idx)
 
 
@@ -177,7 +190,9 @@ class MultiSeriesSegmenter:
     def __init__(self, segmenter: PeriodSegmenter):
         self.segmenter = segmenter
 
-    def segment(self, data: pd.DataFrame) -> Tuple[Dict[str, np.ndarray], pd.Index]:
+    def segment(self, data: pd.DataFrame | TimeSeriesStore) -> Tuple[Dict[str, np.ndarray], pd.Index]:
+        if isinstance(data, TimeSeriesStore):
+            return self.segment_store(data)
         if not isinstance(data, pd.DataFrame):
             raise TypeError("df must be a pandas DataFrame.")
         if data.empty:
@@ -198,6 +213,26 @@ class MultiSeriesSegmenter:
         assert period_index is not None
         return segmented, period_index
 
+    def segment_store(self, store: TimeSeriesStore) -> Tuple[Dict[str, np.ndarray], pd.Index]:
+        """
+        Segments all series of a time series store. The index is checked only once, and each segmented
+        array [P, L] is a view of the store, so that no copy of the data is made
+        """
+        if len(store) == 0:
+            raise ValueError("The time series store is empty.")
+        if isinstance(store.index, pd.DatetimeIndex):
+            index = store.index
+            if not index.is_monotonic_increasing:
+                raise ValueError("The time series in the store must be sorted in time.")
+        else:
+            index = self.segmenter.default_index(store.n_steps)
+        self.segmenter.check_index(index)
+        segmented: Dict[str, np.ndarray] = {}
+        period_index: Optional[pd.Index] = None
+        for key in store.keys:
+            segmented[key], period_index = self.segmenter.segment_array(store.get_array(key), index)
+        return segmented, period_index
+
 
 # -----------------------------
 # 2) Feature building
@@ -431,7 +466,7 @@ class TypicalPeriodBuilder:
         self.feature_config = feature_config
         self.typical_config = typical_config
 
-    def build(self, data: Dict[str, pd.Series]) -> TypicalPeriodSet:
+    def build(self, data: pd.DataFrame | TimeSeriesStore) -> TypicalPeriodSet:
         # 1) segment
         seg = PeriodSegmenter(self.typical_config.period, self.typical_config.hours_per_period)
         mseg = MultiSeriesSegmenter(seg)
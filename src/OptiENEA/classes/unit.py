@@ -1,11 +1,7 @@
 from OptiENEA.classes.layer import Layer
-from OptiENEA.helpers.helpers import safe_to_list, key_tuple_to_dotted
+from OptiENEA.helpers.helpers import safe_to_list, load_library_data
 import pandas as pd
-import numpy as np
-import os, yaml, numbers
-
-with open(f'{os.path.dirname(os.path.realpath(__file__))}\\..\\lib\\units_default_values.yml') as stream:
-    UNITS_DEFAULT_DATA = yaml.safe_load(stream)
+import numbers
 
 
 class Unit:
@@ -16,7 +12,7 @@ class Unit:
     layers: list
     main_layer: str
     info: dict
-    ts_data: pd.DataFrame | None
+    ts_data: dict | None
     
     def __init__(self, name:str, info: dict, problem):
         # Assigning attribute values based on input
@@ -30,29 +26,13 @@ class Unit:
         self.convert_time_series_data()
 
     def convert_time_series_data(self):
-        if not self.problem.has_typical_periods:
-            if self.name in self.problem.raw_timeseries_data.columns:
-                self.ts_data = pd.DataFrame(index = [x for x in range(len(self.problem.raw_timeseries_data.index))])
-                self.ts_data['timeSteps'] = [x for x in range(len(self.problem.raw_timeseries_data.index))]
-                for col in self.problem.raw_timeseries_data.columns:
-                    if col[0] == self.name:
-                        self.ts_data[key_tuple_to_dotted(col)] = self.problem.raw_timeseries_data[col]
-            else:
-                self.ts_data = None
-        else:
-            if self.name in self.problem.raw_timeseries_data.columns:
-                self.ts_data = pd.DataFrame(index = [x for x in range(self.problem.typical_periods.K * self.problem.typical_periods.L)])
-                self.ts_data['typicalPeriods'] = np.repeat(np.arange(self.problem.typical_periods.K), self.problem.typical_periods.L)
-                self.ts_data['timeSteps'] = np.tile(np.arange(self.problem.typical_periods.L), self.problem.typical_periods.K)
-                for var_name, profile in self.problem.typical_periods.profiles.items():
-                    if var_name[0] == self.name:
-                        self.ts_data[key_tuple_to_dotted(var_name)] = np.reshape(profile, -1)
-            else:
-                self.ts_data = None
+        # Binds the unit to its time series in the problem-level store. No data is copied: ts_data maps each
+        # (variable, layer) pair of the unit to a view of the corresponding row of the store
+        self.ts_data = self.problem.get_timeseries_store().unit_series(self.name)
     
     def check_default_values(self, unit_type):
         # Assigns default values for the specific unit type to the related fields
-        data = UNITS_DEFAULT_DATA[unit_type]
+        data = load_library_data('units_default_values.yml')[unit_type]
         for attribute_name, default_value in data.items():
             if attribute_name not in self.info.keys():
                 self.info[attribute_name] = default_value
@@ -125,7 +105,7 @@ class Process(Unit):
                 if isinstance(power_info[0], float|int):
                     self.power[self.layers[0]] = self.info['Power']
                 elif power_info[0] == 'file':
-                    self.power[self.layers[0]] = self.ts_data.loc[:, f'{self.name}:Power:{self.layers[0]}']
+                    self.power[self.layers[0]] = self.ts_data[('Power', self.layers[0])]
                     self.has_time_dependent_power = True
                 else:
                     raise ValueError(f'The unit {self.name} only has one layer, so the input must be either a single value or the "file" string')    
@@ -137,7 +117,7 @@ class Process(Unit):
                     if isinstance(self.info['Power'][id], float|int):
                         self.power[layer] = self.info['Power'][id]
                     elif self.info['Power'][id] == 'file':
-                        self.power[layer] = self.ts_data.loc[:, f'{self.name}:Power:{layer}']
+                        self.power[layer] = self.ts_data[('Power', layer)]
                         self.has_time_dependent_power = True
                     else:
                         raise ValueError(f'The power input for unit {self.name} should be a list of either single values or the string "file"')
@@ -204,17 +184,18 @@ class Utility(Unit):
 
     def read_time_dependent_capacity_factor(self):
         if self.ts_data is not None:
-            real_column_names = [column for column in self.ts_data.columns if column not in {'typicalPeriods', 'timeSteps', 'timeStepsOfPeriod'}]
-            if "Capacity factor" in [column.split(':')[1] for column in real_column_names]:
+            capacity_factor_layers = [layer for (variable, layer) in self.ts_data.keys() if variable == 'Capacity factor']
+            if capacity_factor_layers:
                 self.time_dependent_capacity_factor = {}
                 self.has_time_dependent_power = True
-                if 'All layers' in [column.split(':')[2] for column in real_column_names] and len([column.split(':')[1] for column in real_column_names if column.split(':')[1] == 'Capacity factor']) == 1:
+                all_layers = {layer for (_, layer) in self.ts_data.keys()}
+                if 'All layers' in all_layers and len(capacity_factor_layers) == 1:
                     for layer in self.layers:
-                        self.time_dependent_capacity_factor[layer] = self.ts_data.loc[:, f'{self.name}:Capacity factor:All layers']
-                elif 'All layers' not in [column.split(':')[2] for column in real_column_names]:
+                        self.time_dependent_capacity_factor[layer] = self.ts_data[('Capacity factor', 'All layers')]
+                elif 'All layers' not in all_layers:
                     for layer in self.layers:
-                        if layer in [column.split(':')[2] for column in real_column_names]:
-                            self.time_dependent_capacity_factor[layer] = self.ts_data.loc[:, f'{self.name}:Capacity factor:{layer}']
+                        if layer in capacity_factor_layers:
+                            self.time_dependent_capacity_factor[layer] = self.ts_data[('Capacity factor', layer)]
                         else:
                             self.time_dependent_capacity_factor[layer] = None
                 else:
@@ -283,8 +264,8 @@ class StorageUnit(Utility):
 
     @staticmethod
     def storage_layer_name(storage_unit_info):
-        storage_unit_info['Stored energy layer'] = storage_unit_info['Stored energy layer'] if 'Stored energy layer' in storage_unit_info.keys() else None
-        return storage_unit_info['Stored energy layer'] if storage_unit_info['Stored energy layer'] else f'Stored{safe_to_list(storage_unit_info["Layers"])[0]}'
+        stored_energy_layer = storage_unit_info.get('Stored energy layer')
+        return stored_energy_layer if stored_energy_layer else f'Stored{safe_to_list(storage_unit_info["Layers"])[0]}'
 
 class ChargingUnit(Utility):
     efficiency: float 
@@ -357,36 +338,36 @@ class Market(Utility):
         self.has_time_dependent_energy_prices = {l: False for l in self.layers}
         if self.ts_data is not None:
             for layer in self.layers:
-                if f'{self.name}:Price variation:{layer}' in self.ts_data.columns or f'{self.name}:Price:{layer}' in self.ts_data.columns:
+                if ('Price variation', layer) in self.ts_data or ('Price', layer) in self.ts_data:
                     self.has_time_dependent_energy_prices[layer] = True                    
         for id, layer in enumerate(self.layers):
             if self.has_time_dependent_energy_prices[layer] == False:
                 self.energy_price[layer] = self.info['Price'][id]
             else:
                 if 'Price' not in self.info.keys():
-                    self.energy_price[layer] = self.ts_data.loc[:, f'{self.name}:Price:{layer}'].mean()
-                    self.energy_price_variation[layer] = self.ts_data.loc[:, f'{self.name}:Price:{layer}']/self.energy_price[layer]
-                elif isinstance(self.info['Price'][id], float | int) and f'{self.name}:Price variation:{layer}' in self.ts_data.columns: # Case 1: Price value and price variation
-                    average_price = self.ts_data.loc[:, f'{self.name}:Price variation:{layer}'].mean()
-                    maximum_price = self.ts_data.loc[:, f'{self.name}:Price variation:{layer}'].max()
+                    self.energy_price[layer] = self.ts_data[('Price', layer)].mean()
+                    self.energy_price_variation[layer] = self.ts_data[('Price', layer)]/self.energy_price[layer]
+                elif isinstance(self.info['Price'][id], float | int) and ('Price variation', layer) in self.ts_data: # Case 1: Price value and price variation
+                    average_price = self.ts_data[('Price variation', layer)].mean()
+                    maximum_price = self.ts_data[('Price variation', layer)].max()
                     self.energy_price[layer] = self.info['Price'][id]
-                    self.energy_price_variation[layer] = self.ts_data.loc[:, f'{self.name}:Price variation:{layer}']
+                    self.energy_price_variation[layer] = self.ts_data[('Price variation', layer)]
                     if round(average_price, 1) != 1.0 or round(maximum_price,1) != 1.0:
                         print(f'WARNING!! Time series and price values for market {self.name} are not consistent. The time series for price variation will be multiplied by the reference price, so it should be either a value with mean = 1 or with max = 1')
-                elif isinstance(self.info['Price'][id], float | int) and f'{self.name}:Price:{layer}' in self.ts_data.columns:  # Case 2: price value and "Price" column
-                    average_price = self.ts_data.loc[:, f'{self.name}:Price:{layer}'].mean()
-                    maximum_price = self.ts_data.loc[:, f'{self.name}:Price:{layer}'].max()
+                elif isinstance(self.info['Price'][id], float | int) and ('Price', layer) in self.ts_data:  # Case 2: price value and "Price" column
+                    average_price = self.ts_data[('Price', layer)].mean()
+                    maximum_price = self.ts_data[('Price', layer)].max()
                     if round(average_price, 1) == 1.0 or round(maximum_price,1) == 1.0:
                         self.energy_price[layer] = self.info['Price'][id]
-                        self.energy_price_variation[layer] = self.ts_data.loc[:, f'{self.name}:Price:{layer}']
+                        self.energy_price_variation[layer] = self.ts_data[('Price', layer)]
                         print(f'WARNING! For market unit {self.name} you provided both a fixed price and a time-dependent "Price". The latter has average 1, so it will be considered as adimensional')
                     else:
-                        self.energy_price[layer] = self.ts_data.loc[:, f'{self.name}:Price:{layer}'].mean()
-                        self.energy_price_variation[layer] = self.ts_data.loc[:, f'{self.name}:Price:{layer}']/self.energy_price[layer]    
+                        self.energy_price[layer] = self.ts_data[('Price', layer)].mean()
+                        self.energy_price_variation[layer] = self.ts_data[('Price', layer)]/self.energy_price[layer]    
                         print(f'WARNING!! Market unit {self.name} was provided both with a fixed and a time-dependent price "Price". The fixed value will be ignored')
                 elif self.info['Price'][id] == 'file':
-                    self.energy_price[layer] = self.ts_data.loc[:, f'{self.name}:Price:{layer}'].mean()
-                    self.energy_price_variation[layer] = self.ts_data.loc[:, f'{self.name}:Price:{layer}']/self.energy_price[layer]
+                    self.energy_price[layer] = self.ts_data[('Price', layer)].mean()
+                    self.energy_price_variation[layer] = self.ts_data[('Price', layer)]/self.energy_price[layer]
                 else:
                     raise ValueError(f'The "Price" should be a list of float or include the "file" value. {self.info["Price"]} was provided for unit {self.name}')
 
@@ -1,7 +1,4 @@
-import os, yaml
-
-with open(f'{os.path.dirname(os.path.realpath(__file__))}\\..\\lib\\default_entities.yml') as stream:
-    DEFAULT_DATA = yaml.safe_load(stream)['VARIABLES']
+from OptiENEA.helpers.helpers import load_library_data
 
 class Variable():
     name: str
@@ -14,6 +11,7 @@ class Variable():
     @staticmethod
     def load_variables_indexing_data(variables):
         output = {}
+        DEFAULT_DATA = load_library_data('default_entities.yml')['VARIABLES']
         for var_name in variables:
             if var_name in DEFAULT_DATA.keys():
                 output[var_name] = Variable(var_name, DEFAULT_DATA[var_name])
@@ -0,0 +1,24 @@
+from dataclasses import dataclass, field
+import pandas as pd
+
+
+@dataclass
+class WarmStart:
+    """
+    A solution used to seed the solve of a similar problem (e.g. the next scenario of a parametric run):
+      - values: the values of the variables listed in VARIABLES, by name, as Series indexed like the variables
+      - basis: the simplex basis (column and row statuses) of an LP solved by the native interpreter, or None
+    The values are matched to the new problem by index, so they can also be used if the two problems do not have the same units.
+    The basis is only used if the two problems have the same number of columns and rows
+    """
+    values: dict = field(default_factory=dict)
+    basis: tuple | None = None
+
+    # Variables whose values are used as starting point
+    VARIABLES = ('size', 'ips', 'ips_t', 'power')
+
+    def matched_values(self, name: str, index: pd.Index) -> pd.Series:
+        # The values of a variable for the given index, without the indices that are not in the warm start
+        if name not in self.values:
+            return pd.Series(dtype = float)
+        return self.values[name].reindex(index).dropna()
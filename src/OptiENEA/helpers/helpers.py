@@ -1,12 +1,23 @@
 import pandas as pd
+import numpy as np
 import os
 from collections import defaultdict
-import stat, shutil, time
+import dataclasses, functools, hashlib, stat, shutil, time, yaml
+LIBRARY_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'lib')
 REQUIRED_STRUCTURE = {
     'folders': ['Input', ],
     'files': ['Input/units.yml', 'Input/general.yml']
 }
 
+@functools.lru_cache(maxsize = None)
+def load_library_data(filename: str) -> dict:
+    """
+    Returns the content of a file of the OptiENEA library (e.g. 'default_entities.yml').
+    Files are read the first time they are needed and then cached: the returned data must not be modified
+    """
+    with open(os.path.join(LIBRARY_FOLDER, filename)) as stream:
+        return yaml.safe_load(stream)
+
 def read_config_file(filename: str, data_structure = {}) -> dict:
     """
       This function reads the input text file and parses it into the required
@@ -185,17 +196,66 @@ def set_in_path(d, path, value):
     current[path[-1]] = value
     return d
 
+def copy_path(d, path):
+    """
+    Returns a shallow copy of the nested dictionary d, in which all dictionaries along the path are copied as well.
+    Values can then be set at the path (e.g. with set_in_path) without modifying d, while all other data are shared
+    """
+    output = dict(d)
+    current = output
+    for key in path[:-1]:
+        current[key] = dict(current[key])
+        current = current[key]
+    return output
+
 def key_dotted_to_tuple(dotted_key):
     return tuple(dotted_key.split(':'))
 
 def key_tuple_to_dotted(tuple_key):
     return ':'.join(tuple_key)
 
-def attempt_to_order_results_files(file_list, basic_filename):
+def attempt_to_order_results_files(file_list, basic_filename, extension = '.xlsx'):
     # This function takes a list of result files and tries to sort them
-    file_list_sorted = [f'{basic_filename} {x}.xlsx' for x in range(len(file_list))]
+    file_list_sorted = [f'{basic_filename} {x}{extension}' for x in range(len(file_list))]
     for filename in file_list_sorted:
         if filename not in file_list:
             print('Could not sort results file list based on the current sorting approach')
             return file_list
-    return file_list_sorted
\ No newline at end of file
+    return file_list_sorted
+
+def fingerprint(*items) -> str:
+    """
+    Returns a stable hash of the content of the items provided, which can be (nested) dictionaries, lists and tuples
+    of numbers, strings, NumPy arrays, pandas objects and dataclasses. Equal contents always give the same fingerprint
+    """
+    digest = hashlib.blake2b(digest_size = 16)
+    update_fingerprint(digest, items)
+    return digest.hexdigest()
+
+def update_fingerprint(digest, item):
+    # Recursively feeds the content of an item to the hash object
+    if isinstance(item, dict):
+        digest.update(b'dict')
+        for key, value in item.items():
+            update_fingerprint(digest, key)
+            update_fingerprint(digest, value)
+    elif isinstance(item, (list, tuple)):
+        digest.update(f'{type(item).__name__}{len(item)}'.encode())
+        for value in item:
+            update_fingerprint(digest, value)
+    elif isinstance(item, np.ndarray):
+        digest.update(f'ndarray{item.dtype.str}{item.shape}'.encode())
+        digest.update(np.ascontiguousarray(item).tobytes() if item.dtype != object else repr(item.tolist()).encode())
+    elif isinstance(item, pd.DataFrame):
+        update_fingerprint(digest, ('DataFrame', item.columns.tolist(), item.index, [item[col].to_numpy() for col in item.columns]))
+    elif isinstance(item, pd.Series):
+        update_fingerprint(digest, ('Series', item.name, item.index, item.to_numpy()))
+    elif isinstance(item, pd.Index):
+        update_fingerprint(digest, ('Index', item.tolist()))
+    elif callable(getattr(item, 'fingerprint', None)):
+        # Objects can provide their own (cheaper) fingerprint, e.g. the time series store
+        update_fingerprint(digest, (type(item).__name__, item.fingerprint()))
+    elif dataclasses.is_dataclass(item) and not isinstance(item, type):
+        update_fingerprint(digest, (type(item).__name__, {f.name: getattr(item, f.name) for f in dataclasses.fields(item)}))
+    else:
+        digest.update(f'{type(item).__name__}:{item!r};'.encode())
@@ -54,7 +54,7 @@ def test_problem_with_min_installed_power_if_installed(tmp_path):
     problem = Problem(name = f'test_problem_minimum_size_if_installed', 
                       problem_folder = problem_folder)
     problem.run()
-    assert math.isclose(problem.ampl_problem.get_variable('size')['AnaerobicDigester'].value(),0.0286,abs_tol = 0.01)
+    assert math.isclose(problem.ampl_problem.get_variable('size')['AnaerobicDigester'].value(),0.112,abs_tol = 0.01)
     shutil.rmtree(os.path.join(problem_folder, 'Temporary files'))
     shutil.rmtree(os.path.join(problem_folder, 'Results'))
     # Then, Modify the YAML file to add the "minimum installed power" input
@@ -3,7 +3,9 @@ from OptiENEA.classes.set import Set
 from OptiENEA.classes.parameter import Parameter
 from OptiENEA.classes.amplpy import AmplProblem
 from OptiENEA.classes.unit import *
-import os, pytest, shutil, math
+import io, os, pytest, shutil, math, subprocess, sys
+import numpy as np
+import pandas as pd
 
 __HERE__ = os.path.dirname(os.path.realpath(__file__))
 __PARENT__ = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
@@ -83,6 +85,25 @@ def test_parse_sets(problem_with_unit_data):
     assert problem_with_unit_data.sets['chargingUtilitiesOfStorageUnit'].content['Battery'] == {'BatteryCharger'}
     assert problem_with_unit_data.sets['mainLayerOfUnit'].content['Market'] == {'Electricity'}
     assert problem_with_unit_data.sets['layers'].content == {'Electricity', 'StoredElectricity'}
+    assert problem_with_unit_data.sets['timeSteps'].content == range(8760)
+
+def test_set_bulk_content():
+    # Tests range and array-backed set content, and its conversion to AMPL
+    time_steps = Set('timeStepsOfPeriod', ['typicalPeriods'])
+    for tp in range(3):
+        time_steps.set_range(0, 24, subset = tp)
+    assert len(time_steps.content[2]) == 24
+    time_steps.append(30, 2)
+    assert time_steps.content[2] == set(range(24)) | {30}
+    units = Set('processes', None)
+    units.extend(np.array([3, 1, 3, 2]))
+    assert np.array_equal(units.content, [1, 2, 3])
+    units.extend(['A'])
+    assert units.content == {1, 2, 3, 'A'}
+    assert Set('layers', None).is_empty()
+    assert AmplProblem.range_to_ampl(range(8760)) == '0..8759'
+    assert AmplProblem.range_to_ampl(range(0, 8760, 2)) == '0..8758 by 2'
+    assert AmplProblem.value_to_ampl("Unit's") == "'Unit''s'"
 
 def test_parse_parameters(problem_with_unit_data):
     # Tests the "process_problem_data" function
@@ -92,6 +113,58 @@ def test_parse_parameters(problem_with_unit_data):
     assert problem_with_unit_data.parameters['CRATE']().loc['Battery', 'CRATE'] == 1.0
     assert problem_with_unit_data.parameters['ENERGY_AVERAGE_PRICE']().loc[('Market', 'Electricity'), 'ENERGY_AVERAGE_PRICE'] == 0.0478
 
+def test_parameter_conversion_to_ampl(problem_with_all_data):
+    # Tests the column-by-column conversion of the parameters sent to AMPL
+    content = problem_with_all_data.parameters['POWER'].content
+    ampl_data, n_bytes = AmplProblem.to_ampl_dataframe('POWER', content)
+    pd.testing.assert_series_equal(ampl_data.to_pandas()['POWER'], content['POWER'], check_index_type = False, check_names = False)
+    assert n_bytes == content['POWER'].nbytes + content.index.get_level_values(2).nbytes + len(content) * len('WindFarm' + 'Electricity')
+    ampl_data, _ = AmplProblem.to_ampl_dataframe('TIME_STEP_DURATION', pd.Series([1.0, 2.0], index = pd.Index([0, 1], name = 'timeSteps')))
+    assert ampl_data.to_dict() == {0: 1.0, 1: 2.0}
+
+def test_write_data_file(problem_with_all_data):
+    # Tests the data file written from the problem data (used when the model is exported in background)
+    assert problem_with_all_data.model_export == 'background'
+    stream = io.StringIO()
+    AmplProblem.write_data_file(problem_with_all_data, stream)
+    data = stream.getvalue()
+    assert data.startswith('data;')
+    assert "set processes := 'WindFarm';" in data
+    assert 'set timeSteps := 0 1 2 ' in data
+    assert "\n'WindFarm'\t'Electricity'\t3\t-43.688\n" in data
+    assert 'param TIME_STEP_DURATION := 1;' in data
+
+def test_import_does_not_load_optional_libraries():
+    # amplpy and the plotting libraries should only be imported when a model is built or a plot is made
+    script = 'import sys, OptiENEA.classes.parametric_runs; print([x for x in ("amplpy", "matplotlib", "seaborn") if x in sys.modules])'
+    result = subprocess.run([sys.executable, '-c', script], capture_output = True, text = True, check = True)
+    assert result.stdout.strip() == '[]'
+
+def test_time_dependent_parameter_bulk_assembly():
+    # Tests the bulk assembly of time-dependent parameters, with both series and scalar values
+    parameter = Parameter('POWER', ['processes', 'layersOfUnit', 'typicalDays', 'timeStepsOfPeriod'])
+    time_index = {'typicalDays': np.repeat(np.arange(2), 3), 'timeStepsOfPeriod': np.tile(np.arange(3), 2)}
+    entries = [('Process1', 'Electricity', np.arange(6.0)), ('Process1', 'Heat', -2), ('Process2', 'Electricity', pd.Series(np.ones(6)))]
+    parameter.set_time_dependent_content('processes', entries, time_index)
+    assert parameter().index.names == ['processes', 'layersOfUnit', 'typicalDays', 'timeStepsOfPeriod']
+    assert len(parameter()) == 18
+    assert parameter().loc[('Process1', 'Electricity', 1, 2), 'POWER'] == 5.0
+    assert parameter().loc[('Process1', 'Heat', 0, 1), 'POWER'] == -2.0
+    assert parameter().loc[('Process2', 'Electricity', 1, 0), 'POWER'] == 1.0
+
+def test_time_dependent_parameter_default_elision():
+    # Entries equal to the default value at all time steps are left out, and added back when they are updated
+    parameter = Parameter('POWER_MAX_REL', ['nonStorageUtilities', 'layersOfUnit', 'timeSteps'])
+    entries = [('Grid', 'Electricity', 1), ('PV', 'Electricity', np.array([0.0, 0.5, 1.0])), ('Boiler', 'Heat', np.ones(3))]
+    parameter.set_time_dependent_content('nonStorageUtilities', entries, {'timeSteps': np.arange(3)}, default = 1.0)
+    assert len(parameter()) == 3
+    assert set(parameter.elided_entries) == {('Grid', 'Electricity'), ('Boiler', 'Heat')}
+    scenario_parameter = parameter.copy()
+    scenario_parameter.update(('Boiler', 'Heat', 1), 0.5)
+    assert scenario_parameter().loc[('Boiler', 'Heat', 1), 'POWER_MAX_REL'] == 0.5
+    assert scenario_parameter().loc[('Boiler', 'Heat', 2), 'POWER_MAX_REL'] == 1.0
+    assert len(parameter()) == 3 and ('Boiler', 'Heat') in parameter.elided_entries
+
 def test_create_ampl_problem(problem_with_all_data):
     problem_with_all_data.create_ampl_model()
     ampl_sets = problem_with_all_data.ampl_problem.get_sets()
@@ -0,0 +1,38 @@
+from OptiENEA.classes.ampl_model import ModelFeatures, ModelEntity, TimeDimension, render_model
+import pytest
+
+
+def test_full_year_model():
+    model = render_model(ModelFeatures(has_storage = True, has_capex = True), 'minimize obj: TOTEX;\n', [], {})
+    assert 'set timeSteps;' in model
+    assert 'set typicalPeriods;' not in model
+    assert 'param POWER_MAX{u in nonStorageUtilities, l in layersOfUnit[u]} default 0;' in model
+    assert 'var energyStorageLevel0{u in storageUnits, l in layersOfUnit[u]} >=0;' in model
+    assert 'energyStorageLevel[u,l,card(timeSteps)-1] - energyStorageLevel0[u,l] >= 0;' in model
+    assert '* TIME_STEP_DURATION * OCCURRANCE;' in model
+
+def test_typical_periods_model():
+    model = render_model(ModelFeatures(has_storage = True, has_capex = True, has_typical_periods = True, has_variable_time_step_durations = True),
+                         'minimize obj: TOTEX;\n', [], {})
+    assert 'set timeStepsOfPeriod{tp in typicalPeriods};' in model
+    assert 'param TIME_STEP_DURATION{tp in typicalPeriods, t in timeStepsOfPeriod[tp]};' in model
+    assert 'param OCCURRANCE{tp in typicalPeriods};' in model
+    assert 'var energyStorageLevel0{u in storageUnits, l in layersOfUnit[u], tp in typicalPeriods} >=0;' in model
+    assert 'energyStorageLevel[u,l,tp,t-1] - power[u,l,tp,t]*TIME_STEP_DURATION[tp,t]' in model
+    assert 'energyStorageLevel[u,l,tp,card(timeStepsOfPeriod[tp])-1]' in model
+    assert '* TIME_STEP_DURATION[tp,t] * OCCURRANCE[tp];' in model
+    assert 'timeSteps}' not in model and 't]' not in model.replace('tp,t]', '')
+
+def test_rendered_models_are_cached():
+    features = ModelFeatures(has_capex = True)
+    first = render_model(features, 'minimize obj: TOTEX;\n', [], {})
+    assert render_model(ModelFeatures(has_capex = True), 'minimize obj: TOTEX;\n', [], {}) is first
+    assert render_model(features, 'minimize obj: OPEX;\n', [], {}) is not first
+
+def test_entity_rendering():
+    substitutions = TimeDimension(typical_periods = True).substitutions()
+    assert ModelEntity('var', 'ics', 'u in nonmarketUtilities, ${T}', '>= 0').render(substitutions) == \
+        'var ics{u in nonmarketUtilities, tp in typicalPeriods, t in timeStepsOfPeriod[tp]} >= 0;'
+    assert ModelEntity('s.t.', 'calculate_totex', '', 'TOTEX = CAPEX + OPEX').render(substitutions) == 's.t. calculate_totex: TOTEX = CAPEX + OPEX;'
+    with pytest.raises(KeyError):
+        ModelEntity('var', 'x', '${unknown}').render(substitutions)
@@ -0,0 +1,147 @@
+import OptiENEA.classes.amplpy as amplpy_module
+from OptiENEA.classes.amplpy import AmplProblem, AmplSessionPool
+from OptiENEA.classes.parameter import Parameter
+from OptiENEA.helpers.helpers import fingerprint
+from types import SimpleNamespace
+import pandas as pd
+import pytest
+
+
+class StubSession:
+    # Stands for an AMPL session, without AMPL: the model text of a problem is its "model" attribute
+    def __init__(self, problem):
+        self.model_fingerprint = None
+        self.loads = 0
+        self.closed = False
+        self.set_problem(problem)
+
+    def set_problem(self, problem):
+        self.problem = problem
+
+    def parse_problem_settings(self):
+        pass
+
+    def build_mod_string(self):
+        self.mod_string = self.problem.model
+
+    def load_model(self):
+        model_fingerprint = fingerprint(self.mod_string)
+        if model_fingerprint != self.model_fingerprint:
+            self.loads += 1
+            self.model_fingerprint = model_fingerprint
+
+    def wait_for_export(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(amplpy_module, 'AmplProblem', StubSession)
+    return AmplSessionPool(max_idle_sessions = 2)
+
+
+def test_session_pool_reuses_model(pool):
+    session = pool.acquire(SimpleNamespace(model = 'model A'))
+    pool.release(session)
+    problem = SimpleNamespace(model = 'model A')
+    assert pool.acquire(problem) is session and session.problem is problem
+    assert session.loads == 1 and pool.report == {'started': 1, 'model reused': 1, 'model reloaded': 0}
+
+def test_session_pool_reloads_model(pool):
+    session = pool.acquire(SimpleNamespace(model = 'model A'))
+    pool.release(session)
+    assert pool.acquire(SimpleNamespace(model = 'model B')) is session
+    assert session.loads == 2 and pool.report == {'started': 1, 'model reused': 0, 'model reloaded': 1}
+
+def test_session_pool_swaps_in_matching_session(pool):
+    # The most recent idle session has another model, but an older one has the same model: that one is used instead
+    session_a = pool.acquire(SimpleNamespace(model = 'model A'))
+    session_b = pool.acquire(SimpleNamespace(model = 'model B'))
+    pool.release(session_a)
+    pool.release(session_b)
+    assert pool.acquire(SimpleNamespace(model = 'model A')) is session_a
+    assert pool.idle == [session_b] and session_a.loads == 1 and session_b.loads == 1
+    assert pool.report == {'started': 2, 'model reused': 1, 'model reloaded': 0}
+
+def test_session_pool_evicts_oldest_sessions(pool):
+    sessions = [pool.acquire(SimpleNamespace(model = f'model {name}')) for name in 'ABC']
+    for session in sessions:
+        pool.release(session)
+    assert pool.idle == sessions[1:] and sessions[0].closed and not any(session.closed for session in sessions[1:])
+    pool.close()
+    assert pool.idle == [] and all(session.closed for session in sessions)
+
+
+class RecordingSession(AmplProblem):
+    # Stands for an AMPL session, without AMPL: the statements and the parameter data sent to it are recorded
+    def __init__(self, problem):
+        self.model_fingerprint = None
+        self.base_snapshot = None
+        self.modified_parameters = {}
+        self.holds_base_data = False
+        self.problem = problem
+        self.sent = []
+
+    def eval(self, statement):
+        self.sent.append(statement)
+
+    def write_parameter(self, name, content):
+        self.sent.append((name, content[name].to_dict() if isinstance(content, pd.DataFrame) else content))
+
+
+@pytest.fixture
+def base_parameters():
+    # The parameters of a snapshot, whose modifications are tracked from then on
+    price = Parameter('ENERGY_AVERAGE_PRICE', ['markets', 'layersOfUnit'])
+    price.update(('Market', 'Electricity'), 0.05)
+    price.update(('Market', 'Heat'), 0.02)
+    occurrance = Parameter('OCCURRANCE', None)
+    occurrance.content = 1
+    parameters = {'ENERGY_AVERAGE_PRICE': price, 'OCCURRANCE': occurrance}
+    for parameter in parameters.values():
+        parameter.clear_modifications()
+    return parameters
+
+
+def clone_of(snapshot, base_parameters: dict, updates: list = []) -> SimpleNamespace:
+    # A problem cloned from the snapshot: the updated parameters are copies, as in Problem.clone
+    parameters = dict(base_parameters)
+    for name, indexing, value in updates:
+        parameters[name] = parameters[name].copy()
+        parameters[name].update(indexing, value)
+    return SimpleNamespace(parameters = parameters, base_data = lambda: snapshot)
+
+
+def test_only_modified_parameters_are_sent(base_parameters):
+    snapshot = object()
+    session = RecordingSession(clone_of(snapshot, base_parameters))
+    session.write_parameters_to_amplpy()
+    assert [name for name, _ in session.sent] == ['ENERGY_AVERAGE_PRICE', 'OCCURRANCE'] and session.base_snapshot is snapshot
+    # Only the updated row is sent
+    session.problem, session.sent = clone_of(snapshot, base_parameters, [('ENERGY_AVERAGE_PRICE', ('Market', 'Heat'), 0.3)]), []
+    session.write_parameters_to_amplpy(only_modified = True)
+    assert session.sent == [('ENERGY_AVERAGE_PRICE', {('Market', 'Heat'): 0.3})]
+    # The row updated by the previous problem is set back to the value of the snapshot, and whole parameters are reset first
+    session.problem, session.sent = clone_of(snapshot, base_parameters, [('OCCURRANCE', (), 2)]), []
+    session.write_parameters_to_amplpy(only_modified = True)
+    assert session.sent == [('ENERGY_AVERAGE_PRICE', {('Market', 'Heat'): 0.02}), 'reset data OCCURRANCE;', ('OCCURRANCE', 2)]
+    session.problem, session.sent = clone_of(snapshot, base_parameters), []
+    session.write_parameters_to_amplpy(only_modified = True)
+    assert session.sent == ['reset data OCCURRANCE;', ('OCCURRANCE', 1)]
+    # The parameters of the snapshot, shared by all the clones, are left as they were
+    assert all(parameter.modified_content() is None for parameter in base_parameters.values())
+    assert base_parameters['ENERGY_AVERAGE_PRICE']().loc[('Market', 'Heat'), 'ENERGY_AVERAGE_PRICE'] == 0.02
+
+def test_session_keeps_data_of_same_snapshot(base_parameters):
+    snapshot = object()
+    session = RecordingSession(clone_of(snapshot, base_parameters))
+    session.mod_string = 'model A'
+    session.model_fingerprint, session.base_snapshot = fingerprint('model A'), snapshot
+    session.load_model()
+    assert session.holds_base_data and session.sent == []
+    session.problem = clone_of(None, base_parameters)  # E.g. a problem whose sets were parsed again after it was cloned
+    session.load_model()
+    assert not session.holds_base_data and session.sent == ['reset data;']
@@ -0,0 +1,81 @@
+from OptiENEA.classes.input_cache import InputCache
+from OptiENEA.classes.problem import Problem
+from OptiENEA.classes.timeseries_store import TimeSeriesStore
+import os, shutil, pytest, yaml
+import numpy as np
+import pandas as pd
+
+__HERE__ = os.path.dirname(os.path.realpath(__file__))
+__PARENT__ = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+
+def test_cold_and_warm_start(problem_folder):
+    problem = Problem(name = 'test_problem', problem_folder = problem_folder)
+    problem.read_problem_data()
+    cold_timeseries_data = problem.raw_timeseries_data
+    assert os.path.isfile(os.path.join(problem.cache_folder, 'manifest.json'))
+    # Second read: data come from the cache and are identical to the parsed ones
+    problem = Problem(name = 'test_problem', problem_folder = problem_folder)
+    problem.read_problem_data()
+    pd.testing.assert_frame_equal(problem.raw_timeseries_data, cold_timeseries_data)
+    assert problem.raw_general_data['Standard parameters']['NT'] == 168
+
+def test_warm_start_skips_parsing(problem_folder, monkeypatch):
+    Problem(name = 'test_problem', problem_folder = problem_folder).read_problem_data()
+    def fail(*args, **kwargs):
+        raise AssertionError('Input files should not be parsed on a warm start')
+    monkeypatch.setattr(yaml, 'safe_load', fail)
+    monkeypatch.setattr(Problem, 'read_timeseries_file', fail)
+    monkeypatch.setattr(TimeSeriesStore, 'from_csv', fail)
+    problem = Problem(name = 'test_problem', problem_folder = problem_folder)
+    problem.read_problem_data()
+    assert problem.raw_unit_data['PV']['Type'] == 'Utility'
+
+def test_cache_invalidated_on_change(problem_folder):
+    problem = Problem(name = 'test_problem', problem_folder = problem_folder)
+    problem.read_problem_data()
+    old_hash = InputCache(problem.cache_folder).file_hash(os.path.join(problem.input_folder, 'general.yml'))
+    with open(os.path.join(problem.input_folder, 'general.yml'), 'r') as stream:
+        data = yaml.safe_load(stream)
+    data['Standard parameters']['NT'] = 24
+    with open(os.path.join(problem.input_folder, 'general.yml'), 'w') as stream:
+        yaml.safe_dump(data, stream, sort_keys = False)
+    problem = Problem(name = 'test_problem', problem_folder = problem_folder)
+    problem.read_problem_data()
+    assert problem.raw_general_data['Standard parameters']['NT'] == 24
+    assert not os.path.isfile(os.path.join(problem.cache_folder, f'{old_hash}.pkl'))
+
+def test_memory_mapped_timeseries(problem_folder):
+    problem = Problem(name = 'test_problem', problem_folder = problem_folder)
+    problem.read_problem_data()
+    reference = problem.raw_timeseries_data
+    with open(os.path.join(problem.input_folder, 'general.yml'), 'r') as stream:
+        data = yaml.safe_load(stream)
+    data['Settings']['Time series'] = {'Precision': 'float32', 'Memory map': True}
+    with open(os.path.join(problem.input_folder, 'general.yml'), 'w') as stream:
+        yaml.safe_dump(data, stream, sort_keys = False)
+    for _ in range(2):  # First the binary copy is created, then it is re-used
+        problem = Problem(name = 'test_problem', problem_folder = problem_folder)
+        problem.read_problem_data()
+        store = problem.get_raw_timeseries_store()
+        assert isinstance(store.data, np.memmap)
+        assert store.data.dtype == np.float32
+        pd.testing.assert_frame_equal(problem.raw_timeseries_data, reference, check_dtype = False, rtol = 1e-6)
+
+def test_cached_data_are_independent_copies(problem_folder):
+    problem = Problem(name = 'test_problem', problem_folder = problem_folder)
+    problem.read_problem_data()
+    problem.update_problem_data('units', ('PV', 'Specific CAPEX'), 1.0)
+    problem = Problem(name = 'test_problem', problem_folder = problem_folder)
+    problem.read_problem_data()
+    assert problem.raw_unit_data['PV']['Specific CAPEX'] != 1.0
+
+
+@pytest.fixture
+def problem_folder(tmp_path):
+    problem_folder = os.path.join(tmp_path, 'test_problem')
+    os.makedirs(os.path.join(problem_folder, 'Input'))
+    for filename in ('units.yml', 'general.yml', 'timeseries_data.csv'):
+        shutil.copy2(os.path.join(__PARENT__, 'DATA', 'test_problem', 'test_problem_3', filename),
+                     os.path.join(problem_folder, 'Input', filename))
+    return problem_folder
@@ -0,0 +1,217 @@
+from OptiENEA.classes.problem import Problem
+from OptiENEA.classes.native_model import NativeProblem
+from OptiENEA.classes.solver_options import SolverOptions
+from OptiENEA.classes.benders import BendersProblem, DecompositionSettings
+from OptiENEA.classes.output import OptimizationOutput
+import os, shutil, math, pytest, yaml
+import numpy as np
+import pandas as pd
+
+pytest.importorskip('scipy')  # The native interpreter needs the optional scipy dependency
+
+__HERE__ = os.path.dirname(os.path.realpath(__file__))
+__PARENT__ = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+# OPEX, CAPEX and TOTEX of the test problems, as checked for the AMPL interpreter in test/classes/problem/test_problems.py
+REFERENCE_RESULTS = {1: (-160780, 98796, -61983), 2: (-752, 1000, 244), 3: (138, 1034, 1172)}
+
+
+def test_native_solve(tmp_path):
+    problem = create_native_problem(tmp_path)
+    problem.run()
+    assert problem.ampl_problem.solve_result == 'solved'
+    assert math.isclose(problem.ampl_problem.get_variable('size')['CHPEngine'].value(), 0, abs_tol = 0.1)
+    for name, value in zip(('OPEX', 'CAPEX', 'TOTEX'), (138.00, 1034.07, 1172.07)):
+        assert math.isclose(problem.ampl_problem.get_variable(name).value(), value, abs_tol = 0.01)
+    assert problem.output.output_timeseries.shape[0] == 168
+    assert os.path.isfile(os.path.join(problem.problem_folder, 'Results', f'Results_{problem.run_name}', 'timeseries_full.parquet'))
+
+@pytest.mark.parametrize('problem_number', [1, 2, 3])
+def test_native_reference_results(tmp_path, problem_number):
+    # The native interpreter finds the same costs as the AMPL interpreter
+    problem = create_native_problem(tmp_path, problem_number = problem_number)
+    problem.create_pipeline().run(until = 'solve', verbose = False)
+    assert problem.ampl_problem.solve_result == 'solved'
+    for name, value in zip(('OPEX', 'CAPEX', 'TOTEX'), REFERENCE_RESULTS[problem_number]):
+        assert math.isclose(problem.ampl_problem.get_variable(name).value(), value, abs_tol = 10)
+
+def test_native_min_installed_power(tmp_path):
+    problem = create_native_problem(tmp_path, {'CHPEngine': {'Min installed power': 4}})
+    problem.run()
+    assert math.isclose(problem.ampl_problem.get_variable('size')['CHPEngine'].value(), 4, abs_tol = 0.1)
+
+def test_native_min_size_if_installed(tmp_path):
+    # Without the minimum size, a small digester is installed. With a larger minimum size, it is not installed at all
+    problem = create_native_problem(tmp_path, {'AnaerobicDigester': {'Specific CAPEX': 6200}})
+    problem.run()
+    assert math.isclose(problem.ampl_problem.get_variable('size')['AnaerobicDigester'].value(), 0.112, abs_tol = 0.001)
+    assert math.isclose(problem.ampl_problem.get_variable('TOTEX').value(), 1169.10, abs_tol = 0.01)
+    problem = create_native_problem(tmp_path / 'min_size', {'AnaerobicDigester': {'Specific CAPEX': 6200, 'Min size if installed': 0.3}})
+    problem.run()
+    assert math.isclose(problem.ampl_problem.get_variable('size')['AnaerobicDigester'].value(), 0.0, abs_tol = 0.01)
+    assert problem.ampl_problem.get_variable('ips')['AnaerobicDigester'].value() == 0
+
+def test_native_typical_periods(tmp_path):
+    problem = create_native_problem(tmp_path, general_file = os.path.join(__PARENT__, 'DATA', 'test_typical_periods', 'test_typical_periods_day.yml'),
+                                    timeseries_file = 'timeseries_data_full.csv')
+    problem.run()
+    assert problem.ampl_problem.solve_result == 'solved'
+    assert problem.ampl_problem.get_variable('energyStorageLevel0').to_pandas().shape[0] == len(problem.sets['storageUnits'].content) * problem.typical_periods.K
+    assert problem.output.output_timeseries.shape[0] == 8760
+    # The hourly time series are only built from the results of the typical periods when they are read
+    output = OptimizationOutput(problem.ampl_problem, problem.output_variables, problem.results_folder, problem.typical_periods)
+    output.generate_output_structures()
+    assert 'timeseries_full' not in vars(output)
+    assert output.model_timeseries.shape[0] == problem.typical_periods.K * problem.typical_periods.L
+    pd.testing.assert_frame_equal(output.timeseries, problem.output.timeseries)
+    output.release()
+    assert not any(name in vars(output) for name in OptimizationOutput.VIEWS)
+
+def test_native_unsupported_objective(tmp_path):
+    problem = create_native_problem(tmp_path)
+    problem.create_pipeline().run(until = 'parameters', verbose = False)
+    problem.objective.name = 'Emissions'
+    with pytest.raises(ValueError):
+        problem.create_ampl_model()
+
+def test_native_unsupported_settings(tmp_path):
+    # The problems the native interpreter cannot build are rejected when the settings are read
+    problem = create_native_problem(tmp_path, settings = {'Objective': 'Emissions'})
+    with pytest.raises(ValueError, match = 'objective'):
+        problem.create_pipeline().run(until = 'settings')
+    problem = create_native_problem(tmp_path / 'on_off', {'CHPEngine': {'OnOff utility': True}}, settings = {'Decomposition': {'Method': 'Benders'}})
+    with pytest.raises(ValueError, match = 'on/off'):
+        problem.create_pipeline().run(until = 'settings')
+
+def test_native_solver_options():
+    options = SolverOptions(threads = 2, mip_gap = 0.05, presolve = False, extra = 'mip_max_nodes=100')
+    highs_options = NativeProblem.__new__(NativeProblem).set_solver_options('highs', options)
+    assert highs_options['mip_rel_gap'] == 0.05 and highs_options['presolve'] == 'off' and highs_options['mip_max_nodes'] == 100
+
+def test_solver_options_are_saved_with_results(tmp_path):
+    problem = create_native_problem(tmp_path)
+    problem.set_solver_options(time_limit = 300, algorithm = 'simplex')
+    problem.run()
+    assert problem.solver_options.time_limit == 300
+    assert problem.solver_settings['time_limit'] == 300 and problem.solver_settings['solve result'] == 'solved'
+    assert OptimizationOutput.from_results(problem.results_folder, problem.run_name).solver_settings['solve result'] == 'solved'
+    # The options set through the API are kept when the problem is run again, and only the solve is repeated when they change
+    problem.set_solver_options(mip_gap = 0.01)
+    problem.run()
+    assert problem.solver_options.time_limit == 300 and problem.solver_options.mip_gap == 0.01
+    assert problem.pipeline.report['settings'] == 'hit' and problem.pipeline.report['solve'] == 'miss'
+
+def test_updates_are_solved_on_next_run(tmp_path):
+    # Updated parameters or raw data are kept when the problem is run again, and the model is built and solved again
+    problem = create_native_problem(tmp_path)
+    problem.run()
+    base_totex = problem.ampl_problem.get_variable('TOTEX').value()
+    problem.update_problem_parameters('SPECIFIC_INVESTMENT_COST_ANNUALIZED', ('PV',), 1.0)
+    problem.run()
+    assert problem.pipeline.report['parameters'] == 'hit' and problem.pipeline.report['model'] == 'miss'
+    assert problem.parameters['SPECIFIC_INVESTMENT_COST_ANNUALIZED']().loc['PV', 'SPECIFIC_INVESTMENT_COST_ANNUALIZED'] == 1.0
+    assert problem.ampl_problem.get_variable('TOTEX').value() < base_totex - 1
+    # The raw data are parsed again, so the parameters are those of the updated unit data
+    problem.update_problem_data('units', ('PV', 'Specific CAPEX'), 1900)
+    problem.run()
+    assert problem.pipeline.report['read'] == 'hit' and problem.pipeline.report['units'] == 'miss'
+    assert problem.ampl_problem.get_variable('TOTEX').value() > base_totex + 1
+
+def test_clone_run_solves_updated_parameters(tmp_path):
+    # The clone of a problem that was already run is built and solved again, with its updated parameters
+    problem = create_native_problem(tmp_path)
+    problem.run()
+    base_totex = problem.ampl_problem.get_variable('TOTEX').value()
+    clone = problem.clone(parameter_updates = [('SPECIFIC_INVESTMENT_COST_ANNUALIZED', ('PV',), 1.0)], name = 'clone')
+    clone.run()
+    assert clone.pipeline.report['parameters'] == 'hit' and clone.pipeline.report['model'] == 'miss'
+    assert clone.parameters['SPECIFIC_INVESTMENT_COST_ANNUALIZED']().loc['PV', 'SPECIFIC_INVESTMENT_COST_ANNUALIZED'] == 1.0
+    assert clone.ampl_problem is not problem.ampl_problem and clone.output is not problem.output
+    assert clone.ampl_problem.get_variable('TOTEX').value() < base_totex - 1
+    assert problem.ampl_problem.get_variable('TOTEX').value() == base_totex
+
+def test_native_warm_start(tmp_path):
+    # The basis of a solved LP is reused to solve a similar one
+    pytest.importorskip('highspy')  # Without highspy, the scipy solver is used, and it ignores warm starts
+    problem = create_native_problem(tmp_path / 'baseline')
+    problem.create_pipeline().run(until = 'solve', verbose = False)
+    warm_start = problem.ampl_problem.get_warm_start()
+    assert warm_start.basis is not None and 'size' in warm_start.values
+    cold = create_native_problem(tmp_path / 'cold', {'PV': {'Specific CAPEX': 900}})
+    cold.create_pipeline().run(until = 'solve', verbose = False)
+    # As in parametric runs, the scenario is a clone of the base problem
+    warm = problem.clone(raw_data_updates = [('units', ('PV', 'Specific CAPEX'), 900)])
+    warm.create_ampl_model(run_name = 'warm')
+    warm.solve_ampl_problem(warm_start = warm_start)
+    assert warm.ampl_problem.build_report['warm start'] == 'basis' and warm.solver_settings['warm start']
+    assert warm.ampl_problem.build_report['simplex iterations'] < cold.ampl_problem.build_report['simplex iterations']
+    assert math.isclose(warm.ampl_problem.get_variable('TOTEX').value(), cold.ampl_problem.get_variable('TOTEX').value(), rel_tol = 1e-6)
+
+def test_benders_typical_periods(tmp_path):
+    # The decomposition over the typical periods finds the solution of the monolithic model
+    general_file = os.path.join(__PARENT__, 'DATA', 'test_typical_periods', 'test_typical_periods_day.yml')
+    problem = create_native_problem(tmp_path / 'monolithic', general_file = general_file, timeseries_file = 'timeseries_data_full.csv')
+    problem.create_pipeline().run(until = 'solve', verbose = False)
+    decomposed = create_native_problem(tmp_path / 'benders', general_file = general_file, timeseries_file = 'timeseries_data_full.csv',
+                                       settings = {'Decomposition': {'Method': 'Benders', 'Workers': 2}})
+    decomposed.run()
+    assert decomposed.ampl_problem.solve_result == 'solved'
+    assert decomposed.ampl_problem.build_report['periods'] == decomposed.typical_periods.K
+    assert not hasattr(decomposed.ampl_problem, 'matrix')  # Only the matrices of the master problem and of the periods are built
+    for name in ('TOTEX', 'CAPEX', 'OPEX'):
+        assert math.isclose(decomposed.ampl_problem.get_variable(name).value(), problem.ampl_problem.get_variable(name).value(), rel_tol = 1e-4)
+    assert decomposed.output.output_timeseries.shape[0] == 8760
+
+def test_benders_min_size_if_installed(tmp_path):
+    # With a minimum size if installed, the master problem is a MILP
+    unit_updates = {'AnaerobicDigester': {'Specific CAPEX': 6200, 'Min size if installed': 0.3}}
+    monolithic = create_native_problem(tmp_path / 'monolithic', unit_updates)
+    monolithic.create_pipeline().run(until = 'solve', verbose = False)
+    problem = create_native_problem(tmp_path / 'benders', unit_updates, settings = {'Decomposition': {'Method': 'Benders'}})
+    problem.create_pipeline().run(until = 'solve', verbose = False)
+    assert problem.ampl_problem.solve_result == 'solved'
+    assert problem.ampl_problem.get_variable('ips')['AnaerobicDigester'].value() == 0
+    # The optimum is degenerate (the split between CAPEX and OPEX may differ), so only the objective is compared
+    assert math.isclose(problem.ampl_problem.get_variable('TOTEX').value(), monolithic.ampl_problem.get_variable('TOTEX').value(), rel_tol = 1e-4)
+
+def test_benders_full_solution_without_progress():
+    # Cost columns whose defining rows depend on each other cannot be calculated
+    from scipy import sparse
+    problem = BendersProblem.__new__(BendersProblem)
+    problem.n_columns, problem.master_columns, problem.subproblems = 3, np.array([0]), []
+    problem.definitions = {1: 0, 2: 1}
+    problem.definition_matrix = sparse.csr_matrix(np.array([[0.0, 1.0, -1.0], [0.0, -1.0, 1.0]]))
+    with pytest.raises(ValueError):
+        problem.full_solution(np.array([5.0]), [])
+
+def test_decomposition_settings(tmp_path):
+    assert DecompositionSettings.from_settings(None) is None
+    assert DecompositionSettings.from_settings({'Method': 'Benders', 'Workers': 4}).workers == 4
+    with pytest.raises(ValueError):
+        DecompositionSettings.from_settings({'Method': 'Dantzig-Wolfe'})
+    with pytest.raises(ValueError):
+        DecompositionSettings.from_settings({'Workers': 0})
+    problem = create_native_problem(tmp_path, settings = {'Interpreter': 'ampl', 'Decomposition': {'Method': 'Benders'}})
+    with pytest.raises(ValueError):
+        problem.create_pipeline().run(until = 'settings', verbose = False)
+
+
+def create_native_problem(folder, unit_updates: dict = {}, general_file: str | None = None, timeseries_file: str = 'timeseries_data.csv',
+                          settings: dict = {}, problem_number: int = 3) -> Problem:
+    # Copies a test problem (by default test_problem_3, optionally with other general settings, updated settings or updated unit data),
+    # to be solved by the native interpreter
+    problem_folder = os.path.join(folder, 'test_problem')
+    os.makedirs(os.path.join(problem_folder, 'Input'))
+    data_folder = os.path.join(__PARENT__, 'DATA', 'test_problem', f'test_problem_{problem_number}')
+    shutil.copy2(os.path.join(data_folder, timeseries_file), os.path.join(problem_folder, 'Input', 'timeseries_data.csv'))
+    with open(general_file or os.path.join(data_folder, 'general.yml'), 'r', encoding = 'utf-8') as stream:
+        general = yaml.safe_load(stream)
+    general['Settings'] |= {'Interpreter': 'native'} | settings
+    with open(os.path.join(problem_folder, 'Input', 'general.yml'), 'w', encoding = 'utf-8') as stream:
+        yaml.safe_dump(general, stream, sort_keys = False)
+    with open(os.path.join(data_folder, 'units.yml'), 'r', encoding = 'utf-8') as stream:
+        units = yaml.safe_load(stream)
+    for unit, updates in unit_updates.items():
+        units[unit].update(updates)
+    with open(os.path.join(problem_folder, 'Input', 'units.yml'), 'w', encoding = 'utf-8') as stream:
+        yaml.safe_dump(units, stream, sort_keys = False)
+    return Problem(name = 'test_problem', problem_folder = problem_folder)
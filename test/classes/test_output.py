@@ -0,0 +1,90 @@
+from OptiENEA.classes.output import OptimizationOutput, list_results
+from OptiENEA.classes.variable import Variable
+import os, pytest
+import numpy as np
+import pandas as pd
+
+TIME_STEPS = pd.Index(range(6), name = 'timeSteps')
+
+
+class StubInterpreter:
+    # Stands for a solved problem, without a solver: the values of the variables are given
+    def __init__(self, values: dict):
+        self.values = values
+        self.calls = []
+
+    def get_variable_values(self, names: list) -> dict:
+        self.calls.append(list(names))
+        return {name: self.values[name] for name in names}
+
+
+def timed_values(name: str, values: dict) -> pd.Series:
+    # The values of a variable indexed over (unit, layer, time step), from their time series by (unit, layer)
+    index = pd.MultiIndex.from_tuples([key + (time,) for key in values for time in TIME_STEPS])
+    return pd.Series(np.concatenate([np.asarray(series, dtype = float) for series in values.values()]), index = index, name = name)
+
+
+def create_solution() -> dict:
+    # The values of the output variables of a solved problem with a boiler, a PV plant that is never used and a battery
+    return {'OPEX': pd.Series([120.0]), 'CAPEX': pd.Series([80.0]), 'TOTEX': pd.Series([200.0]),
+            'size': pd.Series([5.0, 0.0, 2.0], index = ['Boiler', 'PV', 'Battery']),
+            'layer_operating_cost': pd.Series([120.0], index = ['Gas']),
+            'power': timed_values('power', {('Boiler', 'Gas'): [5, 4, 3, 3, 4, 5], ('Boiler', 'Heat'): [4.5, 3.6, 2.7, 2.7, 3.6, 4.5],
+                                            ('PV', 'Electricity'): [0, 1e-9, 0, 0, -1e-9, 0], ('Battery', 'Electricity'): [1, -1, 0, 1, -1, 0]}),
+            'energyStorageLevel': timed_values('energyStorageLevel', {('Battery', 'Electricity'): [0, 1, 0, 0, 1, 0]})}
+
+
+def create_output(folder, solver_settings: dict = {}) -> OptimizationOutput:
+    # The output of the solution, fetched from a stub interpreter
+    values = create_solution()
+    output = OptimizationOutput(StubInterpreter(values), Variable.load_variables_indexing_data(values), str(folder),
+                                solver_settings = solver_settings)
+    output.generate_output_structures()
+    return output
+
+
+def test_results_files(tmp_path):
+    # The results are saved to Parquet files, read back as they were, and exported to Excel on request
+    pytest.importorskip('pyarrow')
+    output = create_output(tmp_path, solver_settings = {'solver': 'highs', 'solve result': 'solved'})
+    output.save_output('run')
+    assert not os.path.isfile(os.path.join(tmp_path, 'Results_run.xlsx'))
+    saved = OptimizationOutput.from_results(str(tmp_path), 'run')
+    assert saved.solution is None and saved.solver_settings == output.solver_settings
+    pd.testing.assert_frame_equal(saved.kpis, output.kpis)
+    pd.testing.assert_frame_equal(saved.units, output.units)
+    pd.testing.assert_frame_equal(saved.timeseries_full, output.timeseries_full, check_column_type = False)
+    pd.testing.assert_frame_equal(saved.timeseries, output.timeseries, check_column_type = False)
+    pd.testing.assert_frame_equal(saved.extra['layer_operating_cost'], output.extra['layer_operating_cost'])
+    saved.save_output_to_excel('run')
+    os.remove(os.path.join(tmp_path, 'Results_run', 'metadata.json'))  # The results are then read from the workbook
+    exported = OptimizationOutput.from_results(str(tmp_path), 'run')
+    assert exported.solver_settings['solve result'] == 'solved'
+    assert exported.timeseries_full.shape == output.timeseries_full.shape
+    assert list(exported.extra) == ['layer_operating_cost']
+    assert list_results(str(tmp_path)) == ['run']
+
+def test_save_output_format(tmp_path):
+    output = create_output(tmp_path)
+    with pytest.raises(ValueError):
+        output.save_output('run', results_format = 'csv')
+
+def test_output_fetches_values_once_per_indexing(tmp_path):
+    # The variables with the same indexing are fetched together, and the tables are built again after being released
+    output = create_output(tmp_path)
+    assert sorted(map(sorted, output.ampl.calls)) == [['CAPEX', 'OPEX', 'TOTEX'], ['energyStorageLevel'], ['layer_operating_cost'],
+                                                      ['power'], ['size']]
+    kpis = output.kpis
+    assert output.kpis is kpis
+    output.release()
+    assert output.kpis is not kpis and output.kpis.loc['TOTEX', 'Value'] == 200
+
+def test_output_timeseries_layout(tmp_path):
+    # The time series are laid out as unstacking each variable would, and those that are zero within the tolerance are dropped
+    values = create_solution()
+    output = OptimizationOutput(None, Variable.load_variables_indexing_data(values), str(tmp_path), solution = values)
+    power = values['power'].unstack(level = [0, 1]).sort_index(axis = 1)
+    pd.testing.assert_frame_equal(output.timeseries_full['power'], power, check_names = False)
+    assert ('power', 'PV', 'Electricity') in output.timeseries_full.columns
+    assert list(output.timeseries.columns) == [column for column in output.timeseries_full.columns if column != ('power', 'PV', 'Electricity')]
+    assert 'energyStorageLevel' in output.timeseries.columns.get_level_values(0)
@@ -1,6 +1,8 @@
 from OptiENEA.classes.problem import Problem
 from OptiENEA.classes.parametric_runs import ParametricRuns
-import os, shutil, math, pytest
+from OptiENEA.classes.results_database import ResultsDatabase
+import OptiENEA.classes.amplpy as amplpy_module
+import os, shutil, math, pytest, yaml
 import pandas as pd
 
 __HERE__ = os.path.dirname(os.path.realpath(__file__))
@@ -38,10 +40,67 @@ def test_write_parametric_data_results(empty_problem):
         header = [0,1],
         index_col = 0
     )
-    assert test_output.loc[:, ('Output', 'size:PV')].sum() == 0
-    assert (test_output.loc[:, ('Output', 'size:HeatPump')] > 0).sum() == 0
-    assert math.isclose(test_output.loc[2, ('Output', 'TOTEX')], 60, abs_tol=1)
-    assert math.isclose(test_output.loc[3, ('Output', 'CAPEX')], 9, abs_tol=1)
+    check_parametric_results(test_output)
+
+def test_native_parametric_results(empty_problem):
+    # The scenarios solved by the native interpreter give the same results as with AMPL
+    pytest.importorskip('scipy')
+    general_file = os.path.join(empty_problem.problem_folder, 'Input', 'general.yml')
+    with open(general_file, 'r', encoding = 'utf-8') as stream:
+        general = yaml.safe_load(stream)
+    general['Settings']['Interpreter'] = 'native'
+    with open(general_file, 'w', encoding = 'utf-8') as stream:
+        yaml.safe_dump(general, stream, sort_keys = False)
+    parametric_runs = ParametricRuns('parametric analysis test', empty_problem)
+    parametric_runs.run()
+    check_parametric_results(parametric_runs.output)
+
+def check_parametric_results(output: pd.DataFrame):
+    # The heat pump only pays off with the higher electricity price (scenario 1) or with its lower cost (scenario 3)
+    assert output.loc[:, ('Output', 'size:PV')].sum() == 0
+    assert list(output.index[output.loc[:, ('Output', 'size:HeatPump')] > 0]) == [1, 3]
+    assert math.isclose(output.loc[2, ('Output', 'TOTEX')], 60, abs_tol=1)
+    assert math.isclose(output.loc[3, ('Output', 'CAPEX')], 32, abs_tol=1)
+
+def test_scenario_order(empty_problem):
+    # Scenario 2 is identical to the baseline, so it is solved right after it. All the others are closest to the baseline
+    parametric_runs = ParametricRuns('test', empty_problem, warm_start = True)
+    assert parametric_runs.scenario_order() == [(0, None), (2, 0), (1, 0), (3, 0)]
+
+def test_results_database(empty_problem, tmp_path):
+    # The summary is queried from the results appended by each scenario. A scenario solved again replaces its previous results
+    parametric_runs = ParametricRuns('test', empty_problem)
+    parametric_runs.parametric_runs_results_folder = str(tmp_path)
+    database = ResultsDatabase(str(tmp_path))
+    units = pd.DataFrame({'size': [0.0, 5.0]}, index = ['PV', 'HeatPump'])
+    for scenario in parametric_runs.scenarios_description.index:
+        kpis = pd.DataFrame({'Value': [100.0 + scenario, 10.0, 90.0 + scenario]}, index = pd.Index(['TOTEX', 'CAPEX', 'OPEX'], name = 'KPI'))
+        database.append(scenario, f'Scenario {scenario}', parametric_runs.scenario_inputs(scenario), kpis, units, {'solve result': 'solved'})
+    database.append(1, 'Scenario 1', parametric_runs.scenario_inputs(1), kpis * 2, units, {'solve result': 'limit'})
+    assert database.runs().loc['1', 'solve_result'] == 'limit'
+    summary = parametric_runs.generate_summary_output(generate_output_xlsx = False)
+    assert summary.loc[0, ('Output', 'TOTEX')] == 100 and summary.loc[1, ('Output', 'TOTEX')] == 2 * 103
+    assert summary.loc[2, ('Output', 'size:HeatPump')] == 5 and summary.loc[3, ('Input', 'HeatPump:Specific CAPEX')] == 500
+
+def test_failed_scenario_closes_its_session(empty_problem, monkeypatch):
+    # The AMPL session of a scenario that fails is closed, instead of being returned to the pool
+    sessions = []
+    class FailingSession:
+        model_fingerprint, holds_base_data = None, False
+        def __init__(self, problem):
+            self.closed = False
+            sessions.append(self)
+        def set_problem(self, problem): pass
+        def parse_problem_settings(self): pass
+        def build_mod_string(self): self.mod_string = ''
+        def load_model(self): pass
+        def write_sets_to_amplpy(self): raise RuntimeError('AMPL error')
+        def close(self): self.closed = True
+    monkeypatch.setattr(amplpy_module, 'AmplProblem', FailingSession)
+    parametric_runs = ParametricRuns('test', empty_problem)
+    with pytest.raises(RuntimeError):
+        parametric_runs.run()
+    assert len(sessions) == 1 and sessions[0].closed and parametric_runs.session_pool is None
 
 @pytest.fixture
 def empty_problem(tmp_path):
@@ -29,4 +29,48 @@ def test_read_problem_main_settings_from_file(tmp_path):
     assert problem.interpreter == 'ampl'
     assert problem.solver == 'highs'
     assert problem.interest_rate == 0.07
-    assert problem.simulation_horizon == 168
\ No newline at end of file
+    assert problem.simulation_horizon == 168
+
+
+def test_parameter_update_tracks_modified_rows():
+    # Tests that updating a parameter value only marks the modified rows
+    parameter = Parameter('ENERGY_AVERAGE_PRICE', ['markets', 'layersOfUnit'])
+    parameter.update(('Market', 'Electricity'), 0.05)
+    parameter.update(('Market', 'Heat'), 0.02)
+    assert parameter.dirty
+    parameter.clear_modifications()
+    assert parameter.modified_content() is None
+    parameter.update(('Market', 'Heat'), 0.03)
+    assert not parameter.dirty
+    assert parameter.modified_content().index.tolist() == [('Market', 'Heat')]
+    assert parameter().loc[('Market', 'Heat'), 'ENERGY_AVERAGE_PRICE'] == 0.03
+    # Partial keys update all the rows starting with that key
+    parameter.update(('Market',), 0.1)
+    assert list(parameter()['ENERGY_AVERAGE_PRICE']) == [0.1, 0.1]
+    assert parameter.dirty_positions == {0, 1}
+
+
+def test_scalar_parameter_update():
+    parameter = Parameter('OCCURRANCE', None)
+    parameter.content = 1
+    parameter.clear_modifications()
+    parameter.update((), 3)
+    assert parameter() == 3
+    assert parameter.dirty
+
+
+def test_parameter_update_with_list_keys(tmp_path):
+    # Keys can be given as lists, as well as tuples
+    parameter = Parameter('ENERGY_AVERAGE_PRICE', ['markets', 'layersOfUnit'])
+    parameter.update(['Market', 'Electricity'], 0.05)
+    parameter.update(['Market'], 0.1)
+    assert parameter().loc[('Market', 'Electricity'), 'ENERGY_AVERAGE_PRICE'] == 0.1
+    problem_folder = os.path.join(tmp_path, 'test_problem_parameter')
+    os.makedirs(os.path.join(problem_folder, 'Input'))
+    for filename in ('units.yml', 'general.yml', 'timeseries_data.csv'):
+        shutil.copy2(os.path.join(__PARENT__, 'DATA', 'test_problem', 'test_problem_3', filename), os.path.join(problem_folder, 'Input', filename))
+    problem = Problem(name = 'test_problem', problem_folder = problem_folder)
+    problem.create_folders()
+    problem.create_pipeline().run(until = 'parameters', verbose = False)
+    problem.update_problem_parameters('SPECIFIC_INVESTMENT_COST', ['PV'], 9)
+    assert problem.parameters['SPECIFIC_INVESTMENT_COST']().loc['PV', 'SPECIFIC_INVESTMENT_COST'] == 9
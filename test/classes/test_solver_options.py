@@ -0,0 +1,17 @@
+from OptiENEA.classes.solver_options import SolverOptions
+import pytest
+
+
+def test_solver_options_from_settings():
+    options = SolverOptions.from_settings({'Threads': 4, 'MIP gap': 0.01, 'Time limit': 600, 'Presolve': 'off', 'Algorithm': 'IPM', 'Extra': 'outlev=1'})
+    assert options.presolve is False and options.algorithm == 'ipm'
+    assert options.to_ampl() == 'threads=4 mip:gap=0.01 lim:time=600 pre:solve=off alg:solver=ipm outlev=1'
+    assert SolverOptions.from_settings(None).to_ampl() == ''
+
+def test_invalid_solver_options():
+    with pytest.raises(ValueError):
+        SolverOptions.from_settings({'Threads': 0})
+    with pytest.raises(ValueError):
+        SolverOptions.from_settings({'Algorithm': 'barrier'})
+    with pytest.raises(ValueError):
+        SolverOptions.from_settings({'Gap': 0.01})
@@ -0,0 +1,112 @@
+from OptiENEA.classes.problem import Problem
+from OptiENEA.classes.stage_pipeline import Stage, StagePipeline
+import os, shutil, pytest, yaml
+import pandas as pd
+
+__HERE__ = os.path.dirname(os.path.realpath(__file__))
+__PARENT__ = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+
+def test_rerun_skips_all_stages(problem):
+    pipeline = problem.create_pipeline()
+    pipeline.run(until = 'parameters')
+    assert set(pipeline.report.values()) == {'miss'}
+    power = problem.parameters['POWER']()
+    pipeline.run(until = 'parameters')
+    assert set(pipeline.report.values()) == {'hit'}
+    assert problem.parameters['POWER']() is power
+
+def test_solver_change_only_reruns_settings(problem):
+    pipeline = problem.create_pipeline()
+    pipeline.run(until = 'parameters')
+    update_general_data(problem, 'Settings', 'Solver', 'cbc')
+    pipeline.run(until = 'parameters')
+    assert pipeline.report['read'] == 'miss'
+    assert pipeline.report['settings'] == 'miss'
+    assert all(pipeline.report[stage] == 'hit' for stage in ('typical periods', 'occurrance', 'units', 'sets', 'parameters'))
+    assert problem.solver == 'cbc'
+
+def test_unit_change_keeps_typical_periods(problem):
+    pipeline = problem.create_pipeline()
+    pipeline.run(until = 'parameters')
+    typical_periods = problem.typical_periods
+    problem.update_problem_data('units', ('Battery', 'Max energy'), 20)
+    pipeline.run(until = 'parameters')
+    assert pipeline.report['typical periods'] == 'hit'
+    assert problem.typical_periods is typical_periods
+    assert all(pipeline.report[stage] == 'miss' for stage in ('units', 'sets', 'parameters'))
+    assert problem.parameters['ENERGY_MAX']().loc['Battery', 'ENERGY_MAX'] == 20
+
+def test_typical_periods_are_persisted(problem):
+    problem.create_pipeline().run(until = 'parameters')
+    new_problem = Problem(name = 'test_problem', problem_folder = problem.problem_folder)
+    pipeline = new_problem.create_pipeline()
+    pipeline.run(until = 'parameters')
+    assert pipeline.report['typical periods'] == 'hit (disk)'
+    pd.testing.assert_frame_equal(new_problem.parameters['POWER'](), problem.parameters['POWER']())
+
+def test_clone_shares_unchanged_data(problem):
+    problem.snapshot()
+    clone = problem.clone(raw_data_updates = [('units', ('Battery', 'Max energy'), 20)])
+    assert clone.pipeline.report['typical periods'] == 'hit'
+    assert clone.pipeline.report['units'] == 'miss'
+    assert clone.typical_periods is problem.typical_periods
+    assert clone.get_timeseries_store() is problem.get_timeseries_store()
+    assert clone.parameters['ENERGY_MAX']().loc['Battery', 'ENERGY_MAX'] == 20
+    assert problem.raw_unit_data['Battery']['Max energy'] != 20
+    assert problem.parameters['ENERGY_MAX']().loc['Battery', 'ENERGY_MAX'] != 20
+    assert clone.base_data() is None  # The sets were parsed again
+
+def test_clone_copies_updated_parameters_only(problem):
+    problem.snapshot()
+    clone = problem.clone(parameter_updates = [('ENERGY_MAX', ('Battery',), 30)])
+    assert clone.parameters['ENERGY_MAX']().loc['Battery', 'ENERGY_MAX'] == 30
+    assert problem.parameters['ENERGY_MAX']().loc['Battery', 'ENERGY_MAX'] != 30
+    assert clone.parameters['POWER'] is problem.parameters['POWER']
+    assert clone.sets is problem.sets
+    # Only the updated rows are tracked as modified, in the clone's own copy of the parameter
+    assert clone.base_data() is problem.last_snapshot
+    assert clone.parameters['ENERGY_MAX'].modified_content().index.tolist() == ['Battery']
+    assert problem.parameters['ENERGY_MAX'].modified_content() is None
+
+def test_downstream_stages_are_invalidated():
+    calls = []
+    class Dummy:
+        value = 1
+    dummy = Dummy()
+    pipeline = StagePipeline(dummy, [
+        Stage('first', lambda: calls.append('first'), inputs = lambda: dummy.value),
+        Stage('second', lambda: calls.append('second'), depends_on = ('first',))])
+    pipeline.run(verbose = False)
+    pipeline.run(verbose = False)
+    assert calls == ['first', 'second']
+    dummy.value = 2
+    pipeline.run(verbose = False)
+    assert calls == ['first', 'second', 'first', 'second']
+
+def test_report_is_only_printed_if_verbose(capsys):
+    pipeline = StagePipeline(None, [Stage('only', lambda: None)])
+    pipeline.run()
+    assert capsys.readouterr().out == ''
+    pipeline.run(verbose = True)
+    assert capsys.readouterr().out == pipeline.format_report() + '\n'
+
+
+def update_general_data(problem, section, key, value):
+    path = os.path.join(problem.input_folder, 'general.yml')
+    with open(path, 'r') as stream:
+        data = yaml.safe_load(stream)
+    data[section][key] = value
+    with open(path, 'w') as stream:
+        yaml.safe_dump(data, stream, sort_keys = False)
+
+@pytest.fixture
+def problem(tmp_path):
+    problem_folder = os.path.join(tmp_path, 'test_problem')
+    os.makedirs(os.path.join(problem_folder, 'Input'))
+    shutil.copy2(os.path.join(__PARENT__, 'DATA', 'test_problem', 'test_problem_3', 'units.yml'), os.path.join(problem_folder, 'Input', 'units.yml'))
+    shutil.copy2(os.path.join(__PARENT__, 'DATA', 'test_typical_periods', 'test_typical_periods_day.yml'), os.path.join(problem_folder, 'Input', 'general.yml'))
+    shutil.copy2(os.path.join(__PARENT__, 'DATA', 'test_problem', 'test_problem_3', 'timeseries_data_full.csv'), os.path.join(problem_folder, 'Input', 'timeseries_data.csv'))
+    problem = Problem(name = 'test_problem', problem_folder = problem_folder)
+    problem.create_folders()
+    return problem
@@ -0,0 +1,52 @@
+from OptiENEA.classes.telemetry import RunTelemetry, read_telemetry, model_fingerprint, to_json_value
+from types import SimpleNamespace
+import json, math
+import numpy as np
+
+
+class StubInterpreter:
+    # Stands for a solved problem, without a solver: the statistics of the solve are given
+    solve_result = 'solved'
+
+    def solve_statistics(self) -> dict:
+        return {'variables': 120, 'constraints': 80, 'binaries': 4, 'presolved variables': 90, 'objective': np.float64(1172.07),
+                'mip gap': float('nan'), 'simplex iterations': np.int64(57)}
+
+
+def create_problem(units: list = ['Boiler', 'PV'], cost: float = 1000.0) -> SimpleNamespace:
+    # The parts of a problem that its telemetry is read from
+    return SimpleNamespace(run_name = 'run', name = 'test_problem', interpreter = 'native', solver = 'highs',
+                           objective = SimpleNamespace(name = 'TOTEX'), additional_constraints_data = {},
+                           sets = {'units': SimpleNamespace(content = set(units))},
+                           parameters = {'SPECIFIC_INVESTMENT_COST': SimpleNamespace(content = {'PV': cost})},
+                           timings = {'data build': 0.5, 'solve': 1.5}, ampl_problem = StubInterpreter())
+
+
+def test_telemetry_record():
+    telemetry = RunTelemetry.from_problem(create_problem())
+    assert telemetry.model == {'variables': 120, 'constraints': 80, 'binaries': 4, 'presolved variables': 90,
+                               'presolved constraints': None, 'presolved binaries': None}
+    assert telemetry.seconds == {'data build': 0.5, 'model evaluation': 0.0, 'data transfer': 0.0, 'solve': 1.5, 'output extraction': 0.0}
+    assert telemetry.solver['solver'] == 'highs' and telemetry.solver['solve result'] == 'solved'
+    assert telemetry.solver['simplex iterations'] == 57 and 'variables' not in telemetry.solver
+
+def test_read_telemetry(tmp_path):
+    # Each record is appended as one line of the telemetry file, and read back with its nested fields flattened
+    for cost in (1000.0, 1000.0, 1200.0):
+        RunTelemetry.from_problem(create_problem(cost = cost)).append_to(tmp_path)
+    telemetry = read_telemetry(tmp_path)
+    assert telemetry.shape[0] == 3
+    assert (telemetry['model.variables'] == 120).all() and telemetry['model.presolved constraints'].isna().all()
+    assert (telemetry['seconds.solve'] == 1.5).all() and (telemetry['solver.solve result'] == 'solved').all()
+    assert math.isclose(telemetry['solver.objective'].iloc[0], 1172.07) and telemetry['solver.mip gap'].isna().all()
+    # The model is only different for the record whose parameters changed
+    assert telemetry['model_fingerprint'].iloc[0] == telemetry['model_fingerprint'].iloc[1] != telemetry['model_fingerprint'].iloc[2]
+
+def test_model_fingerprint_ignores_set_order():
+    assert model_fingerprint(create_problem(['Boiler', 'PV'])) == model_fingerprint(create_problem(['PV', 'Boiler']))
+    assert model_fingerprint(create_problem(['Boiler', 'PV'])) != model_fingerprint(create_problem(['Boiler']))
+
+def test_to_json_value():
+    value = to_json_value({1: (np.int64(2), np.float64(0.5)), 'gap': float('nan'), 'bound': -float('inf'), 'nested': {'flag': np.bool_(True)}})
+    assert value == {'1': [2, 0.5], 'gap': None, 'bound': None, 'nested': {'flag': True}}
+    assert json.loads(json.dumps(value, allow_nan = False)) == value
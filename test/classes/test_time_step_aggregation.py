@@ -0,0 +1,76 @@
+from OptiENEA.classes.time_step_aggregation import TimeStepAggregator, TimeStepAggregationConfig
+from OptiENEA.classes.timeseries_store import TimeSeriesStore
+from OptiENEA.classes.typical_periods import TypicalPeriodBuilder, FeatureConfig, TypicalPeriodConfig
+from OptiENEA.classes.problem import Problem
+import os, shutil, pytest, yaml
+import numpy as np
+import pandas as pd
+
+__HERE__ = os.path.dirname(os.path.realpath(__file__))
+__PARENT__ = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+
+def test_aggregation_conserves_energy(store):
+    aggregation = TimeStepAggregator(TimeStepAggregationConfig(n_segments = 400)).build(store)
+    assert aggregation.n_segments == 400
+    assert aggregation.store.n_steps == 400
+    assert aggregation.durations.sum() == store.n_steps
+    assert aggregation.lengths.sum() == store.n_steps
+    for key in store.keys:
+        assert np.isclose((aggregation.store.get_array(key) * aggregation.durations).sum(), store.get_array(key).sum())
+
+def test_aggregation_with_tolerance(store):
+    coarse = TimeStepAggregator(TimeStepAggregationConfig(tolerance = 0.3)).build(store)
+    fine = TimeStepAggregator(TimeStepAggregationConfig(tolerance = 0.1)).build(store)
+    assert coarse.n_segments < fine.n_segments < store.n_steps
+    assert fine.meta['rms_error'] <= 0.1
+    # With both settings, merging stops at whichever limit is reached first
+    both = TimeStepAggregator(TimeStepAggregationConfig(n_segments = 10, tolerance = 0.1)).build(store)
+    assert both.n_segments == fine.n_segments
+
+def test_aggregation_keeps_variable_durations(store):
+    durations = np.tile([1.0, 3.0], store.n_steps // 2)
+    aggregation = TimeStepAggregator(TimeStepAggregationConfig(n_segments = 100)).build(store, durations = durations)
+    assert np.isclose(aggregation.durations.sum(), durations.sum())
+    key = next(iter(store.keys))
+    assert np.isclose((aggregation.store.get_array(key) * aggregation.durations).sum(), (store.get_array(key) * durations).sum())
+
+def test_aggregation_of_typical_periods(store):
+    typical_periods = TypicalPeriodBuilder(FeatureConfig(), TypicalPeriodConfig(K = 4, random_state = 1)).build(store)
+    aggregation = TimeStepAggregator(TimeStepAggregationConfig(n_segments = 6)).build(
+        TimeSeriesStore.from_typical_periods(typical_periods), block_length = typical_periods.L)
+    assert np.array_equal(aggregation.segments_per_block, [6, 6, 6, 6])
+    assert np.array_equal(aggregation.durations.reshape(4, 6).sum(axis = 1), [24, 24, 24, 24])
+    assert aggregation.duration_series().index.names == ['typicalPeriods', 'timeStepsOfPeriod']
+    # Results on the segments are expanded back to one value per hour of each typical period
+    results = pd.DataFrame({'power': np.arange(24.0)}, index = aggregation.segment_index())
+    expanded = aggregation.expand_dataframe(results)
+    assert len(expanded) == 4 * 24
+    assert expanded.loc[(3, 23), 'power'] == 23.0
+
+def test_problem_with_time_step_aggregation(tmp_path):
+    problem_folder = os.path.join(tmp_path, 'test_problem_aggregation')
+    input_data_folder = os.path.join(problem_folder, 'Input')
+    os.makedirs(input_data_folder)
+    for filename in ('units.yml', 'general.yml', 'timeseries_data.csv'):
+        shutil.copy2(os.path.join(__PARENT__, 'DATA', 'test_problem', 'test_problem_main', filename),
+                     os.path.join(input_data_folder, filename))
+    with open(os.path.join(input_data_folder, 'general.yml'), 'r') as stream:
+        general_data = yaml.safe_load(stream)
+    general_data['Settings']['Time step aggregation'] = {'Number of segments': 500}
+    with open(os.path.join(input_data_folder, 'general.yml'), 'w') as stream:
+        yaml.safe_dump(general_data, stream)
+    problem = Problem(name = 'test_problem_aggregation', problem_folder = problem_folder)
+    problem.create_folders()
+    problem.create_pipeline().run(until = 'parameters')
+    assert len(problem.sets['timeSteps'].content) == 500
+    assert isinstance(problem.parameters['TIME_STEP_DURATION'].content, pd.Series)
+    assert problem.parameters['TIME_STEP_DURATION'].content.sum() == 8760
+    assert len(problem.parameters['POWER']().xs(('WindFarm', 'Electricity'))) == 500
+    assert len(problem.units['WindFarm'].power['Electricity']) == 500
+
+
+@pytest.fixture
+def store():
+    data = pd.read_csv(os.path.join(__PARENT__, "DATA", "test_problem", "test_problem_3", "timeseries_data_full.csv"), sep=";", index_col=0, header=[0,1,2])
+    return TimeSeriesStore.from_dataframe(data)
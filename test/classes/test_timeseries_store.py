@@ -0,0 +1,66 @@
+from OptiENEA.classes.timeseries_store import TimeSeriesStore
+from OptiENEA.classes.problem import Problem
+from OptiENEA.classes.unit import Utility
+from OptiENEA.classes.typical_periods import TypicalPeriodBuilder, FeatureConfig, TypicalPeriodConfig
+import os, pytest
+import numpy as np
+import pandas as pd
+
+__HERE__ = os.path.dirname(os.path.realpath(__file__))
+__PARENT__ = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+
+def test_store_from_dataframe(data_raw):
+    store = TimeSeriesStore.from_dataframe(data_raw)
+    assert len(store) == len(data_raw.columns)
+    assert store.n_steps == len(data_raw.index)
+    assert store.has_unit('TestUtility')
+    assert np.array_equal(store.get_array(('TestUtility', 'Capacity factor', 'All layers')),
+                          data_raw[('TestUtility', 'Capacity factor', 'All layers')].to_numpy())
+
+def test_store_deduplicates_identical_series(data_raw):
+    data_raw[('OtherUtility', 'Capacity factor', 'Electricity')] = data_raw[('TestUtility', 'Capacity factor', 'All layers')]
+    store = TimeSeriesStore.from_dataframe(data_raw)
+    assert len(store) == len(data_raw.columns)
+    assert store.n_unique == len(data_raw.columns) - 1
+    assert store.keys[('OtherUtility', 'Capacity factor', 'Electricity')] == store.keys[('TestUtility', 'Capacity factor', 'All layers')]
+
+def test_unit_series_are_views(data_raw):
+    store = TimeSeriesStore.from_dataframe(data_raw)
+    series = store.unit_series('TestUtility')
+    assert np.shares_memory(series[('Capacity factor', 'All layers')].to_numpy(), store.data)
+    assert store.unit_series('NotAUnit') is None
+
+def test_store_from_csv(data_raw):
+    path = os.path.join(__PARENT__, "DATA", "test_unit", "test_utility_tsdata.csv")
+    store = TimeSeriesStore.from_csv(path, chunk_size = 7)
+    pd.testing.assert_frame_equal(store.to_dataframe(), data_raw)
+    store = TimeSeriesStore.from_csv(path, dtype = np.float32)
+    assert store.data.dtype == np.float32
+    assert np.allclose(store.get_array(('TestUtility', 'Capacity factor', 'All layers')), data_raw[('TestUtility', 'Capacity factor', 'All layers')].to_numpy())
+
+def test_typical_periods_from_store():
+    data = pd.read_csv(os.path.join(__PARENT__, "DATA", "test_problem", "test_problem_3", "timeseries_data_full.csv"), sep=";", index_col=0, header=[0,1,2])
+    builder = TypicalPeriodBuilder(FeatureConfig(), TypicalPeriodConfig(K = 4, random_state = 1))
+    from_dataframe = builder.build(data.copy())
+    from_store = builder.build(TimeSeriesStore.from_dataframe(data))
+    assert np.array_equal(from_store.assignment, from_dataframe.assignment)
+    for var, profile in from_dataframe.profiles.items():
+        assert np.allclose(from_store.profiles[var], profile)
+
+def test_units_share_problem_store(data_raw):
+    problem = Problem('')
+    problem.raw_timeseries_data = data_raw
+    utility_info = {'Type': 'Utility', 'Layers': ['Electricity', 'Heat'], 'Main layer': 'Electricity', 'Max installed power': [1400, 900]}
+    utility = Utility('TestUtility', utility_info, problem)
+    store = problem.get_timeseries_store()
+    assert problem.get_timeseries_store() is store
+    assert np.shares_memory(utility.time_dependent_capacity_factor['Electricity'].to_numpy(), store.data)
+    # Replacing the raw data forces the store to be rebuilt
+    problem.raw_timeseries_data = data_raw.copy()
+    assert problem.get_timeseries_store() is not store
+
+
+@pytest.fixture
+def data_raw():
+    return pd.read_csv(os.path.join(__PARENT__, "DATA", "test_unit", "test_utility_tsdata.csv"), sep=";", index_col=0, header=[0,1,2])